@@ -0,0 +1,224 @@
+"""
+Admission control, deadlines and load shedding
+Requests are admitted into a bounded set with a deadline (from the
+X-Request-Timeout-Ms header or a default). When the set is full or the
+estimated queue wait exceeds the SLO, new requests get an immediate 503 with
+Retry-After; admitted requests whose deadline passes while they wait are
+dropped before inference. A batch upload counts once per image.
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = "x-request-timeout-ms"
+
+
+class _Admitted:
+    """Admission state of one request: its controller, deadline and current cost"""
+
+    def __init__(self, controller, deadline):
+        self.controller = controller
+        self.deadline = deadline
+        self.weight = 1
+
+
+_admitted = contextvars.ContextVar("admitted_request", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before its inference started"""
+
+
+class Overloaded(Exception):
+    """Raised by ``admit_more`` when the extra cost isn't admitted"""
+
+    def __init__(self, rejection):
+        super().__init__(f"Overloaded ({rejection['reason']})")
+        self.rejection = rejection
+
+
+def overloaded_response(rejection):
+    """503 with Retry-After for a rejected request"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server overloaded, retry later", **rejection},
+        headers={"Retry-After": str(rejection["retry_after_s"])}
+    )
+
+
+def current_deadline():
+    """``time.perf_counter()`` deadline of the request being handled, or None"""
+    admitted = _admitted.get()
+    return admitted.deadline if admitted is not None else None
+
+
+def check_deadline(deadline=current_deadline):
+    """Raise DeadlineExceeded if ``deadline()`` (by default the current request's) has passed"""
+    value = deadline()
+    if value is not None and time.perf_counter() > value:
+        raise DeadlineExceeded("Deadline exceeded before inference")
+
+
+def admit_more(extra):
+    """
+    Raise the current request's admission cost by ``extra`` slots, e.g. one
+    per image of a batch upload once its size is known; raises Overloaded
+    """
+    admitted = _admitted.get()
+    if admitted is None or extra <= 0:
+        return
+    taken, rejection = admitted.controller.try_admit(extra, held=admitted.weight)
+    if rejection is not None:
+        raise Overloaded(rejection)
+    admitted.weight += taken
+
+
+class AdmissionController:
+    """
+    Bounded admission for one service
+
+    At most ``max_queue`` requests are admitted (queued or running) at once;
+    beyond that, or while ``estimate_wait_ms()`` is over ``slo_ms``, requests
+    are rejected. ``default_deadline_ms`` applies when the client sends no
+    deadline. A limit of 0 disables that rule.
+    """
+
+    def __init__(self, name, max_queue, slo_ms, default_deadline_ms, estimate_wait_ms):
+        self.name = name
+        self.max_queue = int(max_queue)
+        self.slo_ms = float(slo_ms)
+        self.default_deadline_ms = float(default_deadline_ms)
+        self.estimate_wait_ms = estimate_wait_ms
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "slo": 0}
+        self.expired = 0
+        self._lock = threading.Lock()
+
+    def _wait_ms(self):
+        try:
+            return float(self.estimate_wait_ms() or 0.0)
+        except Exception:
+            # Nothing to estimate from yet (e.g. still starting up)
+            return 0.0
+
+    def try_admit(self, weight=1, held=0):
+        """
+        Admit ``weight`` more slots for a request already holding ``held``
+
+        Returns (slots taken, None), or (0, rejection details). One request
+        never takes more than the whole queue, so any batch can run once the
+        queue is otherwise empty.
+        """
+        wait_ms = self._wait_ms()
+        with self._lock:
+            if self.max_queue:
+                weight = max(0, min(weight, self.max_queue - held))
+            if self.max_queue and weight and self.in_flight + weight > self.max_queue:
+                reason = "queue_full"
+            elif self.slo_ms and wait_ms > self.slo_ms:
+                reason = "slo"
+            else:
+                self.in_flight += weight
+                if not held:
+                    self.admitted += 1
+                return weight, None
+            self.rejected[reason] += 1
+        # Come back once the current backlog should have drained
+        retry_after_s = max(1, math.ceil(wait_ms / 1000))
+        return 0, {"reason": reason, "estimated_wait_ms": round(wait_ms, 1), "retry_after_s": retry_after_s}
+
+    def release(self, weight=1):
+        with self._lock:
+            self.in_flight -= weight
+
+    def record_expired(self):
+        with self._lock:
+            self.expired += 1
+
+    def deadline_for(self, headers):
+        """Absolute deadline from the request's timeout header, else the default (None = no deadline)"""
+        try:
+            timeout_ms = float(headers.get(DEADLINE_HEADER, "") or self.default_deadline_ms)
+        except ValueError:
+            timeout_ms = self.default_deadline_ms
+        return time.perf_counter() + timeout_ms / 1000 if timeout_ms > 0 else None
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_queue": self.max_queue or None,
+            "slo_ms": self.slo_ms or None,
+            "default_deadline_ms": self.default_deadline_ms or None,
+            "estimated_wait_ms": round(self._wait_ms(), 1),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "expired": self.expired
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to ``paths``
+
+    Rejected requests get a 503 JSON body with a Retry-After header without
+    reaching the endpoint. Admitted ones carry their deadline in a context
+    variable (see ``current_deadline``) and hold one slot, plus any taken
+    with ``admit_more``, until the response, streamed or not, has been sent.
+    Endpoints answer 504 for requests dropped at their deadline; those are
+    counted as expired.
+    """
+
+    def __init__(self, app, controller, paths=()):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):] or "/"
+        if self.paths and path not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        _, rejection = self.controller.try_admit()
+        if rejection is not None:
+            # Never reaches the router; tag the route so the metrics still label it by path
+            app = scope.get("app")
+            for route in getattr(app, "routes", []):
+                if getattr(route, "path", None) == path:
+                    scope["route"] = route
+                    break
+            logger.warning(
+                f"{self.controller.name}: rejected {path} ({rejection['reason']}, "
+                f"estimated wait {rejection['estimated_wait_ms']}ms)"
+            )
+            await overloaded_response(rejection)(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] == 504:
+                self.controller.record_expired()
+            await send(message)
+
+        admitted = _Admitted(self.controller, self.controller.deadline_for(
+            {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        ))
+        token = _admitted.set(admitted)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _admitted.reset(token)
+            self.controller.release(admitted.weight)
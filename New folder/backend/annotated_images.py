@@ -0,0 +1,99 @@
+"""
+Annotated-image encoding and delivery
+JPEG encoding with bounded size and quality, thumbnails, a short-lived
+server-side store for reference responses and multipart bodies
+"""
+import io
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from PIL import Image
+
+RESPONSE_MODES = ("inline", "findings", "reference", "multipart")
+
+
+def encode_jpeg(image, quality=75, max_side=0):
+    """
+    Encode ``image`` as JPEG, downscaled first if its longer side exceeds ``max_side``
+
+    Returns ``(jpeg_bytes, (width, height))`` of the encoded image.
+    """
+    if max_side and max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue(), image.size
+
+
+def multipart_mixed(payload, jpeg_bytes, filename="annotated.jpg"):
+    """
+    Build a multipart/mixed body: the JSON payload, then the raw JPEG
+
+    Returns ``(body, content_type)``.
+    """
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\n".encode(),
+        b"Content-Type: application/json\r\n\r\n",
+        json.dumps(payload).encode(),
+        f"\r\n--{boundary}\r\n".encode(),
+        f'Content-Type: image/jpeg\r\nContent-Disposition: attachment; filename="{filename}"\r\n\r\n'.encode(),
+        jpeg_bytes,
+        f"\r\n--{boundary}--\r\n".encode()
+    ])
+    return body, f"multipart/mixed; boundary={boundary}"
+
+
+class AnnotatedImageStore:
+    """
+    In-memory JPEG store for reference responses
+
+    Images expire after ``ttl_s`` seconds and the oldest are dropped once
+    ``max_bytes`` is exceeded; clients are expected to fetch them shortly
+    after the prediction.
+    """
+
+    def __init__(self, max_bytes, ttl_s=600):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._images:
+            image_id, (stored_at, data) = next(iter(self._images.items()))
+            if now - stored_at <= self.ttl_s and self._bytes <= self.max_bytes:
+                break
+            del self._images[image_id]
+            self._bytes -= len(data)
+
+    def put(self, data):
+        """Store JPEG bytes and return their id"""
+        image_id = uuid.uuid4().hex
+        with self._lock:
+            now = time.monotonic()
+            self._images[image_id] = (now, data)
+            self._bytes += len(data)
+            self._expire(now)
+        return image_id
+
+    def get(self, image_id):
+        """JPEG bytes for ``image_id``, or None once expired or evicted"""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._images.get(image_id)
+            return entry[1] if entry else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": len(self._images),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s
+            }
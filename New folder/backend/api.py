@@ -1,17 +1,18 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from transformers import BlipForConditionalGeneration, AutoProcessor
 from PIL import Image
-from pathlib import Path
 import torch, io
-
-# Paths
-BASE_DIR = Path(__file__).resolve().parent / "chest"
-MODEL_DIR = BASE_DIR / "hf_model"
-PROC_DIR = BASE_DIR / "hf_processor"
+import chest_model_api as chest
+from admission import AdmissionMiddleware, DeadlineExceeded
+from decoding import DECODING_PROFILES
+from model_registry import registry
+from residency import residency_manager
 
 # Init FastAPI
 app = FastAPI()
+# Same admission queue as the chest service: both feed the same model
+app.add_middleware(AdmissionMiddleware, controller=chest.admission, paths=["/predict"])
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # allow all origins
@@ -19,18 +20,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load model once
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model = BlipForConditionalGeneration.from_pretrained(str(MODEL_DIR)).to(device)
-processor = AutoProcessor.from_pretrained(str(PROC_DIR))
-model.eval()
+model = None
+processor = None
 
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    img_bytes = await file.read()
+# Load model once: same checkpoint as the chest service, so in model_server.py both share one copy
+@app.on_event("startup")
+async def load_model():
+    global model, processor
+    model, processor, _ = chest.shared_captioner(device, user="api")
+
+@app.on_event("shutdown")
+async def release_model():
+    registry.release("api")
+
+def generate_caption(img_bytes, profile):
+    """Caption one image directly (blocking; run off the event loop)"""
     image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
     inputs = processor(images=image, return_tensors="pt").to(device)
-    with torch.no_grad():
-        ids = model.generate(**inputs, max_length=128)
-        caption = processor.batch_decode(ids, skip_special_tokens=True)[0]
-    return {"caption": caption}
+    with residency_manager.use(model), torch.no_grad():
+        ids = model.generate(**inputs, **DECODING_PROFILES[profile])
+        return processor.batch_decode(ids, skip_special_tokens=True)[0]
+
+@app.post("/predict")
+async def predict(file: UploadFile = File(...), profile: str = "fast"):
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if profile not in DECODING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {list(DECODING_PROFILES)}")
+    img_bytes = await file.read()
+    if chest.caption_batcher is None:
+        # Running on its own: no chest pipeline to share, but keep generation off the event loop
+        return {"caption": await run_in_threadpool(generate_caption, img_bytes, profile), "decoding_profile": profile}
+    # Served next to the chest service (model_server.py): go through its cache, single-flight and batcher
+    try:
+        result = await chest.caption_image(img_bytes, profile)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    return {"caption": result["caption"], "decoding_profile": result["decoding_profile"]}
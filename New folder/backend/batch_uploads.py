@@ -0,0 +1,107 @@
+"""
+Multi-image uploads for the /predict/batch endpoints
+Expands uploaded files and zip archives into individual images and streams
+one NDJSON line per image as soon as its result is ready
+"""
+import asyncio
+import io
+import json
+import logging
+import zipfile
+from pathlib import PurePosixPath
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+def is_zip(filename, content_type, data):
+    return (
+        (content_type or "") in ("application/zip", "application/x-zip-compressed")
+        or (filename or "").lower().endswith(".zip")
+        or data[:4] == b"PK\x03\x04"
+    )
+
+
+def expand_uploads(uploads, max_images, max_image_bytes=50 * 1024 * 1024, max_total_bytes=512 * 1024 * 1024):
+    """
+    Turn ``(filename, content_type, bytes)`` uploads into ``(name, bytes)`` images
+
+    Zip archives are unpacked (folders, hidden files and non-image entries
+    are skipped). Raises ValueError past ``max_images`` images, for an image
+    over ``max_image_bytes`` or once the images add up to more than
+    ``max_total_bytes``. Archive entries are checked before they are
+    decompressed, so a zip bomb is rejected without inflating it.
+    """
+    images = []
+    total_bytes = 0
+
+    def add(name, size, read):
+        nonlocal total_bytes
+        if len(images) >= max_images:
+            raise ValueError(f"At most {max_images} images per batch")
+        if size > max_image_bytes:
+            raise ValueError(f"{name} is larger than {max_image_bytes // (1024 * 1024)} MB")
+        if total_bytes + size > max_total_bytes:
+            raise ValueError(f"Batch is larger than {max_total_bytes // (1024 * 1024)} MB uncompressed")
+        data = read()
+        total_bytes += len(data)
+        images.append((name, data))
+
+    for filename, content_type, data in uploads:
+        if not is_zip(filename, content_type, data):
+            add(filename or f"image_{len(images)}", len(data), lambda: data)
+            continue
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for entry in archive.infolist():
+                path = PurePosixPath(entry.filename)
+                if (
+                    entry.is_dir()
+                    or path.suffix.lower() not in IMAGE_EXTENSIONS
+                    or any(part.startswith((".", "__MACOSX")) for part in path.parts)
+                ):
+                    continue
+
+                def read(entry=entry):
+                    # Never inflate past the declared size, whatever the stream contains
+                    with archive.open(entry) as stream:
+                        return stream.read(entry.file_size)
+
+                add(f"{filename}/{entry.filename}", entry.file_size, read)
+    return images
+
+
+def item_error(error):
+    """Client-facing message for a failed image; decoder errors would leak the upload buffer's repr"""
+    if isinstance(error, (OSError, Image.DecompressionBombError)):
+        return "File is not a readable image"
+    return getattr(error, "detail", None) or str(error)
+
+
+async def stream_ndjson(images, process):
+    """
+    Run ``process(name, data)`` for every image concurrently and yield one
+    JSON line per image in completion order
+
+    Each line carries the image "index" and "filename"; a failing image
+    yields a line with "success": false and an "error" message (see
+    ``item_error``) and does not stop the others.
+    """
+    async def run(index, name, data):
+        try:
+            result = await process(name, data)
+        except Exception as e:
+            logger.error(f"Batch item {name} failed: {str(e)}")
+            result = {"success": False, "error": item_error(e)}
+        return {"index": index, "filename": name, **result}
+
+    tasks = [asyncio.ensure_future(run(i, name, data)) for i, (name, data) in enumerate(images)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # Client went away: stop the rest of the batch
+        for task in tasks:
+            task.cancel()
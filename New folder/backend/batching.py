@@ -0,0 +1,187 @@
+"""
+Micro-batching scheduler for model inference
+Groups requests that arrive within a short window into a single model call
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from admission import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collect concurrent inference requests and run them as one batch
+
+    The first queued request opens a window of ``max_wait_ms``; everything
+    submitted before the window closes (up to ``max_batch_size`` items) is
+    passed to ``handler`` as a list. The handler must return one result per
+    item, in the same order. Returning an Exception instance for an item fails
+    only that caller.
+
+    With an ``executor`` the handler runs on its worker threads and up to
+    ``executor.max_workers`` batches are in flight at once; without one it is
+    called directly on the event loop.
+
+    Items submitted with a ``deadline`` (``time.perf_counter()`` time, or a
+    callable returning one, checked when the batch is formed) that has
+    passed by then fail with DeadlineExceeded instead of being run.
+    """
+
+    def __init__(self, handler, max_batch_size=8, max_wait_ms=20, name="batcher", executor=None):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000.0)
+        self.name = name
+        self.executor = executor
+        self._pending = deque()
+        self._has_items = None
+        self._batch_full = None
+        self._slots = None
+        self._inflight = set()
+        self._worker = None
+        self._running_items = 0
+        self.per_item_ms = None
+        self.expired = 0
+
+    def start(self):
+        """Start the background batching task on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._has_items = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            max_inflight = self.executor.max_workers if self.executor else 1
+            self._slots = asyncio.Semaphore(max_inflight)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching task and fail any requests still waiting"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while self._pending:
+            _, future, _, _ = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} is shutting down"))
+
+    def queue_depth(self):
+        """Number of requests waiting for a batch slot"""
+        return len(self._pending)
+
+    def estimated_wait_ms(self):
+        """
+        Expected wait before a newly submitted item is run: queued and running
+        items at the recent per-item run time, spread over the workers
+        """
+        if self.per_item_ms is None:
+            return 0.0
+        max_inflight = self.executor.max_workers if self.executor else 1
+        return (len(self._pending) + self._running_items) * self.per_item_ms / max_inflight
+
+    async def submit(self, item, deadline=None):
+        """Queue an item and wait for its individual result"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.perf_counter(), deadline))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def _next_batch(self):
+        """Wait for the first request, then keep the window open until it fills or expires"""
+        await self._has_items.wait()
+
+        if len(self._pending) < self.max_batch_size and self.max_wait > 0:
+            self._batch_full.clear()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+
+        batch = []
+        now = time.perf_counter()
+        while self._pending and len(batch) < self.max_batch_size:
+            item, future, queued_at, deadline = self._pending.popleft()
+            # Skip callers that gave up while queued
+            if future.done():
+                continue
+            if callable(deadline):
+                deadline = deadline()
+            if deadline is not None and now > deadline:
+                self.expired += 1
+                future.set_exception(DeadlineExceeded(
+                    f"Deadline exceeded after {(now - queued_at) * 1000:.0f}ms in the {self.name} queue"
+                ))
+                continue
+            batch.append((item, future, queued_at))
+
+        if not self._pending:
+            self._has_items.clear()
+        return batch
+
+    async def _run(self):
+        while True:
+            # Wait for a free worker first so the next batch keeps filling meanwhile
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            items = [item for item, _, _ in batch]
+            started = time.perf_counter()
+            max_wait_ms = (started - min(queued_at for _, _, queued_at in batch)) * 1000
+            self._running_items += len(items)
+            try:
+                if self.executor is not None:
+                    results = await self.executor.run(self.handler, items)
+                else:
+                    results = self.handler(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name} handler returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(items)} failed: {str(e)}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self._running_items -= len(items)
+
+            run_ms = (time.perf_counter() - started) * 1000
+            per_item_ms = run_ms / len(items)
+            self.per_item_ms = per_item_ms if self.per_item_ms is None else 0.8 * self.per_item_ms + 0.2 * per_item_ms
+            logger.info(
+                f"{self.name} batch: size={len(items)} queue_wait={max_wait_ms:.1f}ms "
+                f"run={run_ms:.1f}ms per_item={per_item_ms:.1f}ms"
+            )
+
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._slots.release()
@@ -0,0 +1,124 @@
+"""
+Benchmark detection annotation rendering
+Compares the shared DetectionRenderer with the previous per-request drawing
+loop of the API and the matplotlib figure path of the Streamlit app
+
+Usage:
+    python bench_rendering.py
+    python bench_rendering.py --boxes 20 --size 2048x1536 --repeat 50
+"""
+import argparse
+import importlib.util
+import statistics
+import time
+
+import numpy as np
+import torch
+from PIL import ImageDraw, ImageFont
+
+from benchmark import percentile
+from bones_detector import CLASS_COLORS, CLASS_NAMES
+from rendering import DetectionRenderer
+from warmup import parse_sizes, synthetic_xray
+
+
+def legacy_api_render(image, boxes, scores, labels):
+    """The drawing loop bones_model_api.predict used before the shared renderer"""
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("arial.ttf", 30)
+    except OSError:
+        font = ImageFont.load_default()
+
+    for i, box in enumerate(boxes):
+        x1, y1, x2, y2 = box
+        label_idx = int(labels[i].item())
+        label_name = CLASS_NAMES[label_idx] if label_idx < len(CLASS_NAMES) else f"class_{label_idx}"
+        color = CLASS_COLORS.get(label_name, (255, 0, 0))
+        score = scores[i].item()
+        draw.rectangle([(x1, y1), (x2, y2)], outline=color, width=3)
+        label_text = f"{label_name}: {score:.2f}"
+        bbox = draw.textbbox((x1, y1), label_text, font=font)
+        draw.rectangle(bbox, fill=color)
+        draw.text((x1 + 5, y1 + 5), label_text, fill=(255, 255, 255), font=font)
+    return image
+
+
+def legacy_streamlit_render(image, boxes, scores, labels):
+    """The matplotlib figure path bones.plot_image_from_output used"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+
+    fig, ax = plt.subplots(1)
+    ax.imshow(np.asarray(image))
+    ax.axis("off")
+    max_idx = torch.argmax(scores).item()
+    xmin, ymin, xmax, ymax = boxes[max_idx].numpy()
+    ax.add_patch(patches.Rectangle(
+        (xmin, ymin), xmax - xmin, ymax - ymin, linewidth=2, edgecolor="orange", facecolor="none"
+    ))
+    ax.text(xmin, ymin - 10, CLASS_NAMES[labels[max_idx].item()], fontsize=12, color="orange", fontweight="bold")
+    fig.canvas.draw()
+    array = np.array(fig.canvas.renderer._renderer)
+    plt.close(fig)
+    return array
+
+
+def random_detections(count, width, height, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    xy = torch.rand(count, 2, generator=generator) * torch.tensor([width * 0.8, height * 0.8])
+    wh = torch.rand(count, 2, generator=generator) * torch.tensor([width * 0.2, height * 0.2]) + 20
+    boxes = torch.cat([xy, xy + wh], dim=1)
+    scores = torch.rand(count, generator=generator) * 0.5 + 0.5
+    labels = torch.randint(0, len(CLASS_NAMES), (count,), generator=generator)
+    return boxes, scores, labels
+
+
+def time_ms(fn, base_image, repeat):
+    """Median and p95 wall time of ``fn`` on fresh copies of the image"""
+    samples = []
+    for _ in range(repeat):
+        image = base_image.copy()
+        start = time.perf_counter()
+        fn(image)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection annotation rendering")
+    parser.add_argument("--size", default="1333x1000", help="Image size, WIDTHxHEIGHT")
+    parser.add_argument("--boxes", type=int, default=5, help="Detections per image")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    (width, height), = parse_sizes(args.size)
+    base_image = synthetic_xray(width, height)
+    boxes, scores, labels = random_detections(args.boxes, width, height)
+
+    start = time.perf_counter()
+    renderer = DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=30)
+    print(f"🔤 Renderer setup (font + class labels): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    cases = [
+        ("api: legacy loop", lambda image: legacy_api_render(image, boxes, scores, labels)),
+        ("api: DetectionRenderer", lambda image: renderer.render(image, boxes, scores, labels)),
+        ("app: DetectionRenderer top-1",
+         lambda image: np.asarray(renderer.render(image, boxes, scores, labels, max_boxes=1, show_scores=False))),
+    ]
+    if importlib.util.find_spec("matplotlib") is not None:
+        cases.append(("app: matplotlib figure", lambda image: legacy_streamlit_render(image, boxes, scores, labels)))
+    else:
+        print("⚠️  matplotlib not installed, skipping the Streamlit figure path")
+
+    print(f"🖼️  {width}x{height}, {args.boxes} boxes, {args.repeat} runs\n")
+    for name, fn in cases:
+        median, p95 = time_ms(fn, base_image, args.repeat)
+        print(f"   {name:<32} median={median:8.2f}ms p95={p95:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Benchmark suite for the chest and bones model services
+Measures per-stage latency in-process and end-to-end latency and throughput
+over HTTP on synthetic X-ray-like images, writes a JSON baseline and flags
+regressions against a previous one
+
+Usage:
+    python benchmark.py bones --sizes 512x512,1024x1024 --concurrency 1,4 --output bones_baseline.json
+    python benchmark.py chest --target http --url http://localhost:8502
+    python benchmark.py bones --output new.json --compare bones_baseline.json --threshold 0.10
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from warmup import parse_ints, parse_sizes, synthetic_xray
+
+SERVICES = {
+    "chest": {"module": "chest_model_api", "port": 18502},
+    "bones": {"module": "bones_model_api", "port": 18503},
+}
+STAGES = ("decode", "preprocess", "inference", "postprocess", "encode")
+
+# Metrics compared by --compare: name -> True when higher is worse
+COMPARED_METRICS = {"p50_ms": True, "p95_ms": True, "p99_ms": True, "throughput_rps": False}
+
+
+def synthetic_study(width, height, seed):
+    """
+    Reproducible X-ray-like JPEG: exposure gradient, a few bright bone
+    shapes and film noise. Each seed gives different bytes, so no request
+    is served from the prediction cache.
+    """
+    rng = np.random.default_rng(seed)
+    image = synthetic_xray(width, height)
+    draw = ImageDraw.Draw(image)
+    for _ in range(3):
+        x, y = rng.integers(0, width * 3 // 4), rng.integers(0, height * 3 // 4)
+        w, h = rng.integers(width // 20, width // 6), rng.integers(height // 4, height // 2)
+        shade = int(rng.integers(190, 240))
+        draw.rounded_rectangle([x, y, x + w, y + h], radius=int(w // 2), fill=(shade, shade, shade))
+    noise = rng.normal(0, 8, (height, width, 1))
+    pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(pixels).save(buffered, format="JPEG", quality=90)
+    return buffered.getvalue()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ms, elapsed_s, errors, stage_samples=None):
+    latencies_ms = sorted(latencies_ms)
+    summary = {
+        "requests": len(latencies_ms) + errors,
+        "errors": errors,
+        "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 2) if latencies_ms else None,
+        "p50_ms": round(percentile(latencies_ms, 50), 2) if latencies_ms else None,
+        "p95_ms": round(percentile(latencies_ms, 95), 2) if latencies_ms else None,
+        "p99_ms": round(percentile(latencies_ms, 99), 2) if latencies_ms else None,
+        "throughput_rps": round(len(latencies_ms) / elapsed_s, 3) if elapsed_s else None
+    }
+    if stage_samples:
+        summary["stages"] = {}
+        for stage in STAGES:
+            values = sorted(stage_samples.get(stage, []))
+            if values:
+                summary["stages"][stage] = {
+                    "mean_ms": round(sum(values) / len(values), 2),
+                    "p50_ms": round(percentile(values, 50), 2),
+                    "p95_ms": round(percentile(values, 95), 2)
+                }
+    return summary
+
+
+def run_load(call, payloads, concurrency):
+    """Call ``call(payload)`` for every payload with ``concurrency`` threads; returns latencies and results"""
+    def timed(payload):
+        start = time.perf_counter()
+        try:
+            result = call(payload)
+            return (time.perf_counter() - start) * 1000, result, None
+        except Exception as e:
+            return (time.perf_counter() - start) * 1000, None, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, payloads))
+    return outcomes, time.perf_counter() - start
+
+
+# ---------------------------------------------
+# In-process pipelines (same code paths as the services, stage by stage)
+# ---------------------------------------------
+class BonesPipeline:
+    def __init__(self, mode, backend):
+        import torch
+        import bones_model_api as api
+        from bones_detector import CLASS_COLORS, CLASS_NAMES
+        from rendering import DetectionRenderer
+        self.torch = torch
+        self.api = api
+        self.model, _ = api.load_bones_model("cpu", mode, backend)
+        self.renderer = DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=30)
+
+    def __call__(self, data):
+        from annotated_images import encode_jpeg
+        from preprocessing import load_bounded_image
+        from torchvision.transforms.functional import to_tensor
+        stages = {}
+
+        start = time.perf_counter()
+        image, scale = load_bounded_image(data, self.api.MAX_INPUT_SIDE)
+        stages["decode"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        tensor = to_tensor(image)
+        stages["preprocess"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with self.torch.no_grad():
+            output = self.model([tensor])[0]
+        stages["inference"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        keep = output["scores"] > self.api.CONFIDENCE_THRESHOLD
+        detections = {k: v[keep].tolist() for k, v in output.items()}
+        findings = self.api.format_findings(detections, scale)
+        self.renderer.render(image, detections["boxes"], detections["scores"], detections["labels"])
+        stages["postprocess"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        jpeg_bytes, _ = encode_jpeg(image, self.api.JPEG_QUALITY, self.api.ANNOTATED_MAX_SIDE)
+        json.dumps({
+            "findings": findings,
+            "image_base64": f"data:image/jpeg;base64,{base64.b64encode(jpeg_bytes).decode('utf-8')}"
+        })
+        stages["encode"] = (time.perf_counter() - start) * 1000
+        return stages
+
+
+class ChestPipeline:
+    def __init__(self, mode, profile):
+        import torch
+        import chest_model_api as api
+        from decoding import DECODING_PROFILES
+        self.torch = torch
+        self.model, self.processor, _ = api.load_captioner("cpu", mode)
+        self.generation_kwargs = DECODING_PROFILES[profile]
+
+    def __call__(self, data):
+        stages = {}
+
+        start = time.perf_counter()
+        image = Image.open(io.BytesIO(data)).convert("RGB")
+        stages["decode"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        inputs = self.processor(images=image, return_tensors="pt")
+        stages["preprocess"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with self.torch.no_grad():
+            generated_ids = self.model.generate(**inputs, **self.generation_kwargs)
+        stages["inference"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        caption = self.processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+        stages["postprocess"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        json.dumps({"caption": caption, "model": "BLIP Chest X-ray", "status": "success"})
+        stages["encode"] = (time.perf_counter() - start) * 1000
+        return stages
+
+
+def bench_inprocess(args, sizes, concurrency_levels):
+    print(f"📦 Loading {args.service} in-process...")
+    if args.service == "bones":
+        pipeline = BonesPipeline(args.inference_mode, args.backend)
+    else:
+        pipeline = ChestPipeline(args.inference_mode, args.profile)
+
+    results = {}
+    seed = 0
+    for width, height in sizes:
+        for _ in range(args.warmup):
+            pipeline(synthetic_study(width, height, seed=10**6 + seed))
+            seed += 1
+        for concurrency in concurrency_levels:
+            payloads = [synthetic_study(width, height, seed=seed + i) for i in range(args.requests)]
+            seed += args.requests
+            outcomes, elapsed = run_load(pipeline, payloads, concurrency)
+
+            latencies, stage_samples, errors = [], {}, 0
+            for latency, stages, error in outcomes:
+                if error is not None:
+                    errors += 1
+                    continue
+                latencies.append(latency)
+                for stage, ms in stages.items():
+                    stage_samples.setdefault(stage, []).append(ms)
+
+            key = f"{args.service}/inprocess/{width}x{height}/c{concurrency}"
+            results[key] = summarize(latencies, elapsed, errors, stage_samples)
+            print_result(key, results[key])
+    return results
+
+
+# ---------------------------------------------
+# HTTP against a running (or freshly started) uvicorn
+# ---------------------------------------------
+def start_server(service):
+    """Start the service under uvicorn on its benchmark port and wait until /ready"""
+    import requests
+    config = SERVICES[service]
+    url = f"http://127.0.0.1:{config['port']}"
+    print(f"🚀 Starting {config['module']} on {url}...")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{config['module']}:app", "--port", str(config["port"]), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    deadline = time.time() + 600
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{config['module']} exited with code {process.returncode}")
+        try:
+            if requests.get(f"{url}/ready", timeout=2).status_code == 200:
+                return process, url
+        except requests.exceptions.ConnectionError:
+            pass
+        time.sleep(1)
+    process.terminate()
+    raise RuntimeError("Timed out waiting for the service to become ready")
+
+
+def bench_http(args, sizes, concurrency_levels):
+    import requests
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.service)
+
+    session = requests.Session()
+    params = {"response_mode": args.response_mode} if args.service == "bones" else {"profile": args.profile}
+
+    def call(data):
+        response = session.post(
+            f"{url}/predict", params=params, files={"file": ("study.jpg", data, "image/jpeg")}, timeout=600
+        )
+        response.raise_for_status()
+        return len(response.content)
+
+    results = {}
+    seed = 10**7
+    try:
+        for width, height in sizes:
+            for _ in range(args.warmup):
+                call(synthetic_study(width, height, seed=seed))
+                seed += 1
+            for concurrency in concurrency_levels:
+                payloads = [synthetic_study(width, height, seed=seed + i) for i in range(args.requests)]
+                seed += args.requests
+                outcomes, elapsed = run_load(call, payloads, concurrency)
+
+                latencies = [latency for latency, _, error in outcomes if error is None]
+                errors = sum(1 for _, _, error in outcomes if error is not None)
+                sizes_bytes = [size for _, size, error in outcomes if error is None]
+
+                key = f"{args.service}/http/{width}x{height}/c{concurrency}"
+                results[key] = summarize(latencies, elapsed, errors)
+                if sizes_bytes:
+                    results[key]["mean_response_bytes"] = round(sum(sizes_bytes) / len(sizes_bytes))
+                print_result(key, results[key])
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    return results
+
+
+# ---------------------------------------------
+# Reporting and regression comparison
+# ---------------------------------------------
+def print_result(key, summary):
+    print(
+        f"   {key:<36} p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms "
+        f"{summary['throughput_rps']} req/s errors={summary['errors']}"
+    )
+    for stage, values in summary.get("stages", {}).items():
+        print(f"      {stage:<12} mean={values['mean_ms']}ms p95={values['p95_ms']}ms")
+
+
+def compare(current, baseline, threshold):
+    """Regressions of ``current`` against ``baseline`` beyond ``threshold`` (fraction)"""
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline.get("results", {}).get(key)
+        if reference is None:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            new, old = result.get(metric), reference.get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append((key, metric, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chest and bones model services")
+    parser.add_argument("service", choices=list(SERVICES))
+    parser.add_argument("--target", choices=["inprocess", "http", "both"], default="both")
+    parser.add_argument("--sizes", default="512x512,1024x1024", help="Image sizes, e.g. 512x512,2048x1536")
+    parser.add_argument("--concurrency", default="1,4", help="Concurrency levels, e.g. 1,4,8")
+    parser.add_argument("--requests", type=int, default=20, help="Measured requests per size and concurrency level")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per size")
+    parser.add_argument("--url", help="Benchmark an already running service instead of starting one")
+    parser.add_argument("--inference-mode", choices=["fp32", "int8"], default="fp32", help="In-process only")
+    parser.add_argument("--backend", choices=["eager", "torchscript"], default="eager", help="In-process bones only")
+    parser.add_argument("--profile", choices=["fast", "balanced", "thorough"], default="thorough", help="chest only")
+    parser.add_argument("--response-mode", default="inline", help="bones HTTP response_mode")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    sizes = parse_sizes(args.sizes)
+    concurrency_levels = parse_ints(args.concurrency)
+
+    import torch
+    report = {
+        "meta": {
+            "service": args.service,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "args": vars(args)
+        },
+        "results": {}
+    }
+
+    print(f"⏱️  Benchmarking {args.service}: sizes={args.sizes} concurrency={args.concurrency} requests={args.requests}")
+    if args.target in ("inprocess", "both"):
+        report["results"].update(bench_inprocess(args, sizes, concurrency_levels))
+    if args.target in ("http", "both"):
+        report["results"].update(bench_http(args, sizes, concurrency_levels))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for key, metric, old, new, change in regressions:
+                print(f"   {key} {metric}: {old} -> {new} ({change:+.1%})")
+            return 1
+        print(f"\n✅ No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,13 @@
 import streamlit as st
 import torch
 import torchvision
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
 from PIL import Image
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import numpy as np
 import warnings
 
+from bones_detector import CLASS_COLORS, CLASS_NAMES, NUM_CLASSES, load_detector
+from rendering import DetectionRenderer
+
 # ---------------------------------------------
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -15,21 +15,12 @@ warnings.filterwarnings("ignore")
 # ---------------------------------------------
 # Model + Helper Functions
 # ---------------------------------------------
-CLASSES = [
-    'elbow positive', 'fingers positive', 'forearm fracture',
-    'humerus fracture', 'humerus', 'shoulder fracture', 'wrist positive'
-]
-NUM_CLASSES = len(CLASSES)
+CLASSES = CLASS_NAMES
 
 
 def get_model(model_path="xray_models/bones/resnet.pt", device="cpu"):
     """Load a Faster R-CNN model with a ResNet50 backbone."""
-    model = torchvision.models.detection.fasterrcnn_resnet50_fpn(pretrained=True)
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, NUM_CLASSES)
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    model.to(device)
-    model.eval()
+    model, _ = load_detector(model_path, device, NUM_CLASSES)
     return model
 
 
@@ -45,34 +36,26 @@ def make_prediction(model, img, threshold):
         return preds
 
 
-def plot_image_from_output(img_tensor, annotation):
-    """Draw bounding boxes on the image tensor."""
-    img = img_tensor.cpu().detach().permute(1, 2, 0).numpy()
-    fig, ax = plt.subplots(1)
-    ax.imshow(img)
-    ax.axis("off")
+@st.cache_resource
+def get_renderer():
+    """Shared annotation renderer (font and label patches are built once)."""
+    return DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=30)
+
 
+def plot_image_from_output(image, annotation):
+    """Draw the highest-scoring detection on the image; returns (RGB array, class name)."""
+    image = image.copy()
     class_name = None
     if annotation and "scores" in annotation and len(annotation["scores"]) > 0:
         max_idx = torch.argmax(annotation["scores"]).item()
-        xmin, ymin, xmax, ymax = annotation["boxes"][max_idx].detach().cpu().numpy()
         label_idx = annotation["labels"][max_idx].item()
         class_name = CLASSES[label_idx] if label_idx < len(CLASSES) else "Unknown"
-
-        rect = patches.Rectangle(
-            (xmin, ymin), xmax - xmin, ymax - ymin,
-            linewidth=2, edgecolor="orange", facecolor="none"
+        get_renderer().render(
+            image, annotation["boxes"], annotation["scores"], annotation["labels"],
+            max_boxes=1, show_scores=False
         )
-        ax.add_patch(rect)
-        ax.text(xmin, ymin - 10, class_name, fontsize=12, color="orange", fontweight="bold")
-
-    return fig, class_name
-
 
-def figure_to_array(fig):
-    """Convert matplotlib figure to numpy array."""
-    fig.canvas.draw()
-    return np.array(fig.canvas.renderer._renderer)
+    return np.asarray(image), class_name
 
 
 # ---------------------------------------------
@@ -136,8 +119,7 @@ with tab2:
                     tensor_img = to_tensor(uploaded_image).unsqueeze(0).to(device)
 
                     preds = make_prediction(model, tensor_img, conf_threshold)
-                    fig, class_name = plot_image_from_output(tensor_img[0].cpu(), preds[0])
-                    img_array = figure_to_array(fig)
+                    img_array, class_name = plot_image_from_output(uploaded_image, preds[0])
 
                     with col2:
                         st.image(img_array, caption="Detection Result", use_column_width=True)
@@ -0,0 +1,196 @@
+"""
+Faster R-CNN bone fracture detector construction and loading
+Shared by the FastAPI service and the Streamlit app
+"""
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
+from torchvision.models.detection.faster_rcnn import FasterRCNN
+from torchvision.ops.misc import FrozenBatchNorm2d
+
+logger = logging.getLogger(__name__)
+
+# Class names (from bones_final.ipynb)
+CLASS_NAMES = [
+    'elbow positive',
+    'fingers positive',
+    'forearm fracture',
+    'humerus fracture',
+    'humerus',
+    'shoulder fracture',
+    'wrist positive'
+]
+NUM_CLASSES = len(CLASS_NAMES)
+
+# Annotation colour per class
+CLASS_COLORS = {
+    'elbow positive': (255, 0, 0),        # Red
+    'fingers positive': (255, 165, 0),    # Orange
+    'forearm fracture': (0, 255, 0),      # Green
+    'humerus fracture': (0, 0, 255),      # Blue
+    'humerus': (128, 0, 128),             # Purple
+    'shoulder fracture': (255, 255, 0),   # Yellow
+    'wrist positive': (0, 255, 255)       # Cyan
+}
+
+# Inference backends: eager PyTorch or the exported TorchScript graph
+BACKENDS = ("eager", "torchscript")
+
+
+def build_model(num_classes=NUM_CLASSES):
+    """
+    Build the bare detector architecture without downloading any pretrained weights
+
+    Mirrors what ``fasterrcnn_resnet50_fpn(pretrained=True)`` builds, which is
+    what resnet.pt was trained from: a FrozenBatchNorm2d backbone with eps=0
+    (as set for the COCO weights) and a 7-class box predictor.
+    """
+    try:
+        backbone = resnet_fpn_backbone(
+            backbone_name="resnet50", weights=None, norm_layer=FrozenBatchNorm2d, trainable_layers=3
+        )
+    except TypeError:
+        # torchvision < 0.13 has no weights API
+        backbone = resnet_fpn_backbone(
+            "resnet50", pretrained=False, norm_layer=FrozenBatchNorm2d, trainable_layers=3
+        )
+    model = FasterRCNN(backbone, num_classes=num_classes)
+
+    for module in model.modules():
+        if isinstance(module, FrozenBatchNorm2d):
+            module.eps = 0.0
+    return model
+
+
+def load_checkpoint(model_path):
+    """Load a state dict memory-mapped and weights-only where torch supports it"""
+    try:
+        return torch.load(str(model_path), map_location="cpu", mmap=True, weights_only=True)
+    except TypeError:
+        # torch < 2.1 has no mmap loading
+        return torch.load(str(model_path), map_location="cpu")
+    except RuntimeError:
+        # Legacy (non-zip) checkpoints cannot be memory-mapped
+        return torch.load(str(model_path), map_location="cpu", weights_only=True)
+
+
+def load_detector(model_path, device="cpu", num_classes=NUM_CLASSES):
+    """
+    Build the detector and load trained weights from ``model_path``
+
+    Parameters are allocated on the meta device and then assigned straight
+    from the checkpoint tensors, so no time is spent on random initialisation
+    that would be overwritten anyway.
+
+    Returns the model in eval mode and a dict of startup timings in ms.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    state_dict = load_checkpoint(model_path)
+    timings["checkpoint_load_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    try:
+        with torch.device("meta"):
+            model = build_model(num_classes)
+        model.load_state_dict(state_dict, assign=True)
+    except (AttributeError, TypeError):
+        # torch < 2.1: no device context manager / assign loading
+        model = build_model(num_classes)
+        model.load_state_dict(state_dict)
+    timings["build_and_assign_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    model.to(device)
+    model.eval()
+    timings["to_device_ms"] = (time.perf_counter() - start) * 1000
+
+    timings["total_ms"] = sum(timings.values())
+    logger.info(
+        "Detector startup: " + ", ".join(f"{k}={v:.1f}" for k, v in timings.items())
+    )
+    return model, timings
+
+
+class ScriptedDetector:
+    """
+    Call adapter for a TorchScript-exported detector
+
+    Scripted detection models always return a ``(losses, detections)`` tuple;
+    this unwraps the detections so callers see the same output as the eager
+    model. Every other attribute is forwarded to the scripted module.
+    """
+
+    def __init__(self, module):
+        self.module = module
+
+    def __call__(self, images):
+        _, detections = self.module(images)
+        return detections
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+
+def exported_path(model_path, inference_mode="fp32"):
+    """Location of the cached TorchScript artifact next to the weights"""
+    model_path = Path(model_path)
+    return model_path.with_name(f"{model_path.stem}.{inference_mode}.torchscript.pt")
+
+
+def load_exported_detector(model_path, device="cpu", num_classes=NUM_CLASSES, inference_mode="fp32"):
+    """
+    Load the TorchScript detector, exporting it first if needed
+
+    The artifact records the fingerprint of the checkpoint it was exported
+    from and is rebuilt whenever the weights change. Returns the detector and
+    a dict of startup timings in ms, like ``load_detector``.
+    """
+    from prediction_cache import model_fingerprint
+
+    artifact = exported_path(model_path, inference_mode)
+    source = model_fingerprint(model_path)
+
+    if artifact.exists():
+        start = time.perf_counter()
+        extra_files = {"source_fingerprint": ""}
+        try:
+            module = torch.jit.load(str(artifact), map_location=device, _extra_files=extra_files)
+        except RuntimeError as e:
+            # Unreadable artifact (e.g. left by an older version); export a fresh one
+            logger.warning(f"Could not load {artifact.name}, re-exporting: {str(e)}")
+        else:
+            if extra_files["source_fingerprint"].decode() == source:
+                module.eval()
+                timings = {"torchscript_load_ms": (time.perf_counter() - start) * 1000}
+                timings["total_ms"] = timings["torchscript_load_ms"]
+                logger.info(f"Loaded exported detector {artifact.name} in {timings['total_ms']:.1f}ms")
+                return ScriptedDetector(module), timings
+            logger.info(f"{artifact.name} was exported from different weights, re-exporting")
+
+    model, timings = load_detector(model_path, device, num_classes)
+    if inference_mode == "int8":
+        from quantization import quantize_detector
+        model = quantize_detector(model)
+
+    start = time.perf_counter()
+    module = torch.jit.script(model)
+    # Written to a unique temp file and renamed so a concurrent or killed export never leaves a partial artifact
+    with tempfile.NamedTemporaryFile(dir=artifact.parent, prefix=f"{artifact.stem}-", suffix=".tmp", delete=False) as temp:
+        pass
+    try:
+        torch.jit.save(module, temp.name, _extra_files={"source_fingerprint": source})
+        os.replace(temp.name, artifact)
+    except BaseException:
+        Path(temp.name).unlink(missing_ok=True)
+        raise
+    timings["torchscript_export_ms"] = (time.perf_counter() - start) * 1000
+    timings["total_ms"] = sum(v for k, v in timings.items() if k != "total_ms")
+    logger.info(f"Exported detector to {artifact.name} in {timings['torchscript_export_ms']:.1f}ms")
+    return ScriptedDetector(module), timings
@@ -1,16 +1,41 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import torch
-import torchvision
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
 from torchvision import transforms
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from pathlib import Path
-import io
+from typing import List
+import asyncio
+import time
+import zipfile
+import os
 import base64
 import uvicorn
 import logging
 
+from annotated_images import RESPONSE_MODES, AnnotatedImageStore, encode_jpeg, multipart_mixed
+from admission import (
+    AdmissionController, AdmissionMiddleware, DeadlineExceeded, Overloaded,
+    admit_more, check_deadline, current_deadline, overloaded_response
+)
+from batch_uploads import expand_uploads, stream_ndjson
+from batching import MicroBatcher
+from bones_detector import BACKENDS, CLASS_COLORS, CLASS_NAMES, NUM_CLASSES, load_detector, load_exported_detector
+from inference_executor import InferenceExecutor
+from metrics import CONTENT_TYPE, MetricsMiddleware, MetricsRegistry, process_memory_bytes
+from model_registry import registry
+from rendering import DetectionRenderer
+from residency import residency_manager
+from quantization import check_inference_mode, model_size_mb, quantize_detector
+from preprocessing import load_bounded_image, scale_boxes
+from profiling import ProfilingMiddleware, RequestProfiler, current_session, record_stage
+from prediction_cache import PredictionCache, image_digest, make_cache_key, model_fingerprint
+from singleflight import SingleFlight
+from tiling import fit_scale, merge_tile_detections, tile_grid
+from warmup import WarmupState, parse_ints, parse_sizes, run_warmup, synthetic_xray
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,6 +44,87 @@ logger = logging.getLogger(__name__)
 BASE_DIR = Path(__file__).resolve().parent
 MODEL_PATH = BASE_DIR / "xray_models" / "bones" / "resnet.pt"  # Updated to resnet.pt
 
+# Request aggregation settings for the detector
+BATCH_MAX_SIZE = int(os.getenv("BONES_BATCH_MAX_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BONES_BATCH_MAX_WAIT_MS", "15"))
+
+# Inference executor settings (torch threads default to an even split of the cores)
+INFERENCE_WORKERS = int(os.getenv("BONES_INFERENCE_WORKERS", "1"))
+TORCH_THREADS = int(os.getenv("BONES_TORCH_THREADS", "0")) or None
+
+# Numeric mode chosen at startup: "fp32" or "int8" (dynamic quantization, CPU only)
+INFERENCE_MODE = os.getenv("BONES_INFERENCE_MODE", "fp32").lower()
+
+# Inference backend: "eager" PyTorch or "torchscript" (exported once and cached next to the weights)
+BACKEND = os.getenv("BONES_BACKEND", "eager").lower()
+
+# Prediction cache settings (set BONES_CACHE_DB to a file path to enable the disk tier)
+CACHE_MAX_ENTRIES = int(os.getenv("BONES_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_MB = float(os.getenv("BONES_CACHE_MAX_MB", "16"))
+CACHE_DB = os.getenv("BONES_CACHE_DB", "")
+
+# Warm-up after loading (set BONES_WARMUP_SIZES to "" to skip)
+WARMUP_SIZES = parse_sizes(os.getenv("BONES_WARMUP_SIZES", "1024x1024"))
+WARMUP_BATCH_SIZES = parse_ints(os.getenv("BONES_WARMUP_BATCH_SIZES", "1"))
+
+# Uploads are decoded with their longer side capped at this many pixels (0 decodes at full size);
+# 1333 matches the detector's own max_size resize, so the model sees the same resolution
+MAX_INPUT_SIDE = int(os.getenv("BONES_MAX_INPUT_SIDE", "1333"))
+
+# Opt-in tiled mode (/predict?tiled=true): overlapping tiles run as one batch and are merged with NMS.
+# 800px tiles go through the detector's resize unscaled; larger images are shrunk to fit BONES_MAX_TILES
+TILE_SIZE = int(os.getenv("BONES_TILE_SIZE", "800"))
+TILE_OVERLAP = int(os.getenv("BONES_TILE_OVERLAP", "160"))
+MAX_TILES = max(1, int(os.getenv("BONES_MAX_TILES", "16")))
+TILE_NMS_IOU = float(os.getenv("BONES_TILE_NMS_IOU", "0.5"))
+TILED_MAX_INPUT_SIDE = int(os.getenv("BONES_TILED_MAX_INPUT_SIDE", "4096"))
+
+# Annotated image delivery: JPEG quality, longest side (0 keeps the decoded size),
+# thumbnail side and the server-side store used by response_mode=reference
+JPEG_QUALITY = int(os.getenv("BONES_JPEG_QUALITY", "75"))
+ANNOTATED_MAX_SIDE = int(os.getenv("BONES_ANNOTATED_MAX_SIDE", "0"))
+THUMBNAIL_SIDE = int(os.getenv("BONES_THUMBNAIL_SIDE", "256"))
+IMAGE_STORE_MB = float(os.getenv("BONES_IMAGE_STORE_MB", "64"))
+IMAGE_STORE_TTL_S = float(os.getenv("BONES_IMAGE_STORE_TTL_S", "600"))
+
+# Maximum number of images accepted by one /predict/batch request (zip entries included),
+# and the largest image and total uncompressed size (MB) it may unpack to
+BATCH_UPLOAD_MAX_IMAGES = int(os.getenv("BONES_BATCH_UPLOAD_MAX_IMAGES", "32"))
+BATCH_UPLOAD_MAX_IMAGE_MB = float(os.getenv("BONES_BATCH_UPLOAD_MAX_IMAGE_MB", "50"))
+BATCH_UPLOAD_MAX_TOTAL_MB = float(os.getenv("BONES_BATCH_UPLOAD_MAX_TOTAL_MB", "512"))
+
+# Opt-in request profiling: set a sample rate, or set BONES_PROFILE_HEADER=1 and send "X-Profile: 1"
+# to /predict (off by default: a profiled run bypasses the cache and batcher and writes a trace file).
+# Chrome traces are written to BONES_PROFILE_DIR, newest BONES_PROFILE_MAX_TRACES kept
+PROFILE_DIR = Path(os.getenv("BONES_PROFILE_DIR", str(BASE_DIR / "profiles")))
+PROFILE_SAMPLE_RATE = float(os.getenv("BONES_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_TRACES = int(os.getenv("BONES_PROFILE_MAX_TRACES", "50"))
+PROFILE_HEADER_ENABLED = os.getenv("BONES_PROFILE_HEADER", "0").lower() in ("1", "true", "yes", "on")
+
+# Admission control for /predict and /predict/batch: at most BONES_MAX_QUEUE
+# images queued or running (a batch upload counts each image; 0 = unbounded),
+# and a fast 503 with Retry-After while the estimated queue wait is over
+# BONES_QUEUE_SLO_MS.
+# Requests still queued at their deadline (X-Request-Timeout-Ms header, else
+# BONES_DEFAULT_DEADLINE_MS; 0 = none) are dropped before inference with a 504
+MAX_QUEUE = int(os.getenv("BONES_MAX_QUEUE", str(8 * BATCH_MAX_SIZE)))
+QUEUE_SLO_MS = float(os.getenv("BONES_QUEUE_SLO_MS", "10000"))
+DEFAULT_DEADLINE_MS = float(os.getenv("BONES_DEFAULT_DEADLINE_MS", "30000"))
+
+# Model residency: after BONES_IDLE_OFFLOAD_S idle seconds (0 = never) the weights move to a
+# memory-mapped file in MODEL_OFFLOAD_DIR and are reloaded on the next request.
+# MODEL_MEMORY_BUDGET_MB caps the resident weights of all models in the process
+IDLE_OFFLOAD_S = float(os.getenv("BONES_IDLE_OFFLOAD_S", "0"))
+OFFLOAD_DIR = Path(os.getenv("MODEL_OFFLOAD_DIR", str(BASE_DIR / "offload")))
+
+# Number of pre-fork worker processes serving this app (set by prefork.py). The reference-mode
+# image store lives in each worker, so response_mode=reference is refused when requests are
+# spread over several: GET /images/{id} could land on a worker that doesn't have the image
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "1"))
+
+# Minimum score for a detection to be reported
+CONFIDENCE_THRESHOLD = 0.5
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RadiantClariX Bones Model API",
@@ -26,6 +132,14 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Admission control, added first so it runs inside the other middleware:
+# rejected requests still get CORS headers and show up in the metrics
+admission = AdmissionController(
+    "bones", MAX_QUEUE, QUEUE_SLO_MS, DEFAULT_DEADLINE_MS,
+    estimate_wait_ms=lambda: detection_batcher.estimated_wait_ms()
+)
+app.add_middleware(AdmissionMiddleware, controller=admission, paths=["/predict", "/predict/batch"])
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,36 +149,309 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics, scraped from /metrics
+metrics = MetricsRegistry("bones")
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# Per-request profiling; stage timers of profiled requests go into their traces
+profiler = RequestProfiler(
+    "bones", PROFILE_DIR,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    max_traces=PROFILE_MAX_TRACES,
+    allow_header=PROFILE_HEADER_ENABLED,
+    paths=["/predict"]
+)
+metrics.add_stage_listener(record_stage)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
 # Global variables for model
 model = None
 device = None
+detection_batcher = None
+inference_executor = None
+prediction_cache = None
+model_version = None
+inference_mode = None
+model_residency = None
+backend = None
+inflight_predictions = SingleFlight(name="bones-predict")
+annotated_images = AnnotatedImageStore(max_bytes=int(IMAGE_STORE_MB * 1024 * 1024), ttl_s=IMAGE_STORE_TTL_S)
+warmup_state = WarmupState()
+warmup_task = None
+startup_timings = {}
+renderer = None
+
+# Values read from the running service at scrape time
+metrics.gauge("queue_depth", "Detection requests waiting for a batch", lambda: detection_batcher.queue_depth())
+metrics.gauge("estimated_queue_wait_seconds", "Expected wait before a new detection request is run", lambda: detection_batcher.estimated_wait_ms() / 1000)
+metrics.gauge("admitted_requests", "Requests admitted and not yet answered", lambda: admission.in_flight)
+metrics.counter_callback(
+    "admission_rejections_total", "Requests shed with 503 by reason",
+    lambda: {(reason,): count for reason, count in admission.rejected.items()},
+    ["reason"]
+)
+metrics.counter_callback("deadline_expired_total", "Requests dropped at their deadline before inference", lambda: admission.expired)
+metrics.gauge("predictions_in_flight", "Distinct predictions currently running", lambda: inflight_predictions.stats()["in_flight"])
+metrics.gauge("model_resident", "1 while the model weights are in memory, 0 while offloaded", lambda: int(model_residency.state == "resident"))
+metrics.gauge("model_memory_bytes", "Size of model parameters and buffers", lambda: model_size_mb(model) * 1024 * 1024)
+metrics.gauge("process_resident_memory_bytes", "Resident memory of the service process", process_memory_bytes)
+metrics.gauge("inference_workers", "Inference executor threads", lambda: inference_executor.stats()["max_workers"])
+metrics.gauge("torch_threads_per_worker", "Torch intra-op threads per inference worker", lambda: inference_executor.stats()["torch_threads_per_worker"])
+metrics.gauge("annotated_images_stored_bytes", "Bytes held by the reference-mode image store", lambda: annotated_images.stats()["bytes"])
+metrics.counter_callback(
+    "cache_lookups_total", "Prediction cache lookups by result",
+    lambda: {("hit",): prediction_cache.stats()["hits"], ("miss",): prediction_cache.stats()["misses"]},
+    ["result"]
+)
+
+def timed_stage(name, fn, *args):
+    """Call ``fn(*args)`` timed as stage ``name``; used for work handed to the threadpool"""
+    with metrics.stage(name):
+        return fn(*args)
+
+def detect_batch(img_tensors):
+    """Run one Faster R-CNN forward pass over a list of variable-size image tensors"""
+    with model_residency.use(), metrics.stage("forward"), torch.no_grad():
+        outputs = model([t.to(device) for t in img_tensors])
+    
+    return [{k: v.cpu() for k, v in output.items()} for output in outputs]
 
-# Class names (from bones_final.ipynb)
-CLASS_NAMES = [
-    'elbow positive',
-    'fingers positive',
-    'forearm fracture',
-    'humerus fracture',
-    'humerus',
-    'shoulder fracture',
-    'wrist positive'
-]
-NUM_CLASSES = len(CLASS_NAMES)
-
-CLASS_COLORS = {
-    'elbow positive': (255, 0, 0),        # Red
-    'fingers positive': (255, 165, 0),    # Orange
-    'forearm fracture': (0, 255, 0),      # Green
-    'humerus fracture': (0, 0, 255),      # Blue
-    'humerus': (128, 0, 128),             # Purple
-    'shoulder fracture': (255, 255, 0),   # Yellow
-    'wrist positive': (0, 255, 255)       # Cyan
-}
+async def run_detection(image, cache_key, deadline=current_deadline):
+    """
+    Detect fractures in a decoded image and store the thresholded result in the cache
+    
+    The work is dropped if ``deadline()`` passes before it reaches the model.
+    """
+    # Transform image for model
+    transform = transforms.Compose([transforms.ToTensor()])
+    img_tensor = await run_in_threadpool(timed_stage, "preprocess", transform, image)
+    
+    # Run inference (aggregated with other concurrent uploads); profiled
+    # requests run on their own so the trace shows only this image
+    session = current_session()
+    if session is not None:
+        check_deadline(deadline)
+        output = (await inference_executor.run(session.run, detect_batch, [img_tensor]))[0]
+    else:
+        output = await detection_batcher.submit(img_tensor, deadline=deadline)
+    
+    # Filter by confidence threshold
+    keep = output['scores'] > CONFIDENCE_THRESHOLD
+    detections = {
+        "boxes": output['boxes'][keep].tolist(),
+        "scores": output['scores'][keep].tolist(),
+        "labels": output['labels'][keep].tolist()
+    }
+    prediction_cache.put(cache_key, detections)
+    return detections
+
+def decode_for_tiling(contents):
+    """Decode an upload for tiled detection, shrinking it until it fits in MAX_TILES tiles"""
+    image, scale = load_bounded_image(contents, TILED_MAX_INPUT_SIDE)
+    fit = fit_scale(image.width, image.height, TILE_SIZE, TILE_OVERLAP, MAX_TILES)
+    if fit < 1.0:
+        width, height = image.size
+        image = image.resize((max(1, int(width * fit)), max(1, int(height * fit))), Image.BILINEAR)
+        scale = (scale[0] * width / image.width, scale[1] * height / image.height)
+    return image, scale
+
+def detect_tiles(image, tiles):
+    """Crop every tile of one image and run them as a single detector batch"""
+    to_tensor = transforms.ToTensor()
+    tensors, prep_ms = [], []
+    for tile in tiles:
+        start = time.perf_counter()
+        tensors.append(to_tensor(image.crop(tile)))
+        prep_ms.append((time.perf_counter() - start) * 1000)
+    metrics.observe_stage("preprocess", sum(prep_ms) / 1000)
+    
+    start = time.perf_counter()
+    outputs = detect_batch(tensors)
+    inference_ms = (time.perf_counter() - start) * 1000
+    return outputs, prep_ms, inference_ms
+
+async def run_tiled_detection(image, cache_key, deadline=current_deadline):
+    """Tiled detection of a decoded image; caches the merged result and returns it with per-tile timings"""
+    tiles = tile_grid(image.width, image.height, TILE_SIZE, TILE_OVERLAP)
+    check_deadline(deadline)
+    session = current_session()
+    if session is not None:
+        outputs, prep_ms, inference_ms = await inference_executor.run(session.run, detect_tiles, image, tiles)
+    else:
+        outputs, prep_ms, inference_ms = await inference_executor.run(detect_tiles, image, tiles)
+    
+    merged = merge_tile_detections(outputs, tiles, CONFIDENCE_THRESHOLD, TILE_NMS_IOU)
+    detections = {k: v.tolist() for k, v in merged.items()}
+    prediction_cache.put(cache_key, detections)
+    
+    # The tiles share one forward pass, so its time is split evenly between them
+    tile_stats = [
+        {
+            "tile": list(tile),
+            "detections": int((output["scores"] > CONFIDENCE_THRESHOLD).sum()),
+            "prep_ms": round(prep, 1),
+            "inference_ms": round(inference_ms / len(tiles), 1)
+        }
+        for tile, output, prep in zip(tiles, outputs, prep_ms)
+    ]
+    logger.info(f"Tiled detection: {len(tiles)} tiles in {inference_ms:.1f}ms")
+    return detections, {"inference_ms": round(inference_ms, 1), "tiles": tile_stats}
+
+async def run_uncached(cache_key, predict):
+    """
+    Run a prediction missing from the cache, shared with identical uploads in flight unless profiled
+    
+    ``predict(deadline)`` gets a callable returning the time to drop the work
+    at: the latest deadline of the requests sharing it.
+    """
+    if current_session() is not None:
+        return await predict(current_deadline)
+    return await inflight_predictions.do(cache_key, predict, deadline=current_deadline())
+
+async def analyze_image(contents, tiled=False, response_mode="inline", thumbnail=False):
+    """
+    Detect, describe and annotate one uploaded image
+    
+    Returns the response dict and, for response_mode=multipart, the
+    annotated JPEG bytes that go alongside it (otherwise None).
+    """
+    if tiled:
+        image, scale = await run_in_threadpool(timed_stage, "decode", decode_for_tiling, contents)
+        params = {
+            "threshold": CONFIDENCE_THRESHOLD, "tiled": True, "max_input_side": TILED_MAX_INPUT_SIDE,
+            "tile_size": TILE_SIZE, "overlap": TILE_OVERLAP, "max_tiles": MAX_TILES, "nms_iou": TILE_NMS_IOU
+        }
+    else:
+        image, scale = await run_in_threadpool(timed_stage, "decode", load_bounded_image, contents, MAX_INPUT_SIDE)
+        params = {"threshold": CONFIDENCE_THRESHOLD, "max_input_side": MAX_INPUT_SIDE}
+    original_size = [round(image.width * scale[0]), round(image.height * scale[1])]
+    cache_key = make_cache_key(image_digest(contents), model_version, params)
+    
+    # Repeated uploads reuse the cached detections and skip the model;
+    # identical uploads already in flight share that run. Profiled requests
+    # always run the model
+    session = current_session()
+    detections = prediction_cache.get(cache_key) if session is None else None
+    cache_hit = detections is not None
+    tiling = None
+    if tiled:
+        tiling = {"num_tiles": len(tile_grid(image.width, image.height, TILE_SIZE, TILE_OVERLAP)), "tiles": None}
+        if not cache_hit:
+            detections, timings = await run_uncached(
+                cache_key, lambda deadline: run_tiled_detection(image, cache_key, deadline)
+            )
+            tiling.update(timings)
+    elif not cache_hit:
+        detections = await run_uncached(
+            cache_key, lambda deadline: run_detection(image, cache_key, deadline)
+        )
+    
+    # Prepare findings (detections are in decoded-image space, findings in original space)
+    findings = format_findings(detections, scale)
+    caption = describe_findings(findings)
+    
+    result = {
+        "success": True,
+        "detections": len(findings),
+        "findings": findings,
+        "caption": caption,
+        "cached": cache_hit,
+        "original_size": original_size,
+        "tiling": tiling
+    }
+    if session is not None:
+        result["trace_id"] = session.trace_id
+    if response_mode == "findings" and not thumbnail:
+        return result, None
+    
+    # Draw annotations and encode off the event loop
+    image = await run_in_threadpool(
+        timed_stage, "draw", renderer.render, image, detections["boxes"], detections["scores"], detections["labels"]
+    )
+    if thumbnail:
+        thumb_bytes, _ = await run_in_threadpool(timed_stage, "encode", encode_jpeg, image, JPEG_QUALITY, THUMBNAIL_SIDE)
+        result["thumbnail_base64"] = f"data:image/jpeg;base64,{base64.b64encode(thumb_bytes).decode('utf-8')}"
+    if response_mode == "findings":
+        return result, None
+    
+    jpeg_bytes, annotated_size = await run_in_threadpool(
+        timed_stage, "encode", encode_jpeg, image, JPEG_QUALITY, ANNOTATED_MAX_SIDE
+    )
+    result["annotated_size"] = list(annotated_size)
+    
+    if response_mode == "multipart":
+        return result, jpeg_bytes
+    if response_mode == "reference":
+        image_id = annotated_images.put(jpeg_bytes)
+        result["image_id"] = image_id
+        result["image_url"] = f"/images/{image_id}"
+    else:
+        with metrics.stage("base64"):
+            result["image_base64"] = f"data:image/jpeg;base64,{base64.b64encode(jpeg_bytes).decode('utf-8')}"
+    return result, None
+
+def load_bones_model(device, mode="fp32", backend_name="eager"):
+    """
+    Load the detector with the given numeric mode and backend
+    
+    Shared with bulk_analyze.py. Returns the model and its startup timings in ms.
+    """
+    # Check if model file exists
+    if not MODEL_PATH.exists():
+        raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend_name}', expected one of {BACKENDS}")
+    
+    if backend_name == "torchscript":
+        return load_exported_detector(MODEL_PATH, device, NUM_CLASSES, mode)
+    
+    # Build the bare architecture and load trained weights (no ImageNet/COCO download)
+    detector, timings = load_detector(MODEL_PATH, device, NUM_CLASSES)
+    if mode == "int8":
+        detector = quantize_detector(detector)
+    return detector, timings
+
+def format_findings(detections, scale):
+    """Findings list from thresholded detections, with boxes mapped back to original-image pixels"""
+    original_boxes = scale_boxes(detections["boxes"], scale)
+    findings = []
+    for label_idx, confidence, box in zip(detections["labels"], detections["scores"], original_boxes):
+        label_name = CLASS_NAMES[label_idx] if label_idx < len(CLASS_NAMES) else f"class_{label_idx}"
+        
+        findings.append({
+            "type": label_name,
+            "confidence": round(float(confidence) * 100, 1),
+            "box": [float(x) for x in box]
+        })
+    return findings
+
+def describe_findings(findings):
+    """Text caption summarising the findings"""
+    if len(findings) == 0:
+        return "No fractures detected in the bone X-ray. The bones appear to be intact with no visible abnormalities."
+    fracture_list = [f"{f['type']} ({f['confidence']}% confidence)" for f in findings]
+    caption = f"Detected {len(findings)} potential fracture(s): {', '.join(fracture_list)}. "
+    caption += "Please consult with a medical professional for proper diagnosis and treatment."
+    return caption
+
+def shared_detector(device, mode, backend_name, user="bones"):
+    """
+    load_bones_model through the process-wide model registry
+    
+    Loads once per process; a model preloaded by prefork.py before the
+    workers were forked is reused instead of loaded again.
+    """
+    return registry.get_or_load(
+        user, MODEL_PATH, lambda: load_bones_model(device, mode, backend_name),
+        device=device, mode=mode, backend=backend_name
+    )
 
 @app.on_event("startup")
 async def load_model():
     """Load the ResNet-based Faster R-CNN model on startup"""
-    global model, device
+    global model, device, detection_batcher, inference_executor, prediction_cache, model_version
+    global inference_mode, model_residency
+    global startup_timings, warmup_task, backend, renderer
     
     try:
         logger.info("Loading ResNet-based Faster R-CNN model for bone fracture detection...")
@@ -73,19 +460,46 @@ async def load_model():
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Using device: {device}")
         
-        # Check if model file exists
-        if not MODEL_PATH.exists():
-            raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
+        inference_mode = check_inference_mode(INFERENCE_MODE, device)
+        backend = BACKEND
+        model, startup_timings = shared_detector(device, inference_mode, backend)
+        logger.info(f"Inference mode: {inference_mode}, backend: {backend} ({model_size_mb(model)} MB)")
+        
+        # Fonts and class label patches are prepared once, not per request
+        renderer = DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=30)
         
-        # Load model with pretrained ResNet50 backbone
-        model = torchvision.models.detection.fasterrcnn_resnet50_fpn(pretrained=True)
-        in_features = model.roi_heads.box_predictor.cls_score.in_features
-        model.roi_heads.box_predictor = FastRCNNPredictor(in_features, NUM_CLASSES)
+        model_version = f"{model_fingerprint(MODEL_PATH)}-{inference_mode}-{backend}"
+        model_residency = residency_manager.register(
+            "bones", model, OFFLOAD_DIR / f"bones-{model_version}.pt", IDLE_OFFLOAD_S
+        )
+        prediction_cache = PredictionCache(
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+            disk_path=CACHE_DB or None
+        )
         
-        # Load trained weights
-        model.load_state_dict(torch.load(str(MODEL_PATH), map_location=device))
-        model.to(device)
-        model.eval()
+        inference_executor = InferenceExecutor(
+            max_workers=INFERENCE_WORKERS,
+            torch_threads=TORCH_THREADS,
+            name="bones-inference"
+        )
+        detection_batcher = MicroBatcher(
+            detect_batch,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            name="bones-detect",
+            executor=inference_executor
+        )
+        
+        # Warm up in the background so /health answers while /ready reports progress
+        warmup_task = asyncio.get_running_loop().create_task(run_warmup(
+            warmup_state,
+            inference_executor,
+            detect_batch,
+            lambda w, h: transforms.ToTensor()(synthetic_xray(w, h)),
+            WARMUP_SIZES,
+            WARMUP_BATCH_SIZES
+        ))
         
         logger.info("ResNet Bones model loaded successfully!")
         
@@ -93,6 +507,19 @@ async def load_model():
         logger.error(f"Failed to load model: {str(e)}")
         raise e
 
+@app.on_event("shutdown")
+async def stop_batcher():
+    """Fail any queued detection requests on shutdown"""
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if detection_batcher is not None:
+        await detection_batcher.stop()
+    if inference_executor is not None:
+        inference_executor.shutdown()
+    if model is not None:
+        residency_manager.unregister(model)
+    registry.release("bones")
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -102,120 +529,183 @@ async def root():
         "model_loaded": model is not None
     }
 
+@app.get("/live")
+async def liveness_check():
+    """Liveness probe: the process is up and the event loop is responsive"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: only ready once the model is loaded and warmed up"""
+    ready = model is not None and warmup_state.ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "model_loaded": model is not None,
+            "warmup": warmup_state.to_dict()
+        }
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request counts and latency, per-stage timings, queue and memory gauges"""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy" if model is not None else "unhealthy",
+        "ready": model is not None and warmup_state.ready,
         "model_loaded": model is not None,
         "device": str(device) if device else "not initialized",
         "model_type": "Faster R-CNN",
         "num_classes": len(CLASS_NAMES),
-        "classes": CLASS_NAMES
+        "classes": CLASS_NAMES,
+        "startup_timings_ms": {k: round(v, 1) for k, v in startup_timings.items()},
+        "batching": {
+            "max_batch_size": BATCH_MAX_SIZE,
+            "max_wait_ms": BATCH_MAX_WAIT_MS,
+            "queue_depth": detection_batcher.queue_depth() if detection_batcher else 0
+        },
+        "executor": inference_executor.stats() if inference_executor else None,
+        "model_version": model_version,
+        "inference_mode": inference_mode,
+        "backend": backend,
+        "model_size_mb": model_size_mb(model) if model is not None else None,
+        "cache": prediction_cache.stats() if prediction_cache else None,
+        "in_flight": inflight_predictions.stats(),
+        "admission": admission.stats(),
+        "max_input_side": MAX_INPUT_SIDE,
+        "annotated_images": annotated_images.stats(),
+        "profiling": profiler.stats(),
+        "residency": residency_manager.stats(),
+        "prefork_workers": PREFORK_WORKERS,
+        "tiling": {
+            "tile_size": TILE_SIZE,
+            "overlap": TILE_OVERLAP,
+            "max_tiles": MAX_TILES,
+            "nms_iou": TILE_NMS_IOU
+        }
     }
 
+def check_reference_mode(response_mode):
+    """Refuse response_mode=reference when the image store isn't shared by every worker"""
+    if response_mode == "reference" and PREFORK_WORKERS > 1:
+        raise HTTPException(
+            status_code=400,
+            detail="response_mode=reference is unavailable with several pre-fork workers (stored images are per worker)"
+        )
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(
+    file: UploadFile = File(...),
+    tiled: bool = False,
+    response_mode: str = "inline",
+    thumbnail: bool = False
+):
     """
     Predict bone fractures in uploaded X-ray image
     
+    With ``tiled=true`` the image is processed as overlapping tiles at close
+    to native resolution, for large radiographs with small findings.
+    
+    ``response_mode`` selects how the annotated image is delivered:
+    - inline: base64 JPEG data URI in "image_base64" (default)
+    - findings: no annotated image at all
+    - reference: stored server-side, fetch it from "image_url" (GET /images/{id})
+    - multipart: multipart/mixed body with this JSON followed by the raw JPEG
+    ``thumbnail=true`` adds a small inline "thumbnail_base64" in any mode.
+    
     Returns:
     - detections: number of fractures detected
-    - image_base64: annotated image with bounding boxes
-    - findings: list of detected fractures with details
+    - image_base64: annotated image with bounding boxes (inline mode)
+    - findings: list of detected fractures with details (boxes in original-image pixels)
     - caption: text description of findings
+    - tiling: tile grid and per-tile timings (tiled mode only)
+    - trace_id: id of the saved profiler trace (profiled requests only, see X-Profile)
     """
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
+    if response_mode not in RESPONSE_MODES:
+        raise HTTPException(status_code=400, detail=f"response_mode must be one of {list(RESPONSE_MODES)}")
+    check_reference_mode(response_mode)
     
     try:
         # Read and process image
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents)).convert("RGB")
-        
-        # Transform image for model
-        transform = transforms.Compose([transforms.ToTensor()])
-        img_tensor = transform(image).unsqueeze(0).to(device)
-        
-        # Run inference
-        with torch.no_grad():
-            outputs = model(img_tensor)
-        
-        # Extract predictions
-        boxes = outputs[0]['boxes'].cpu()
-        scores = outputs[0]['scores'].cpu()
-        labels = outputs[0]['labels'].cpu()
-        
-        # Filter by confidence threshold
-        threshold = 0.5
-        filtered_indices = scores > threshold
-        filtered_boxes = boxes[filtered_indices]
-        filtered_scores = scores[filtered_indices]
-        filtered_labels = labels[filtered_indices]
-        
-        # Prepare findings list
-        findings = []
-        for i in range(len(filtered_boxes)):
-            label_idx = int(filtered_labels[i].item())
-            label_name = CLASS_NAMES[label_idx] if label_idx < len(CLASS_NAMES) else f"class_{label_idx}"
-            confidence = float(filtered_scores[i].item())
-            
-            findings.append({
-                "type": label_name,
-                "confidence": round(confidence * 100, 1),
-                "box": [float(x) for x in filtered_boxes[i].tolist()]
-            })
-        
-        # Draw annotations on image
-        draw = ImageDraw.Draw(image)
-        try:
-            # Try to use a larger font
-            font = ImageFont.truetype("arial.ttf", 30)
-        except:
-            # Fallback to default font
-            font = ImageFont.load_default()
-        
-        for i, box in enumerate(filtered_boxes):
-            x1, y1, x2, y2 = box
-            label_idx = int(filtered_labels[i].item())
-            label_name = CLASS_NAMES[label_idx] if label_idx < len(CLASS_NAMES) else f"class_{label_idx}"
-            color = CLASS_COLORS.get(label_name, (255, 0, 0))
-            score = filtered_scores[i].item()
-            
-            # Draw bounding box
-            draw.rectangle([(x1, y1), (x2, y2)], outline=color, width=3)
-            
-            # Draw label with background
-            label_text = f"{label_name}: {score:.2f}"
-            bbox = draw.textbbox((x1, y1), label_text, font=font)
-            draw.rectangle(bbox, fill=color)
-            draw.text((x1 + 5, y1 + 5), label_text, fill=(255, 255, 255), font=font)
-        
-        # Convert annotated image to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        
-        # Generate text caption
-        if len(findings) == 0:
-            caption = "No fractures detected in the bone X-ray. The bones appear to be intact with no visible abnormalities."
-        else:
-            fracture_list = [f"{f['type']} ({f['confidence']}% confidence)" for f in findings]
-            caption = f"Detected {len(findings)} potential fracture(s): {', '.join(fracture_list)}. "
-            caption += "Please consult with a medical professional for proper diagnosis and treatment."
-        
-        return {
-            "success": True,
-            "detections": len(filtered_boxes),
-            "image_base64": f"data:image/jpeg;base64,{img_str}",
-            "findings": findings,
-            "caption": caption
-        }
+        result, jpeg_bytes = await analyze_image(contents, tiled, response_mode, thumbnail)
+        if response_mode == "multipart":
+            body, content_type = multipart_mixed(result, jpeg_bytes)
+            return Response(content=body, media_type=content_type)
+        return result
         
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/predict/batch")
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    tiled: bool = False,
+    response_mode: str = "inline",
+    thumbnail: bool = False
+):
+    """
+    Detect fractures in several X-rays in one request
+    
+    Accepts image files and/or zip archives of images, with the same options
+    as /predict (multipart responses aside). Streams NDJSON, one line per
+    image in completion order with its "index" and "filename". Images run
+    concurrently so the detector sees real batches; a failing image gets
+    "success": false and the rest go on.
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if response_mode not in RESPONSE_MODES or response_mode == "multipart":
+        modes = [mode for mode in RESPONSE_MODES if mode != "multipart"]
+        raise HTTPException(status_code=400, detail=f"response_mode must be one of {modes}")
+    check_reference_mode(response_mode)
+    
+    uploads = [(file.filename, file.content_type, await file.read()) for file in files]
+    try:
+        images = await run_in_threadpool(
+            expand_uploads, uploads, BATCH_UPLOAD_MAX_IMAGES,
+            int(BATCH_UPLOAD_MAX_IMAGE_MB * 1024 * 1024), int(BATCH_UPLOAD_MAX_TOTAL_MB * 1024 * 1024)
+        )
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not images:
+        raise HTTPException(status_code=400, detail="No images found in the upload")
+    
+    # Admitted as one request before the upload was read; now count every image
+    try:
+        admit_more(len(images) - 1)
+    except Overloaded as e:
+        return overloaded_response(e.rejection)
+    
+    async def process(name, contents):
+        try:
+            result, _ = await analyze_image(contents, tiled, response_mode, thumbnail)
+        except DeadlineExceeded:
+            admission.record_expired()
+            raise
+        return result
+    
+    logger.info(f"Batch prediction: {len(images)} image(s)")
+    return StreamingResponse(stream_ndjson(images, process), media_type="application/x-ndjson")
+
+@app.get("/images/{image_id}")
+async def get_annotated_image(image_id: str):
+    """Annotated JPEG stored by a response_mode=reference prediction"""
+    data = annotated_images.get(image_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found or expired")
+    return Response(content=data, media_type="image/jpeg")
+
 if __name__ == "__main__":
     uvicorn.run(
         "bones_model_api:app",
@@ -0,0 +1,301 @@
+"""
+Offline bulk analysis of X-ray archives
+Walks a directory, runs the bones detector or the chest captioner over every
+image in model worker processes and appends results as they finish, so an
+interrupted run picks up where it stopped. Images that failed are retried on
+the next run; their earlier error rows stay in the output, so readers should
+keep the last row per path
+
+Usage:
+    python bulk_analyze.py bones /data/xrays --output bones.jsonl
+    python bulk_analyze.py chest /data/xrays --output chest.jsonl --workers 2 --threads 4
+    python bulk_analyze.py bones /data/xrays --output bones_parquet/ --format parquet --batch-size 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+# Per-process state, set up once by init_worker
+_worker = {}
+
+
+def find_images(root):
+    """All image files under ``root`` in a stable order"""
+    return sorted(
+        str(p) for p in Path(root).rglob("*")
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def init_worker(task, threads, decode_threads, mode, backend, profile, max_input_side):
+    """Load the model once per worker process with its share of the CPU threads"""
+    import torch
+    torch.set_num_threads(threads)
+    _worker["task"] = task
+    _worker["decoder"] = ThreadPoolExecutor(max_workers=decode_threads)
+    _worker["max_input_side"] = max_input_side
+
+    if task == "bones":
+        import bones_model_api
+        model, _ = bones_model_api.load_bones_model("cpu", mode, backend)
+        _worker["model"] = model
+    else:
+        import chest_model_api
+        from decoding import DECODING_PROFILES
+        model, processor, _ = chest_model_api.load_captioner("cpu", mode)
+        _worker["model"] = model
+        _worker["processor"] = processor
+        _worker["generation_kwargs"] = DECODING_PROFILES[profile]
+
+
+def decode(path):
+    """Read and decode one image; returns (image, scale) or the exception"""
+    from preprocessing import load_bounded_image
+    try:
+        return load_bounded_image(Path(path).read_bytes(), _worker["max_input_side"])
+    except Exception as e:
+        return e
+
+
+def analyze_chunk(paths):
+    """Decode a chunk of images in threads and run them through the model as one batch"""
+    import torch
+
+    decoded = list(_worker["decoder"].map(decode, paths))
+    results = [None] * len(paths)
+    ok = []
+    for i, (path, item) in enumerate(zip(paths, decoded)):
+        if isinstance(item, Exception):
+            results[i] = {"path": path, "error": f"decode failed: {item}"}
+        else:
+            ok.append(i)
+
+    if ok:
+        try:
+            with torch.no_grad():
+                if _worker["task"] == "bones":
+                    from torchvision.transforms.functional import to_tensor
+                    import bones_model_api
+                    outputs = _worker["model"]([to_tensor(decoded[i][0]) for i in ok])
+                    for i, output in zip(ok, outputs):
+                        keep = output["scores"] > bones_model_api.CONFIDENCE_THRESHOLD
+                        detections = {k: v[keep].tolist() for k, v in output.items()}
+                        image, scale = decoded[i]
+                        findings = bones_model_api.format_findings(detections, scale)
+                        results[i] = {
+                            "path": paths[i],
+                            "detections": len(findings),
+                            "findings": findings,
+                            "original_size": [round(image.width * scale[0]), round(image.height * scale[1])]
+                        }
+                else:
+                    processor = _worker["processor"]
+                    inputs = processor(images=[decoded[i][0] for i in ok], return_tensors="pt")
+                    generated_ids = _worker["model"].generate(**inputs, **_worker["generation_kwargs"])
+                    for i, caption in zip(ok, processor.batch_decode(generated_ids, skip_special_tokens=True)):
+                        results[i] = {"path": paths[i], "caption": caption}
+        except Exception as e:
+            # One bad batch shouldn't stop the run; its images are reported as failed
+            for i in ok:
+                results[i] = {"path": paths[i], "error": f"inference failed: {e}"}
+    return results
+
+
+class JsonlWriter:
+    """Appends one JSON line per result; the file itself is the resume checkpoint"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def done_paths(self):
+        """Paths with a successful result (error rows don't count, so they are retried)"""
+        done = set()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        if not row.get("error"):
+                            done.add(row["path"])
+                    except (ValueError, KeyError, AttributeError):
+                        # Partially written last line of an interrupted run
+                        continue
+        return done
+
+    def open(self):
+        self._drop_partial_line()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _drop_partial_line(self):
+        """Truncate an interrupted run's unterminated last line so new rows start on a line of their own"""
+        if not self.path.exists():
+            return
+        with open(self.path, "r+b") as f:
+            end = f.seek(0, 2)
+            pos = end
+            while pos > 0:
+                start = max(0, pos - 65536)
+                f.seek(start)
+                chunk = f.read(pos - start)
+                if pos == end and chunk.endswith(b"\n"):
+                    return
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    f.truncate(start + newline + 1)
+                    return
+                pos = start
+            f.truncate(0)
+
+    def write(self, results):
+        for result in results:
+            self._file.write(json.dumps(result) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Writes results as numbered Parquet part files in a directory
+
+    Rows are buffered and flushed every ``rows_per_part`` results. Every
+    part has the same per-task schema, with nested findings stored as a JSON
+    string. Existing parts are the resume checkpoint.
+    """
+
+    def __init__(self, path, task, rows_per_part=1000):
+        import pyarrow as pa
+        self.path = Path(path)
+        self.rows_per_part = rows_per_part
+        self._rows = []
+        if task == "bones":
+            self.schema = pa.schema([
+                ("path", pa.string()),
+                ("detections", pa.int64()),
+                ("findings", pa.string()),
+                ("original_size", pa.list_(pa.int64())),
+                ("error", pa.string())
+            ])
+        else:
+            self.schema = pa.schema([("path", pa.string()), ("caption", pa.string()), ("error", pa.string())])
+
+    def _parts(self):
+        return sorted(self.path.glob("part-*.parquet")) if self.path.exists() else []
+
+    def done_paths(self):
+        """Paths with a successful result (error rows don't count, so they are retried)"""
+        import pyarrow.parquet as pq
+        done = set()
+        for part in self._parts():
+            table = pq.read_table(part, columns=["path", "error"])
+            done.update(
+                path for path, error in zip(table.column("path").to_pylist(), table.column("error").to_pylist())
+                if not error
+            )
+        return done
+
+    def open(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._next_part = len(self._parts())
+
+    def write(self, results):
+        for result in results:
+            row = dict(result)
+            if "findings" in row:
+                row["findings"] = json.dumps(row["findings"])
+            self._rows.append(row)
+        if len(self._rows) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        # Write to a temporary name first so an interrupted flush leaves no half-written part
+        final = self.path / f"part-{self._next_part:05d}.parquet"
+        temp = final.with_suffix(".tmp")
+        pq.write_table(table, temp)
+        os.replace(temp, final)
+        self._next_part += 1
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a model over a directory of X-ray images")
+    parser.add_argument("task", choices=["bones", "chest"])
+    parser.add_argument("input_dir", help="Directory scanned recursively for images")
+    parser.add_argument("--output", required=True, help="JSONL file, or directory of part files for parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--workers", type=int, default=1, help="Model processes")
+    parser.add_argument("--threads", type=int, default=0, help="Torch threads per process (default: cores / workers)")
+    parser.add_argument("--decode-threads", type=int, default=2, help="Image decoding threads per process")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per model call")
+    parser.add_argument("--mode", choices=["fp32", "int8"], default="fp32")
+    parser.add_argument("--backend", choices=["eager", "torchscript"], default="eager", help="bones only")
+    parser.add_argument("--profile", choices=["fast", "balanced", "thorough"], default="thorough", help="chest only")
+    parser.add_argument("--max-input-side", type=int, default=1333, help="Decode cap for bones images (0 = full size)")
+    parser.add_argument("--rows-per-part", type=int, default=1000, help="Parquet rows per part file")
+    args = parser.parse_args()
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    # BLIP's processor resizes to 384px anyway, so chest images are decoded capped at 1024
+    max_input_side = args.max_input_side if args.task == "bones" else 1024
+
+    writer = ParquetWriter(args.output, args.task, args.rows_per_part) if args.format == "parquet" else JsonlWriter(args.output)
+    images = find_images(args.input_dir)
+    done = writer.done_paths()
+    pending = [path for path in images if path not in done]
+    print(f"🔍 {len(images)} image(s) found, {len(done)} already done, {len(pending)} to process (earlier failures included)")
+    if not pending:
+        return 0
+
+    chunks = [pending[i:i + args.batch_size] for i in range(0, len(pending), args.batch_size)]
+    print(f"🚀 {args.workers} worker(s) x {threads} thread(s), batch size {args.batch_size}, {args.task} {args.mode}")
+
+    writer.open()
+    processed, failed = 0, 0
+    start = last_report = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Pool(
+            processes=args.workers,
+            initializer=init_worker,
+            initargs=(args.task, threads, args.decode_threads, args.mode, args.backend, args.profile, max_input_side)
+        ) as pool:
+            for results in pool.imap_unordered(analyze_chunk, chunks):
+                writer.write(results)
+                processed += len(results)
+                failed += sum(1 for r in results if "error" in r)
+
+                now = time.perf_counter()
+                if now - last_report >= 5 or processed == len(pending):
+                    rate = processed / (now - start)
+                    eta = (len(pending) - processed) / rate if rate else 0
+                    print(f"📈 {processed}/{len(pending)} ({failed} failed) {rate:.2f} img/s, ETA {eta / 60:.1f} min")
+                    last_report = now
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted, run the same command again to resume")
+        return 130
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {processed} image(s) in {elapsed:.1f}s ({processed / elapsed:.2f} img/s), {failed} failed -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Accuracy-drift check for alternative inference paths
+Compares int8 and exported-graph outputs against the eager fp32 path on a sample set of X-rays
+
+Usage:
+    python check_accuracy_drift.py chest --samples path/to/chest_images
+    python check_accuracy_drift.py bones --samples path/to/bone_images --limit 20
+    python check_accuracy_drift.py bones --mode fp32 --backend torchscript
+"""
+import argparse
+import difflib
+import sys
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+
+from warmup import synthetic_xray
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def load_samples(samples_dir, limit):
+    """Sample images from a directory, or synthetic films when none is given"""
+    if samples_dir is None:
+        print("⚠️  No --samples directory given, using synthetic images")
+        return [(f"synthetic_{w}x{h}", synthetic_xray(w, h)) for w, h in [(512, 512), (1024, 768), (768, 1024)]]
+
+    paths = sorted(p for p in Path(samples_dir).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return [(p.name, Image.open(p).convert("RGB")) for p in paths[:limit]]
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_detections(reference, candidate):
+    """Greedily pair same-label boxes by IoU; returns (ious, score_diffs, unmatched)"""
+    ious, score_diffs = [], []
+    used = set()
+    for box, score, label in zip(reference["boxes"], reference["scores"], reference["labels"]):
+        best, best_iou = None, 0.0
+        for j, (cbox, clabel) in enumerate(zip(candidate["boxes"], candidate["labels"])):
+            if j in used or clabel != label:
+                continue
+            iou = box_iou(box, cbox)
+            if iou > best_iou:
+                best, best_iou = j, iou
+        if best is None:
+            continue
+        used.add(best)
+        ious.append(best_iou)
+        score_diffs.append(abs(score - candidate["scores"][best]))
+    unmatched = (len(reference["boxes"]) - len(ious)) + (len(candidate["boxes"]) - len(used))
+    return ious, score_diffs, unmatched
+
+
+def check_chest(samples, args):
+    from transformers import BlipForConditionalGeneration, AutoProcessor
+    from chest_model_api import MODEL_DIR, PROCESSOR_DIR, DEFAULT_PROFILE
+    from decoding import DECODING_PROFILES
+    from quantization import quantize_blip, model_size_mb
+
+    processor = AutoProcessor.from_pretrained(str(PROCESSOR_DIR))
+    reference = BlipForConditionalGeneration.from_pretrained(str(MODEL_DIR)).eval()
+    candidate = quantize_blip(BlipForConditionalGeneration.from_pretrained(str(MODEL_DIR)).eval())
+    print(f"📦 fp32 {model_size_mb(reference)} MB vs int8 {model_size_mb(candidate)} MB")
+
+    def caption(model, image):
+        inputs = processor(images=image, return_tensors="pt")
+        start = time.perf_counter()
+        with torch.no_grad():
+            ids = model.generate(**inputs, **DECODING_PROFILES[DEFAULT_PROFILE])
+        elapsed = (time.perf_counter() - start) * 1000
+        return processor.batch_decode(ids, skip_special_tokens=True)[0], elapsed
+
+    similarities, ref_ms, cand_ms = [], [], []
+    for name, image in samples:
+        ref_caption, ref_time = caption(reference, image)
+        cand_caption, cand_time = caption(candidate, image)
+        similarity = difflib.SequenceMatcher(None, ref_caption.split(), cand_caption.split()).ratio()
+        similarities.append(similarity)
+        ref_ms.append(ref_time)
+        cand_ms.append(cand_time)
+        print(f"   {name}: similarity={similarity:.3f} fp32={ref_time:.0f}ms int8={cand_time:.0f}ms")
+        if similarity < 1.0:
+            print(f"      fp32: {ref_caption}")
+            print(f"      int8: {cand_caption}")
+
+    mean_similarity = sum(similarities) / len(similarities)
+    print(f"\n📊 Mean caption similarity: {mean_similarity:.3f} (min allowed {args.min_caption_similarity})")
+    print(f"⏱️  Mean latency fp32={sum(ref_ms) / len(ref_ms):.0f}ms int8={sum(cand_ms) / len(cand_ms):.0f}ms")
+    return mean_similarity >= args.min_caption_similarity
+
+
+def check_bones(samples, args):
+    from torchvision import transforms
+    from bones_detector import load_detector, load_exported_detector
+    from bones_model_api import MODEL_PATH, CONFIDENCE_THRESHOLD
+    from quantization import quantize_detector, model_size_mb
+
+    reference, _ = load_detector(MODEL_PATH)
+    if args.backend == "torchscript":
+        candidate, _ = load_exported_detector(MODEL_PATH, inference_mode=args.mode)
+    else:
+        candidate, _ = load_detector(MODEL_PATH)
+        if args.mode == "int8":
+            candidate = quantize_detector(candidate)
+    label = f"{args.mode}/{args.backend}"
+    print(f"📦 fp32 {model_size_mb(reference)} MB vs {label} {model_size_mb(candidate)} MB")
+
+    to_tensor = transforms.ToTensor()
+
+    def detect(model, image):
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = model([to_tensor(image)])[0]
+        elapsed = (time.perf_counter() - start) * 1000
+        keep = output["scores"] > CONFIDENCE_THRESHOLD
+        return {k: v[keep].tolist() for k, v in output.items()}, elapsed
+
+    all_ious, all_score_diffs, total_unmatched, ref_ms, cand_ms = [], [], 0, [], []
+    for name, image in samples:
+        ref_out, ref_time = detect(reference, image)
+        cand_out, cand_time = detect(candidate, image)
+        ious, score_diffs, unmatched = match_detections(ref_out, cand_out)
+        all_ious.extend(ious)
+        all_score_diffs.extend(score_diffs)
+        total_unmatched += unmatched
+        ref_ms.append(ref_time)
+        cand_ms.append(cand_time)
+        mean_iou = sum(ious) / len(ious) if ious else 1.0
+        print(
+            f"   {name}: detections fp32={len(ref_out['boxes'])} {label}={len(cand_out['boxes'])} "
+            f"mean_iou={mean_iou:.3f} unmatched={unmatched} fp32={ref_time:.0f}ms {label}={cand_time:.0f}ms"
+        )
+
+    mean_iou = sum(all_ious) / len(all_ious) if all_ious else 1.0
+    max_score_diff = max(all_score_diffs) if all_score_diffs else 0.0
+    print(f"\n📊 Mean box IoU: {mean_iou:.3f} (min allowed {args.min_box_iou})")
+    print(f"📊 Max score difference: {max_score_diff:.3f} (max allowed {args.max_score_diff})")
+    print(f"📊 Unmatched detections: {total_unmatched}")
+    print(f"⏱️  Mean latency fp32={sum(ref_ms) / len(ref_ms):.0f}ms {label}={sum(cand_ms) / len(cand_ms):.0f}ms")
+    return mean_iou >= args.min_box_iou and max_score_diff <= args.max_score_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare alternative inference paths against eager fp32")
+    parser.add_argument("model", choices=["chest", "bones"])
+    parser.add_argument("--mode", choices=["fp32", "int8"], default="int8", help="Numeric mode of the candidate")
+    parser.add_argument("--backend", choices=["eager", "torchscript"], default="eager",
+                        help="Backend of the candidate (torchscript is bones-only)")
+    parser.add_argument("--samples", help="Directory of sample X-ray images")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of samples")
+    parser.add_argument("--min-caption-similarity", type=float, default=0.9)
+    parser.add_argument("--min-box-iou", type=float, default=0.9)
+    parser.add_argument("--max-score-diff", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.model == "chest" and (args.backend != "eager" or args.mode != "int8"):
+        parser.error("chest only supports --mode int8 --backend eager")
+
+    torch.manual_seed(0)
+    samples = load_samples(args.samples, args.limit)
+    if not samples:
+        print(f"❌ No images found in {args.samples}")
+        return 1
+
+    print(f"🔍 Checking {args.model} {args.mode}/{args.backend} drift on {len(samples)} image(s)...")
+    passed = check_chest(samples, args) if args.model == "chest" else check_bones(samples, args)
+    print("\n✅ Drift within tolerance" if passed else "\n❌ Drift exceeds tolerance")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,40 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from transformers import BlipForConditionalGeneration, AutoProcessor
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from transformers import BlipForConditionalGeneration, AutoProcessor, TextIteratorStreamer
 from PIL import Image
+from functools import partial
 from pathlib import Path
+from typing import List, Optional
 import torch
+import asyncio
 import io
+import json
+import time
+import zipfile
+import os
 import uvicorn
 import logging
 
+from admission import (
+    AdmissionController, AdmissionMiddleware, DeadlineExceeded, Overloaded,
+    admit_more, check_deadline, current_deadline, overloaded_response
+)
+from batch_uploads import expand_uploads, is_zip, stream_ndjson
+from batching import MicroBatcher
+from decoding import DECODING_PROFILES, DecodingPolicy
+from embedding_cache import EmbeddingCache, encode_images, generate_from_embeds
+from inference_executor import InferenceExecutor
+from metrics import CONTENT_TYPE, MetricsMiddleware, MetricsRegistry, process_memory_bytes
+from model_registry import registry
+from residency import residency_manager
+from quantization import check_inference_mode, model_size_mb, quantize_blip
+from profiling import ProfilingMiddleware, RequestProfiler, current_session, record_stage
+from prediction_cache import PredictionCache, image_digest, make_cache_key, model_fingerprint
+from singleflight import SingleFlight
+from warmup import WarmupState, parse_ints, parse_sizes, run_warmup, synthetic_xray
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,6 +44,71 @@ BASE_DIR = Path(__file__).resolve().parent
 MODEL_DIR = BASE_DIR / "xray_models" / "chest" / "hf_model"
 PROCESSOR_DIR = BASE_DIR / "xray_models" / "chest" / "hf_processor"
 
+# Micro-batching settings for caption generation
+BATCH_MAX_SIZE = int(os.getenv("CHEST_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("CHEST_BATCH_MAX_WAIT_MS", "20"))
+
+# Inference executor settings (torch threads default to an even split of the cores)
+INFERENCE_WORKERS = int(os.getenv("CHEST_INFERENCE_WORKERS", "1"))
+TORCH_THREADS = int(os.getenv("CHEST_TORCH_THREADS", "0")) or None
+
+# Numeric mode chosen at startup: "fp32" or "int8" (dynamic quantization, CPU only)
+INFERENCE_MODE = os.getenv("CHEST_INFERENCE_MODE", "fp32").lower()
+
+# Prediction cache settings (set CHEST_CACHE_DB to a file path to enable the disk tier)
+CACHE_MAX_ENTRIES = int(os.getenv("CHEST_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_MB = float(os.getenv("CHEST_CACHE_MAX_MB", "16"))
+CACHE_DB = os.getenv("CHEST_CACHE_DB", "")
+
+# Vision-encoder embedding cache, so re-captioning an image only runs the decoder
+EMBEDDING_CACHE_MB = float(os.getenv("CHEST_EMBEDDING_CACHE_MB", "256"))
+
+# Maximum number of images accepted by one /predict/batch request (zip entries included),
+# and the largest image and total uncompressed size (MB) it may unpack to
+BATCH_UPLOAD_MAX_IMAGES = int(os.getenv("CHEST_BATCH_UPLOAD_MAX_IMAGES", "64"))
+BATCH_UPLOAD_MAX_IMAGE_MB = float(os.getenv("CHEST_BATCH_UPLOAD_MAX_IMAGE_MB", "50"))
+BATCH_UPLOAD_MAX_TOTAL_MB = float(os.getenv("CHEST_BATCH_UPLOAD_MAX_TOTAL_MB", "512"))
+
+# Opt-in request profiling: set a sample rate, or set CHEST_PROFILE_HEADER=1 and send "X-Profile: 1"
+# to a /predict endpoint (off by default: a profiled run bypasses the cache and batcher and writes a trace file).
+# Chrome traces are written to CHEST_PROFILE_DIR, newest CHEST_PROFILE_MAX_TRACES kept
+PROFILE_DIR = Path(os.getenv("CHEST_PROFILE_DIR", str(BASE_DIR / "profiles")))
+PROFILE_SAMPLE_RATE = float(os.getenv("CHEST_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_TRACES = int(os.getenv("CHEST_PROFILE_MAX_TRACES", "50"))
+PROFILE_HEADER_ENABLED = os.getenv("CHEST_PROFILE_HEADER", "0").lower() in ("1", "true", "yes", "on")
+
+# Admission control for the prediction endpoints: at most CHEST_MAX_QUEUE images queued or
+# running (a batch upload counts each image; 0 = unbounded), and a fast 503 with Retry-After while the estimated queue wait is over
+# CHEST_QUEUE_SLO_MS. Requests still queued at their deadline (X-Request-Timeout-Ms header, else
+# CHEST_DEFAULT_DEADLINE_MS; 0 = none) are dropped before inference with a 504
+MAX_QUEUE = int(os.getenv("CHEST_MAX_QUEUE", str(8 * BATCH_MAX_SIZE)))
+QUEUE_SLO_MS = float(os.getenv("CHEST_QUEUE_SLO_MS", "10000"))
+DEFAULT_DEADLINE_MS = float(os.getenv("CHEST_DEFAULT_DEADLINE_MS", "30000"))
+
+# Model residency: after CHEST_IDLE_OFFLOAD_S idle seconds (0 = never) the weights move to a
+# memory-mapped file in MODEL_OFFLOAD_DIR and are reloaded on the next request.
+# MODEL_MEMORY_BUDGET_MB caps the resident weights of all models in the process
+IDLE_OFFLOAD_S = float(os.getenv("CHEST_IDLE_OFFLOAD_S", "0"))
+OFFLOAD_DIR = Path(os.getenv("MODEL_OFFLOAD_DIR", str(BASE_DIR / "offload")))
+
+# Number of pre-fork worker processes serving this app (set by prefork.py). The embedding cache
+# lives in each worker, so /predict/regenerate is disabled when requests are spread over several
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "1"))
+
+# Warm-up after loading (set CHEST_WARMUP_SIZES to "" to skip)
+WARMUP_SIZES = parse_sizes(os.getenv("CHEST_WARMUP_SIZES", "384x384"))
+WARMUP_BATCH_SIZES = parse_ints(os.getenv("CHEST_WARMUP_BATCH_SIZES", "1"))
+
+# Decoding policy: default profile and the queue depth at which decoding steps down a level
+DEFAULT_PROFILE = os.getenv("CHEST_DEFAULT_PROFILE", "thorough")
+STEP_DOWN_QUEUE_DEPTH = int(os.getenv("CHEST_STEP_DOWN_QUEUE_DEPTH", str(2 * BATCH_MAX_SIZE)))
+
+# Decoding parameters for the streaming endpoint (token streaming needs a single beam)
+STREAM_GENERATION_KWARGS = {
+    "greedy": DECODING_PROFILES["fast"],
+    "sample": {"max_length": 128, "num_beams": 1, "do_sample": True, "top_p": 0.9, "temperature": 0.7}
+}
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RadiantClariX Chest Model API",
@@ -24,6 +116,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Admission control, added first so it runs inside the other middleware:
+# rejected requests still get CORS headers and show up in the metrics
+admission = AdmissionController(
+    "chest", MAX_QUEUE, QUEUE_SLO_MS, DEFAULT_DEADLINE_MS,
+    estimate_wait_ms=lambda: caption_batcher.estimated_wait_ms()
+)
+app.add_middleware(AdmissionMiddleware, controller=admission, paths=["/predict", "/predict/batch", "/predict/regenerate", "/predict/stream"])
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -33,15 +133,281 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics, scraped from /metrics
+metrics = MetricsRegistry("chest")
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# Per-request profiling; stage timers of profiled requests go into their traces
+profiler = RequestProfiler(
+    "chest", PROFILE_DIR,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    max_traces=PROFILE_MAX_TRACES,
+    allow_header=PROFILE_HEADER_ENABLED,
+    paths=["/predict", "/predict/regenerate", "/predict/stream"]
+)
+metrics.add_stage_listener(record_stage)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
 # Global variables for model and processor
 model = None
 processor = None
 device = None
+caption_batcher = None
+inference_executor = None
+prediction_cache = None
+embedding_cache = None
+model_version = None
+inference_mode = None
+model_residency = None
+inflight_predictions = SingleFlight(name="chest-predict")
+decoding_policy = DecodingPolicy(
+    default_profile=DEFAULT_PROFILE,
+    step_down_queue_depth=STEP_DOWN_QUEUE_DEPTH,
+    batch_size=BATCH_MAX_SIZE
+)
+warmup_state = WarmupState()
+warmup_task = None
+
+# Values read from the running service at scrape time
+metrics.gauge("queue_depth", "Caption requests waiting for a batch", lambda: caption_batcher.queue_depth())
+metrics.gauge("estimated_queue_wait_seconds", "Expected wait before a new caption request is run", lambda: caption_batcher.estimated_wait_ms() / 1000)
+metrics.gauge("admitted_requests", "Requests admitted and not yet answered", lambda: admission.in_flight)
+metrics.counter_callback(
+    "admission_rejections_total", "Requests shed with 503 by reason",
+    lambda: {(reason,): count for reason, count in admission.rejected.items()},
+    ["reason"]
+)
+metrics.counter_callback("deadline_expired_total", "Requests dropped at their deadline before inference", lambda: admission.expired)
+metrics.gauge("predictions_in_flight", "Distinct predictions currently running", lambda: inflight_predictions.stats()["in_flight"])
+metrics.gauge("model_resident", "1 while the model weights are in memory, 0 while offloaded", lambda: int(model_residency.state == "resident"))
+metrics.gauge("model_memory_bytes", "Size of model parameters and buffers", lambda: model_size_mb(model) * 1024 * 1024)
+metrics.gauge("process_resident_memory_bytes", "Resident memory of the service process", process_memory_bytes)
+metrics.gauge("inference_workers", "Inference executor threads", lambda: inference_executor.stats()["max_workers"])
+metrics.gauge("torch_threads_per_worker", "Torch intra-op threads per inference worker", lambda: inference_executor.stats()["torch_threads_per_worker"])
+metrics.counter_callback(
+    "cache_lookups_total", "Prediction cache lookups by result",
+    lambda: {("hit",): prediction_cache.stats()["hits"], ("miss",): prediction_cache.stats()["misses"]},
+    ["result"]
+)
+metrics.counter_callback(
+    "embedding_cache_lookups_total", "Image embedding cache lookups by result",
+    lambda: {("hit",): embedding_cache.stats()["hits"], ("miss",): embedding_cache.stats()["misses"]},
+    ["result"]
+)
+
+def decode_image(image_bytes):
+    """Decode an upload to RGB, timed as the decode stage"""
+    with metrics.stage("decode"):
+        return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+def image_embeddings(items):
+    """
+    Vision-encoder outputs for a list of (PIL image or None, image_id) pairs
+    
+    Cached embeddings are reused and the rest are encoded in one batch. An
+    item without an image whose embeddings are no longer cached gets None.
+    """
+    embeds = [embedding_cache.get(image_id) if image_id else None for _, image_id in items]
+    missing = [i for i, e in enumerate(embeds) if e is None and items[i][0] is not None]
+    if missing:
+        with metrics.stage("preprocess"):
+            inputs = processor(images=[items[i][0] for i in missing], return_tensors="pt").to(device)
+        with metrics.stage("vision_encode"), torch.no_grad():
+            encoded = encode_images(model, inputs["pixel_values"])
+        for i, row in zip(missing, encoded):
+            embeds[i] = row.unsqueeze(0)
+            if items[i][1]:
+                embedding_cache.put(items[i][1], embeds[i])
+    return embeds
+
+def generate_captions(items, record_latency=True):
+    """
+    Caption a batch of (PIL image, image_id, decoding profile) items, one decoder call per profile
+    
+    Batch latencies feed the decoding policy's estimates unless
+    ``record_latency`` is off (warm-up runs).
+    """
+    with model_residency.use():
+        start = time.perf_counter()
+        embeds = image_embeddings([(image, image_id) for image, image_id, _ in items])
+        encode_ms = (time.perf_counter() - start) * 1000
+        
+        captions = [None] * len(items)
+        groups = {}
+        for i, (_, image_id, profile) in enumerate(items):
+            if embeds[i] is None:
+                captions[i] = LookupError(f"Image {image_id} is no longer cached, upload it again")
+            else:
+                groups.setdefault(profile, []).append(i)
+        
+        for profile, indices in groups.items():
+            start = time.perf_counter()
+            with metrics.stage("generate"), torch.no_grad():
+                generated_ids = generate_from_embeds(
+                    model, torch.cat([embeds[i] for i in indices]), **DECODING_PROFILES[profile]
+                )
+            
+            with metrics.stage("postprocess"):
+                decoded = processor.batch_decode(generated_ids, skip_special_tokens=True)
+            for i, caption in zip(indices, decoded):
+                captions[i] = caption
+            # Each of these requests waited for the shared encode and its own decoder call
+            if record_latency:
+                decoding_policy.record(profile, encode_ms + (time.perf_counter() - start) * 1000)
+        
+        return captions
+
+async def generate_caption(image, image_id, profile, deadline):
+    """
+    Caption one image (batched with other concurrent requests); profiled
+    requests run on their own so the trace shows only this image
+    """
+    session = current_session()
+    if session is not None:
+        check_deadline(deadline)
+        caption = (await inference_executor.run(session.run, generate_captions, [(image, image_id, profile)]))[0]
+        if isinstance(caption, Exception):
+            raise caption
+        return caption
+    return await caption_batcher.submit((image, image_id, profile), deadline=deadline)
+
+async def run_caption(image_bytes, image_id, cache_key, profile, deadline=current_deadline):
+    """
+    Caption an upload and store the result in the cache
+    
+    The upload is only decoded when the embeddings of ``image_id`` aren't
+    cached; with no ``image_bytes`` the caption must come from them. The work
+    is dropped if ``deadline()`` passes before it reaches the model.
+    """
+    image = None
+    if image_bytes is not None and image_id not in embedding_cache:
+        image = await run_in_threadpool(decode_image, image_bytes)
+    
+    try:
+        caption = await generate_caption(image, image_id, profile, deadline)
+    except LookupError:
+        if image_bytes is None or image is not None:
+            raise
+        # The embeddings were evicted before the batch ran; encode the upload after all
+        image = await run_in_threadpool(decode_image, image_bytes)
+        caption = await generate_caption(image, image_id, profile, deadline)
+    result = {"caption": caption}
+    prediction_cache.put(cache_key, result)
+    return result
+
+async def run_uncached(cache_key, predict):
+    """
+    Run a prediction missing from the cache, shared with identical uploads in flight unless profiled
+    
+    ``predict(deadline)`` gets a callable returning the time to drop the work
+    at: the latest deadline of the requests sharing it.
+    """
+    if current_session() is not None:
+        return await predict(current_deadline)
+    return await inflight_predictions.do(cache_key, predict, deadline=current_deadline())
+
+async def caption_image(image_bytes, profile=None, latency_budget_ms=None):
+    """Caption one uploaded image through the cache, single-flight and the batcher"""
+    # Choose decoding for this request, stepping down under heavy load
+    profile, profile_reason = decoding_policy.select(
+        requested=profile,
+        latency_budget_ms=latency_budget_ms,
+        queue_depth=caption_batcher.queue_depth()
+    )
+    
+    image_id = image_digest(image_bytes)
+    cache_key = make_cache_key(image_id, model_version, DECODING_PROFILES[profile])
+    
+    # Serve repeated uploads from the cache, and let identical uploads
+    # already being processed share that run. Profiled requests always run the model
+    session = current_session()
+    cached = prediction_cache.get(cache_key) if session is None else None
+    if cached is not None:
+        caption = cached["caption"]
+    else:
+        result = await run_uncached(
+            cache_key, lambda deadline: run_caption(image_bytes, image_id, cache_key, profile, deadline)
+        )
+        caption = result["caption"]
+    
+    logger.info(f"Generated caption: {caption}")
+    
+    response = {
+        "caption": caption,
+        "image_id": image_id,
+        "model": "BLIP Chest X-ray",
+        "status": "success",
+        "cached": cached is not None,
+        "decoding_profile": profile,
+        "decoding_reason": profile_reason
+    }
+    if session is not None:
+        response["trace_id"] = session.trace_id
+    return response
+
+def stream_caption(image, image_id, image_bytes, streamer, generation_kwargs):
+    """
+    Generate a caption for one image, pushing decoded text into ``streamer``
+    
+    ``image`` is None when the embeddings of ``image_id`` were cached; if they
+    have been evicted since, ``image_bytes`` is decoded here instead.
+    """
+    try:
+        with model_residency.use():
+            embeds = image_embeddings([(image, image_id)])[0]
+            if embeds is None:
+                embeds = image_embeddings([(decode_image(image_bytes), image_id)])[0]
+            with metrics.stage("generate"), torch.no_grad():
+                generate_from_embeds(model, embeds, streamer=streamer, **generation_kwargs)
+    except Exception:
+        # Unblock the consumer; the error is re-raised to the endpoint
+        streamer.end()
+        raise
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def load_captioner(device="cpu", mode="fp32"):
+    """
+    Load BLIP and its processor in the requested inference mode
+    
+    Shared with bulk_analyze.py. Returns (model, processor, mode actually used).
+    """
+    # Check if model directories exist
+    if not MODEL_DIR.exists():
+        raise FileNotFoundError(f"Model directory not found: {MODEL_DIR}")
+    if not PROCESSOR_DIR.exists():
+        raise FileNotFoundError(f"Processor directory not found: {PROCESSOR_DIR}")
+    
+    model = BlipForConditionalGeneration.from_pretrained(str(MODEL_DIR)).to(device)
+    processor = AutoProcessor.from_pretrained(str(PROCESSOR_DIR))
+    model.eval()
+    
+    mode = check_inference_mode(mode, device)
+    if mode == "int8":
+        model = quantize_blip(model)
+    return model, processor, mode
+
+def shared_captioner(device, user="chest"):
+    """
+    load_captioner(device, INFERENCE_MODE) through the process-wide model registry
+    
+    Loads once per process; a model preloaded by prefork.py before the
+    workers were forked is reused instead of loaded again.
+    """
+    return registry.get_or_load(
+        user, MODEL_DIR, lambda: load_captioner(device, INFERENCE_MODE),
+        device=device, mode=INFERENCE_MODE
+    )
 
 @app.on_event("startup")
 async def load_model():
     """Load the model and processor on startup"""
-    global model, processor, device
+    global model, processor, device, caption_batcher, inference_executor, prediction_cache, model_version
+    global embedding_cache
+    global inference_mode, model_residency
+    global warmup_task
     
     try:
         logger.info("Loading model and processor...")
@@ -50,16 +416,44 @@ async def load_model():
         device = "cuda" if torch.cuda.is_available() else "cpu"
         logger.info(f"Using device: {device}")
         
-        # Check if model directories exist
-        if not MODEL_DIR.exists():
-            raise FileNotFoundError(f"Model directory not found: {MODEL_DIR}")
-        if not PROCESSOR_DIR.exists():
-            raise FileNotFoundError(f"Processor directory not found: {PROCESSOR_DIR}")
+        # Load model and processor (reused if another service in this process already loaded them)
+        model, processor, inference_mode = shared_captioner(device)
+        logger.info(f"Inference mode: {inference_mode} ({model_size_mb(model)} MB)")
+        
+        model_version = f"{model_fingerprint(MODEL_DIR)}-{inference_mode}"
+        model_residency = residency_manager.register(
+            "chest", model, OFFLOAD_DIR / f"chest-{model_version}.pt", IDLE_OFFLOAD_S
+        )
+        prediction_cache = PredictionCache(
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+            disk_path=CACHE_DB or None
+        )
+        embedding_cache = EmbeddingCache(max_bytes=int(EMBEDDING_CACHE_MB * 1024 * 1024))
+        
+        inference_executor = InferenceExecutor(
+            max_workers=INFERENCE_WORKERS,
+            torch_threads=TORCH_THREADS,
+            name="chest-inference"
+        )
+        caption_batcher = MicroBatcher(
+            generate_captions,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            name="chest-caption",
+            executor=inference_executor
+        )
         
-        # Load model and processor
-        model = BlipForConditionalGeneration.from_pretrained(str(MODEL_DIR)).to(device)
-        processor = AutoProcessor.from_pretrained(str(PROCESSOR_DIR))
-        model.eval()
+        # Warm up in the background so /health answers while /ready reports progress
+        warmup_task = asyncio.get_running_loop().create_task(run_warmup(
+            warmup_state,
+            inference_executor,
+            # Cold-start timings would skew the latency estimates used for budgets
+            partial(generate_captions, record_latency=False),
+            lambda w, h: (synthetic_xray(w, h), None, decoding_policy.default_profile),
+            WARMUP_SIZES,
+            WARMUP_BATCH_SIZES
+        ))
         
         logger.info("Model and processor loaded successfully!")
         
@@ -67,6 +461,19 @@ async def load_model():
         logger.error(f"Failed to load model: {str(e)}")
         raise e
 
+@app.on_event("shutdown")
+async def stop_batcher():
+    """Fail any queued caption requests on shutdown"""
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if caption_batcher is not None:
+        await caption_batcher.stop()
+    if inference_executor is not None:
+        inference_executor.shutdown()
+    if model is not None:
+        residency_manager.unregister(model)
+    registry.release("chest")
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -76,27 +483,87 @@ async def root():
         "model_loaded": model is not None
     }
 
+@app.get("/live")
+async def liveness_check():
+    """Liveness probe: the process is up and the event loop is responsive"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: only ready once the model is loaded and warmed up"""
+    ready = model is not None and warmup_state.ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "model_loaded": model is not None,
+            "warmup": warmup_state.to_dict()
+        }
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request counts and latency, per-stage timings, queue and memory gauges"""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
-        "status": "healthy",
+        "status": "healthy" if model is not None else "unhealthy",
+        "ready": model is not None and warmup_state.ready,
         "model_loaded": model is not None,
         "processor_loaded": processor is not None,
-        "device": device
+        "device": device,
+        "batching": {
+            "max_batch_size": BATCH_MAX_SIZE,
+            "max_wait_ms": BATCH_MAX_WAIT_MS,
+            "queue_depth": caption_batcher.queue_depth() if caption_batcher else 0
+        },
+        "executor": inference_executor.stats() if inference_executor else None,
+        "model_version": model_version,
+        "inference_mode": inference_mode,
+        "model_size_mb": model_size_mb(model) if model is not None else None,
+        "cache": prediction_cache.stats() if prediction_cache else None,
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "in_flight": inflight_predictions.stats(),
+        "admission": admission.stats(),
+        "profiling": profiler.stats(),
+        "residency": residency_manager.stats(),
+        "decoding": decoding_policy.stats(),
+        "prefork_workers": PREFORK_WORKERS
     }
 
 @app.post("/predict")
-async def predict_caption(file: UploadFile = File(...)):
+async def predict_caption(
+    file: UploadFile = File(...),
+    profile: Optional[str] = None,
+    latency_budget_ms: Optional[float] = None
+):
     """
     Predict caption for chest X-ray image
     
     Args:
         file: Image file (jpg, png, etc.)
+        profile: Decoding profile ("fast", "balanced" or "thorough")
+        latency_budget_ms: Pick the most thorough profile expected to fit this budget
+    
+    Under a deep queue the profile, even an explicitly requested one, is
+    stepped down to a cheaper one.
     
     Returns:
-        JSON with caption and metadata
+        JSON with caption and metadata, including the decoding profile used
+        ("decoding_profile") and why ("decoding_reason": "requested",
+        "budget", "default" or "queue_step_down") and, for requests sent with
+        "X-Profile: 1", the profiler "trace_id"
     """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    # Validate decoding options
+    if profile is not None and profile not in DECODING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {list(DECODING_PROFILES)}")
+    
     try:
         # Validate file
         if not file.content_type.startswith('image/'):
@@ -104,33 +571,241 @@ async def predict_caption(file: UploadFile = File(...)):
         
         # Read and process image
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        
-        # Prepare inputs
-        inputs = processor(images=image, return_tensors="pt").to(device)
-        
-        # Generate caption
-        with torch.no_grad():
-            generated_ids = model.generate(
-                **inputs, 
-                max_length=128, 
-                num_beams=5,
-                early_stopping=True
-            )
-            caption = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        
-        logger.info(f"Generated caption: {caption}")
-        
-        return {
-            "caption": caption,
-            "model": "BLIP Chest X-ray",
-            "status": "success"
-        }
+        return await caption_image(image_bytes, profile, latency_budget_ms)
         
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/predict/batch")
+async def predict_caption_batch(
+    files: List[UploadFile] = File(...),
+    profile: Optional[str] = None,
+    latency_budget_ms: Optional[float] = None
+):
+    """
+    Caption several chest X-rays in one request
+    
+    Args:
+        files: Image files and/or zip archives of images
+        profile: Decoding profile applied to every image
+        latency_budget_ms: Per-image latency budget used to pick the profile
+    
+    Streams NDJSON, one line per image in completion order with its "index"
+    and "filename". Images are captioned concurrently so the batcher forms
+    real batches; a failing image gets "success": false and the rest go on.
+    A part that is neither an image nor a zip archive is rejected with 400.
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if profile is not None and profile not in DECODING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {list(DECODING_PROFILES)}")
+    
+    uploads = [(file.filename, file.content_type, await file.read()) for file in files]
+    # Same check as /predict for every part that isn't a zip archive
+    for filename, content_type, data in uploads:
+        if not is_zip(filename, content_type, data) and not (content_type or "").startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"{filename} must be an image or a zip archive")
+    try:
+        images = await run_in_threadpool(
+            expand_uploads, uploads, BATCH_UPLOAD_MAX_IMAGES,
+            int(BATCH_UPLOAD_MAX_IMAGE_MB * 1024 * 1024), int(BATCH_UPLOAD_MAX_TOTAL_MB * 1024 * 1024)
+        )
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not images:
+        raise HTTPException(status_code=400, detail="No images found in the upload")
+    
+    # Admitted as one request before the upload was read; now count every image
+    try:
+        admit_more(len(images) - 1)
+    except Overloaded as e:
+        return overloaded_response(e.rejection)
+    
+    async def process(name, image_bytes):
+        try:
+            result = await caption_image(image_bytes, profile, latency_budget_ms)
+        except DeadlineExceeded:
+            admission.record_expired()
+            raise
+        return {"success": True, **result}
+    
+    logger.info(f"Batch prediction: {len(images)} image(s)")
+    return StreamingResponse(stream_ndjson(images, process), media_type="application/x-ndjson")
+
+@app.post("/predict/regenerate")
+async def regenerate_caption(
+    image_id: str,
+    profile: Optional[str] = None,
+    latency_budget_ms: Optional[float] = None
+):
+    """
+    Re-caption a previously uploaded image with different decoding settings
+    
+    Args:
+        image_id: "image_id" returned by /predict or /predict/stream
+        profile: Decoding profile ("fast", "balanced" or "thorough")
+        latency_budget_ms: Pick the most thorough profile expected to fit this budget
+    
+    Only the text decoder runs: the image features are taken from the
+    embedding cache. Returns 404 once they have been evicted, and 501 under
+    several pre-fork workers, where the upload may have gone to another one.
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if PREFORK_WORKERS > 1:
+        raise HTTPException(
+            status_code=501,
+            detail="Regeneration is unavailable with several pre-fork workers (cached embeddings are per worker)"
+        )
+    if profile is not None and profile not in DECODING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {list(DECODING_PROFILES)}")
+    
+    profile, profile_reason = decoding_policy.select(
+        requested=profile,
+        latency_budget_ms=latency_budget_ms,
+        queue_depth=caption_batcher.queue_depth()
+    )
+    cache_key = make_cache_key(image_id, model_version, DECODING_PROFILES[profile])
+    
+    session = current_session()
+    cached = prediction_cache.get(cache_key) if session is None else None
+    if cached is None and image_id not in embedding_cache:
+        raise HTTPException(status_code=404, detail="Image is not cached, upload it again via /predict")
+    
+    try:
+        if cached is not None:
+            caption = cached["caption"]
+        else:
+            result = await run_uncached(
+                cache_key, lambda deadline: run_caption(None, image_id, cache_key, profile, deadline)
+            )
+            caption = result["caption"]
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Regeneration error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    
+    logger.info(f"Regenerated caption ({profile}): {caption}")
+    
+    response = {
+        "caption": caption,
+        "image_id": image_id,
+        "model": "BLIP Chest X-ray",
+        "status": "success",
+        "cached": cached is not None,
+        "decoding_profile": profile,
+        "decoding_reason": profile_reason
+    }
+    if session is not None:
+        response["trace_id"] = session.trace_id
+    return response
+
+@app.post("/predict/stream")
+async def predict_caption_stream(file: UploadFile = File(...), decoding: str = "greedy"):
+    """
+    Stream the caption for a chest X-ray as Server-Sent Events
+    
+    Args:
+        file: Image file (jpg, png, etc.)
+        decoding: "greedy" or "sample"
+    
+    Emits "token" events with decoded text as it is generated, then one
+    "done" event with the full caption and timing metadata ("error" on failure,
+    including a deadline that passed before generation started).
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    if decoding not in STREAM_GENERATION_KWARGS:
+        raise HTTPException(status_code=400, detail=f"decoding must be one of {list(STREAM_GENERATION_KWARGS)}")
+    
+    start = time.perf_counter()
+    image_bytes = await file.read()
+    generation_kwargs = STREAM_GENERATION_KWARGS[decoding]
+    image_id = image_digest(image_bytes)
+    cache_key = make_cache_key(image_id, model_version, generation_kwargs)
+    # Sampled captions differ per call, so only greedy results are reused; profiled requests always run the model
+    session = current_session()
+    cached = prediction_cache.get(cache_key) if decoding == "greedy" and session is None else None
+    
+    async def events():
+        if cached is not None:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            yield sse_event("token", {"text": cached["caption"]})
+            yield sse_event("done", {
+                "caption": cached["caption"],
+                "image_id": image_id,
+                "model": "BLIP Chest X-ray",
+                "decoding": decoding,
+                "cached": True,
+                "time_to_first_token_ms": round(elapsed_ms, 1),
+                "total_ms": round(elapsed_ms, 1)
+            })
+            return
+        
+        try:
+            # Cached embeddings make decoding the upload unnecessary
+            image = None
+            if image_id not in embedding_cache:
+                image = await run_in_threadpool(decode_image, image_bytes)
+            check_deadline()
+            streamer = TextIteratorStreamer(processor.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=120)
+            args = (image, image_id, image_bytes, streamer, generation_kwargs)
+            if session is not None:
+                run = inference_executor.run(session.run, stream_caption, *args)
+            else:
+                run = inference_executor.run(stream_caption, *args)
+            generation = asyncio.ensure_future(run)
+            
+            chunks = []
+            first_token_ms = None
+            async for text in iterate_in_threadpool(streamer):
+                if not text:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                chunks.append(text)
+                yield sse_event("token", {"text": text})
+            await generation
+            
+            caption = "".join(chunks).strip()
+            if decoding == "greedy":
+                prediction_cache.put(cache_key, {"caption": caption})
+            total_ms = (time.perf_counter() - start) * 1000
+            logger.info(f"Streamed caption in {total_ms:.1f}ms (first token {first_token_ms}ms): {caption}")
+            done = {
+                "caption": caption,
+                "image_id": image_id,
+                "model": "BLIP Chest X-ray",
+                "decoding": decoding,
+                "cached": False,
+                "time_to_first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                "total_ms": round(total_ms, 1)
+            }
+            if session is not None:
+                done["trace_id"] = session.trace_id
+            yield sse_event("done", done)
+        except DeadlineExceeded as e:
+            # The 200 is already sent, so the middleware can't count this one
+            admission.record_expired()
+            yield sse_event("error", {"detail": str(e)})
+        except Exception as e:
+            logger.error(f"Streaming prediction error: {str(e)}")
+            yield sse_event("error", {"detail": f"Prediction failed: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     uvicorn.run(
         "chest_model_api:app",
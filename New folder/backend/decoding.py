@@ -0,0 +1,99 @@
+"""
+Decoding policy for chest caption generation
+Named profiles trade caption quality for latency; the policy picks one per
+request from an explicit choice, a latency budget and the current queue depth
+"""
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Generation kwargs per profile, cheapest first
+DECODING_PROFILES = {
+    "fast": {"max_length": 128, "num_beams": 1},
+    "balanced": {"max_length": 128, "num_beams": 3, "early_stopping": True},
+    "thorough": {"max_length": 128, "num_beams": 5, "early_stopping": True}
+}
+PROFILE_ORDER = list(DECODING_PROFILES)
+
+# Starting batch latency guesses (ms) until real measurements come in
+INITIAL_ESTIMATES_MS = {"fast": 400.0, "balanced": 1000.0, "thorough": 1600.0}
+
+
+class DecodingPolicy:
+    """
+    Choose a decoding profile for each request
+
+    - An explicit ``requested`` profile is used as-is.
+    - Otherwise, with a ``latency_budget_ms``, the most thorough profile whose
+      expected latency fits is chosen. Expected latency is the measured
+      batch wall time for the request's own batch plus one per full or
+      partial batch already queued ahead of it.
+    - Otherwise ``default_profile`` is used.
+
+    Whatever was chosen, an explicitly requested profile included, is then
+    stepped down one level for every ``step_down_queue_depth`` requests
+    waiting, so peak load degrades to cheaper decoding instead of blowing the
+    tail latency. The returned reason is then "queue_step_down".
+    """
+
+    def __init__(self, default_profile="thorough", step_down_queue_depth=16, batch_size=1, smoothing=0.2):
+        if default_profile not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile '{default_profile}', expected one of {PROFILE_ORDER}")
+        self.default_profile = default_profile
+        self.step_down_queue_depth = max(1, int(step_down_queue_depth))
+        self.batch_size = max(1, int(batch_size))
+        self.smoothing = smoothing
+        self.estimates_ms = dict(INITIAL_ESTIMATES_MS)
+        self.usage = {name: 0 for name in PROFILE_ORDER}
+        self._lock = threading.Lock()
+
+    def expected_ms(self, profile, queue_depth=0):
+        """Batch wall time for the request's own batch plus the batches already queued ahead"""
+        return self.estimates_ms[profile] * (1 + math.ceil(queue_depth / self.batch_size))
+
+    def select(self, requested=None, latency_budget_ms=None, queue_depth=0):
+        """Return ``(profile, reason)`` for one request"""
+        if requested is not None:
+            if requested not in DECODING_PROFILES:
+                raise ValueError(f"Unknown decoding profile '{requested}', expected one of {PROFILE_ORDER}")
+            profile, reason = requested, "requested"
+        elif latency_budget_ms is not None:
+            profile, reason = PROFILE_ORDER[0], "budget"
+            for name in PROFILE_ORDER:
+                if self.expected_ms(name, queue_depth) <= latency_budget_ms:
+                    profile = name
+        else:
+            profile, reason = self.default_profile, "default"
+
+        steps = queue_depth // self.step_down_queue_depth
+        if steps:
+            index = max(0, PROFILE_ORDER.index(profile) - steps)
+            if PROFILE_ORDER[index] != profile:
+                logger.info(f"Queue depth {queue_depth}: stepping {profile} down to {PROFILE_ORDER[index]}")
+                profile, reason = PROFILE_ORDER[index], "queue_step_down"
+
+        with self._lock:
+            self.usage[profile] += 1
+        return profile, reason
+
+    def record(self, profile, batch_ms):
+        """
+        Fold a measured batch wall time into the running estimate
+
+        Every request in a batch waits for the whole batch, so this is the
+        batch's run time, not the time amortized per image.
+        """
+        with self._lock:
+            previous = self.estimates_ms[profile]
+            self.estimates_ms[profile] = previous + self.smoothing * (batch_ms - previous)
+
+    def stats(self):
+        """Current estimates and how often each profile was used"""
+        return {
+            "default_profile": self.default_profile,
+            "step_down_queue_depth": self.step_down_queue_depth,
+            "estimates_ms": {k: round(v, 1) for k, v in self.estimates_ms.items()},
+            "usage": dict(self.usage)
+        }
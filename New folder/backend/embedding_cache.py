@@ -0,0 +1,101 @@
+"""
+Vision-encoder embedding cache for BLIP captioning
+The ViT encoding of an image doesn't depend on decoding settings, so it is
+kept per image and re-captioning the same study only runs the text decoder
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def encode_images(model, pixel_values):
+    """Run the BLIP vision encoder; returns image embeddings (batch, patches, hidden)"""
+    return model.vision_model(pixel_values=pixel_values)[0]
+
+
+def generate_from_embeds(model, image_embeds, **generation_kwargs):
+    """
+    Caption from precomputed image embeddings
+
+    Same decoder call ``BlipForConditionalGeneration.generate`` makes after
+    encoding, so captions match a full ``model.generate`` on the image.
+    """
+    text_config = model.config.text_config
+    batch_size = image_embeds.shape[0]
+    input_ids = torch.full(
+        (batch_size, 1), text_config.bos_token_id, dtype=torch.long, device=image_embeds.device
+    )
+    image_attention_mask = torch.ones(image_embeds.shape[:-1], dtype=torch.long, device=image_embeds.device)
+    return model.text_decoder.generate(
+        input_ids=input_ids,
+        eos_token_id=text_config.sep_token_id,
+        pad_token_id=text_config.pad_token_id,
+        encoder_hidden_states=image_embeds,
+        encoder_attention_mask=image_attention_mask,
+        **generation_kwargs
+    )
+
+
+class EmbeddingCache:
+    """
+    LRU of image embeddings keyed by image hash, bounded by tensor bytes
+
+    Called from inference worker threads, so access is locked. Stored
+    tensors are copies, so a cached row never keeps a whole batch alive.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            embeds = self._entries.get(key)
+            if embeds is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embeds
+
+    def put(self, key, embeds):
+        size = embeds.numel() * embeds.element_size()
+        if size > self.max_bytes:
+            return
+        embeds = embeds.detach().clone()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.numel() * previous.element_size()
+            self._entries[key] = embeds
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.numel() * evicted.element_size()
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,86 @@
+"""
+Dedicated executor for model execution
+Runs blocking torch calls on worker threads so the event loop stays responsive
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# torch.set_num_threads is process-wide: executors sharing a process can't
+# have different thread counts, the last one to start a worker wins
+_process_torch_threads = None
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for inference
+
+    At most ``max_workers`` model calls run at once. Each worker thread sets its
+    torch intra-op thread count on start; by default the available cores are
+    split evenly between workers so they don't oversubscribe the CPU.
+
+    The count is process-wide, so several executors in one process (see
+    model_server.py) must be given the same ``torch_threads``; a mismatch is
+    logged.
+    """
+
+    def __init__(self, max_workers=1, torch_threads=None, name="inference"):
+        self.max_workers = max(1, int(max_workers))
+        cpu_count = os.cpu_count() or 1
+        self.torch_threads = int(torch_threads) if torch_threads else max(1, cpu_count // self.max_workers)
+        self.name = name
+        global _process_torch_threads
+        if _process_torch_threads not in (None, self.torch_threads):
+            logger.warning(
+                f"{name} executor wants {self.torch_threads} torch threads but this process already uses "
+                f"{_process_torch_threads}; torch.set_num_threads is process-wide, so the last setting wins"
+            )
+        _process_torch_threads = self.torch_threads
+        self._active = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=name,
+            initializer=self._init_worker
+        )
+        logger.info(
+            f"{name} executor: workers={self.max_workers} torch_threads_per_worker={self.torch_threads}"
+        )
+
+    def _init_worker(self):
+        torch.set_num_threads(self.torch_threads)
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self._active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on an inference worker and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, functools.partial(self._call, fn, args, kwargs)
+        )
+
+    def shutdown(self):
+        """Stop accepting work and drop anything not yet started"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """Worker configuration and current utilisation"""
+        return {
+            "max_workers": self.max_workers,
+            "torch_threads_per_worker": self.torch_threads,
+            "active": self._active
+        }
@@ -0,0 +1,90 @@
+"""
+Process-wide registry of loaded models
+Loads are keyed by the resolved checkpoint path and the load options, so
+services running in the same process (see model_server.py) share one copy
+of each checkpoint instead of loading it again
+"""
+import logging
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Loaded models by (checkpoint path, options)
+
+    ``get_or_load`` runs the loader only for the first user of a key; later
+    users get the same object. A model is dropped once every service using
+    it has called ``release``.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path, options):
+        return str(Path(path).resolve()), tuple(sorted((k, str(v)) for k, v in options.items()))
+
+    def get_or_load(self, user, path, loader, **options):
+        """
+        Model loaded from ``path`` with ``options``, calling ``loader()`` only if it isn't loaded yet
+
+        ``user`` names the service asking for it (for stats and ``release``).
+        """
+        key = self.key(path, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"lock": threading.Lock(), "value": None, "loaded": False}
+        # Per-model lock: a second user waits for a load already in progress instead of repeating it
+        with entry["lock"]:
+            if not entry["loaded"]:
+                start = time.perf_counter()
+                entry["value"] = loader()
+                entry.update(
+                    loaded=True,
+                    path=key[0],
+                    options=dict(key[1]),
+                    users=set(),
+                    load_ms=(time.perf_counter() - start) * 1000,
+                    hits=0
+                )
+                logger.info(f"Loaded {key[0]} {entry['options']} for {user} in {entry['load_ms']:.0f}ms")
+            else:
+                entry["hits"] += 1
+                logger.info(f"Reusing {key[0]} {entry['options']} for {user} (loaded by {sorted(entry['users'])})")
+            entry["users"].add(user)
+            return entry["value"]
+
+    def release(self, user):
+        """Drop ``user`` from every model it holds; models left without users are unloaded"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if not entry["loaded"]:
+                    continue
+                entry["users"].discard(user)
+                if not entry["users"]:
+                    del self._entries[key]
+                    logger.info(f"Unloaded {key[0]} {entry['options']}")
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "path": entry["path"],
+                    "options": entry["options"],
+                    "users": sorted(entry["users"]),
+                    "load_ms": round(entry["load_ms"], 1),
+                    "shared_loads_avoided": entry["hits"]
+                }
+                for entry in self._entries.values()
+                if entry["loaded"]
+            ]
+
+
+# Shared by every service imported into this process
+registry = ModelRegistry()
@@ -0,0 +1,124 @@
+"""
+Unified model server
+Serves the chest and bones APIs from one process, under /chest and /bones
+(and the minimal caption API under /api), instead of one interpreter and
+torch runtime per service. Checkpoints are loaded once through the shared
+model registry; each service keeps its own batcher, inference executor,
+caches and settings, except that /api captions go through the chest
+pipeline and torch threads are one process-wide setting.
+
+Usage:
+    python model_server.py
+    uvicorn model_server:app --host 0.0.0.0 --port 8500
+"""
+import os
+from contextlib import AsyncExitStack
+
+# torch.set_num_threads is process-wide, so the services can't have thread counts of their own.
+# Unless set explicitly, both get one shared budget: the cores split across every inference
+# worker of both services. Must happen before the service modules read their settings
+CPU_COUNT = os.cpu_count() or 1
+INFERENCE_WORKERS = sum(max(1, int(os.getenv(f"{prefix}_INFERENCE_WORKERS", "1"))) for prefix in ("CHEST", "BONES"))
+for prefix in ("CHEST", "BONES"):
+    os.environ.setdefault(f"{prefix}_TORCH_THREADS", str(max(1, CPU_COUNT // INFERENCE_WORKERS)))
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import uvicorn
+import logging
+
+import api as caption_api
+import bones_model_api
+import chest_model_api
+from metrics import process_memory_bytes
+from model_registry import registry
+from residency import residency_manager
+
+logger = logging.getLogger(__name__)
+
+PORT = int(os.getenv("MODEL_SERVER_PORT", "8500"))
+
+# Mount point -> service module
+SERVICES = {
+    "/chest": chest_model_api,
+    "/bones": bones_model_api,
+    "/api": caption_api
+}
+
+app = FastAPI(
+    title="RadiantClariX Model Server",
+    description="Chest captioning and bone fracture detection served from one process",
+    version="1.0.0"
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Allow all origins for development
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+for mount_path, service in SERVICES.items():
+    app.mount(mount_path, service.app)
+
+# Mounted apps don't get lifespan events of their own; their startup and shutdown run from here
+service_lifespans = AsyncExitStack()
+
+@app.on_event("startup")
+async def start_services():
+    """Run every service's startup (model loads go through the shared registry)"""
+    for mount_path, service in SERVICES.items():
+        logger.info(f"Starting {mount_path}")
+        await service_lifespans.enter_async_context(service.app.router.lifespan_context(service.app))
+    logger.info(f"Models loaded: {[entry['path'] for entry in registry.stats()]}")
+
+@app.on_event("shutdown")
+async def stop_services():
+    """Shut the services down in reverse order"""
+    await service_lifespans.aclose()
+
+def service_ready(service):
+    warmup_state = getattr(service, "warmup_state", None)
+    return service.model is not None and (warmup_state is None or warmup_state.ready)
+
+@app.get("/")
+async def root():
+    """Root endpoint"""
+    return {
+        "message": "RadiantClariX Model Server",
+        "services": {mount_path: f"{mount_path}/health" for mount_path in SERVICES}
+    }
+
+@app.get("/live")
+async def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: every service has its model loaded and warmed up (503 otherwise)"""
+    services = {mount_path: service_ready(service) for mount_path, service in SERVICES.items()}
+    ready = all(services.values())
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "services": services})
+
+@app.get("/health")
+async def health_check():
+    """Shared models, per-service readiness and process memory"""
+    return {
+        "status": "healthy" if all(service.model is not None for service in SERVICES.values()) else "unhealthy",
+        "services": {mount_path: service_ready(service) for mount_path, service in SERVICES.items()},
+        "models": registry.stats(),
+        "residency": residency_manager.stats(),
+        "process_resident_memory_bytes": process_memory_bytes()
+    }
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "model_server:app",
+        host="0.0.0.0",
+        port=PORT,
+        reload=False,
+        log_level="info"
+    )
@@ -0,0 +1,168 @@
+"""
+Content-addressed cache for model predictions
+Bounded in-memory LRU tier with an optional SQLite tier that survives restarts
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# How long a disk cache query waits on another process's lock before giving up
+DISK_BUSY_TIMEOUT_S = 2.0
+
+
+def image_digest(image_bytes):
+    """SHA-256 of the uploaded file bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def model_fingerprint(path):
+    """Cheap version tag for a checkpoint file or directory (names, sizes and mtimes)"""
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+
+    files = [path] if path.is_file() else sorted(p for p in path.rglob("*") if p.is_file())
+    digest = hashlib.sha256()
+    for f in files:
+        stat = f.stat()
+        digest.update(f"{f.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def make_cache_key(image_hash, model_version, params=None):
+    """Combine image hash, model version and inference parameters into one key"""
+    payload = json.dumps(
+        {"image": image_hash, "model": model_version, "params": params or {}},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PredictionCache:
+    """
+    Two-tier cache of JSON-serialisable prediction results
+
+    The memory tier evicts least-recently-used entries once either
+    ``max_entries`` or ``max_bytes`` (measured on the serialised JSON) is
+    exceeded. When ``disk_path`` is set, results are also written to a SQLite
+    file, capped at ``max_disk_entries`` rows, and disk hits are promoted back
+    into memory. Several processes (pre-fork workers) may share that file: it
+    is opened in WAL mode with a busy timeout, and a disk read that still
+    fails on a lock counts as a miss.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, disk_path=None, max_disk_entries=100000):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._db = None
+        self.disk_path = Path(disk_path) if disk_path else None
+        if self.disk_path is not None:
+            try:
+                self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.disk_path), timeout=DISK_BUSY_TIMEOUT_S, check_same_thread=False)
+                # Readers don't block the writer (and vice versa) across worker processes
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(f"PRAGMA busy_timeout = {int(DISK_BUSY_TIMEOUT_S * 1000)}")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS predictions ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Disk cache disabled, cannot open {self.disk_path}: {str(e)}")
+                self._db = None
+
+    def get(self, key):
+        """Return a fresh copy of the cached result, or None on a miss"""
+        with self._lock:
+            raw = self._entries.get(key)
+            if raw is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(raw)
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value FROM predictions WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    # e.g. still locked by another worker after the busy timeout
+                    logger.warning(f"Disk cache read failed, treating as a miss: {str(e)}")
+                    row = None
+                if row is not None:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._store_memory(key, row[0])
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a result in every enabled tier"""
+        raw = json.dumps(value)
+        with self._lock:
+            self._store_memory(key, raw)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO predictions (key, value, created) VALUES (?, ?, ?)",
+                        (key, raw, time.time())
+                    )
+                    self._db.execute(
+                        "DELETE FROM predictions WHERE key IN ("
+                        "SELECT key FROM predictions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Disk cache write failed: {str(e)}")
+
+    def _store_memory(self, key, raw):
+        size = len(raw)
+        if size > self.max_bytes or self.max_entries == 0:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = raw
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current tier sizes"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "disk_enabled": self._db is not None
+        }
@@ -0,0 +1,178 @@
+"""
+Pre-fork serving mode
+Loads the model once in a parent process, binds the listening socket and
+forks uvicorn workers that inherit the weights copy-on-write, so adding a
+worker doesn't add another copy of BLIP or the detector. Torch intra-op
+threads are split across the workers so they don't oversubscribe the cores.
+Linux and macOS only (needs fork); CPU inference only. With more than one
+worker, state kept in process memory isn't shared: bones response_mode=reference
+and chest /predict/regenerate are disabled, and each worker has its own
+prediction cache (set CHEST_/BONES_CACHE_DB to share one on disk).
+
+Usage:
+    python prefork.py bones --workers 4
+    python prefork.py chest --workers 2 --port 8502
+    python prefork.py server --workers 2
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("prefork")
+
+TARGETS = {
+    "chest": {"module": "chest_model_api", "prefixes": ["CHEST"], "port": 8502},
+    "bones": {"module": "bones_model_api", "prefixes": ["BONES"], "port": 8503},
+    "server": {"module": "model_server", "prefixes": ["CHEST", "BONES"], "port": 8500}
+}
+
+# Settings that would give every worker a private copy of the weights again
+RESIDENCY_SETTINGS = ["CHEST_IDLE_OFFLOAD_S", "BONES_IDLE_OFFLOAD_S", "MODEL_MEMORY_BUDGET_MB"]
+
+
+def split_threads(prefixes, workers):
+    """
+    Default the torch threads to the cores split across every inference
+    thread of every worker process; one value for all services, since
+    torch.set_num_threads is process-wide
+    """
+    inference_workers = {prefix: max(1, int(os.getenv(f"{prefix}_INFERENCE_WORKERS", "1"))) for prefix in prefixes}
+    share = max(1, (os.cpu_count() or 1) // workers // sum(inference_workers.values()))
+    for prefix in prefixes:
+        threads = os.environ.setdefault(f"{prefix}_TORCH_THREADS", str(share))
+        logger.info(f"{prefix}: {inference_workers[prefix]} inference thread(s) x {threads} torch thread(s) per worker")
+
+
+def preload(target):
+    """Load the target's models into the process-wide registry before forking"""
+    import torch
+
+    if target in ("chest", "server"):
+        import chest_model_api
+        chest_model_api.shared_captioner("cpu", user="prefork")
+    if target in ("bones", "server"):
+        import bones_model_api
+        from quantization import check_inference_mode
+        device = torch.device("cpu")
+        mode = check_inference_mode(bones_model_api.INFERENCE_MODE, device)
+        bones_model_api.shared_detector(device, mode, bones_model_api.BACKEND, user="prefork")
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, index, log_level):
+    """Child process: serve ``app`` on the inherited socket until told to stop"""
+    import uvicorn
+
+    # The parent's signal handlers don't apply here; uvicorn installs its own
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a model API from forked workers sharing one copy of the weights")
+    parser.add_argument("target", choices=list(TARGETS))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, help="Default: 8502 chest, 8503 bones, 8500 server")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("❌ Pre-fork mode needs os.fork (Linux/macOS); run the service directly instead")
+        return 1
+
+    target = TARGETS[args.target]
+    port = args.port or target["port"]
+    workers = max(1, args.workers)
+
+    # Must be settled before the service modules read their settings on import
+    split_threads(target["prefixes"], workers)
+    for name in RESIDENCY_SETTINGS:
+        if float(os.environ.get(name, "0") or 0):
+            logger.warning(f"{name} is ignored in pre-fork mode: reloaded weights would not be shared")
+        os.environ[name] = "0"
+
+    # A CUDA context can't be shared with forked children, so the services must see no GPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    # Lets the services turn off features that depend on per-process state
+    os.environ["PREFORK_WORKERS"] = str(workers)
+
+    start = time.perf_counter()
+    preload(args.target)
+    module = __import__(target["module"])
+    logger.info(f"Models loaded in the parent in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    sock = bind_socket(args.host, port)
+    # Keep the garbage collector from touching (and so copying) objects created before the fork
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(module.app, sock, index, args.log_level)
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(workers):
+        spawn(index)
+    print(f"🚀 {args.target} on http://{args.host}:{port} with {workers} worker(s) sharing one copy of the weights")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, started = children.pop(pid, (None, None))
+        if index is None or stopping:
+            continue
+        logger.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+        # Don't spin if a worker dies right after starting
+        if time.monotonic() - started < 5:
+            time.sleep(5)
+        spawn(index)
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
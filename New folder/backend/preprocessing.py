@@ -0,0 +1,43 @@
+"""
+Bounded-resolution image decoding
+Oversized uploads are decoded straight to a working size and the scale is
+kept, so detections can be mapped back to original-image coordinates
+"""
+import io
+import math
+
+from PIL import Image
+
+
+def load_bounded_image(data, max_side):
+    """
+    Decode image bytes to RGB with the longer side at most ``max_side``
+
+    JPEGs use draft mode, which downscales by 1/2, 1/4 or 1/8 inside the
+    decoder; the remainder (and other formats) is a reduce-then-resample
+    thumbnail. ``max_side`` of 0 or None decodes at full size.
+
+    Returns ``(image, scale)`` where ``scale`` is the (x, y) factor from the
+    returned image back to the original.
+    """
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+
+    if max_side and max(width, height) > max_side:
+        ratio = max_side / max(width, height)
+        target = (max(1, math.floor(width * ratio)), max(1, math.floor(height * ratio)))
+        # Only affects JPEG; picks the largest DCT scale still at least ``target``
+        image.draft("RGB", target)
+        image = image.convert("RGB")
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    else:
+        image = image.convert("RGB")
+
+    return image, (width / image.width, height / image.height)
+
+
+def scale_boxes(boxes, scale):
+    """Map [x1, y1, x2, y2] boxes by an (x, y) scale factor"""
+    sx, sy = scale
+    return [[x1 * sx, y1 * sy, x2 * sx, y2 * sy] for x1, y1, x2, y2 in boxes]
@@ -0,0 +1,302 @@
+"""
+Opt-in per-request profiling for slow-request diagnosis
+A request is profiled when it carries the profile header or is picked by the
+sample rate. Its model call runs under the torch profiler, the service's
+stage timers are recorded alongside, and both are written as one Chrome
+trace (open in chrome://tracing or https://ui.perfetto.dev)
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+TRACE_ID_HEADER = "x-trace-id"
+TRUTHY = {"1", "true", "yes", "on"}
+
+# Operators kept per trace for summarize_traces.py
+TOP_OPERATORS = 100
+
+_active = contextvars.ContextVar("profile_session", default=None)
+
+
+def current_session():
+    """Profile session of the request being handled, or None"""
+    return _active.get()
+
+
+def record_stage(name, seconds):
+    """Stage listener for MetricsRegistry: adds the stage to the active session, if any"""
+    session = _active.get()
+    if session is not None:
+        session.add_stage(name, seconds)
+
+
+class ProfileSession:
+    """Stage timings and torch profiler runs collected for one request"""
+
+    def __init__(self, trace_id, service, path, profiler_lock):
+        self.trace_id = trace_id
+        self.service = service
+        self.path = path
+        self.status = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.stages = []
+        self.torch_skipped = 0
+        self._profiles = []
+        self._profiler_lock = profiler_lock
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        end_ns = time.time_ns()
+        with self._lock:
+            self.stages.append((name, end_ns - int(seconds * 1e9), end_ns, threading.current_thread().name))
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Call ``fn`` under the torch profiler; call it on the thread that runs the model
+
+        Only one torch profiler can be active per process, so if another
+        request is being profiled ``fn`` runs unprofiled and only the stage
+        timers are kept.
+        """
+        from torch.profiler import ProfilerActivity, profile
+        import torch
+
+        token = _active.set(self)
+        try:
+            if not self._profiler_lock.acquire(blocking=False):
+                self.torch_skipped += 1
+                return fn(*args, **kwargs)
+            try:
+                activities = [ProfilerActivity.CPU]
+                if torch.cuda.is_available():
+                    activities.append(ProfilerActivity.CUDA)
+                prof = profile(activities=activities, record_shapes=True)
+                try:
+                    with prof:
+                        return fn(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        self._profiles.append(prof)
+            finally:
+                self._profiler_lock.release()
+        finally:
+            _active.reset(token)
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and writes their traces
+
+    Traces go to ``trace_dir`` as ``<service>-<time>-<trace id>.json``; only
+    the newest ``max_traces`` of this service are kept. ``paths`` limits
+    profiling to those routes.
+    """
+
+    def __init__(self, service, trace_dir, sample_rate=0.0, max_traces=50, allow_header=True, paths=()):
+        self.service = service
+        self.trace_dir = Path(trace_dir)
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.max_traces = max(1, int(max_traces))
+        self.allow_header = allow_header
+        self.paths = set(paths)
+        self.saved = 0
+        self.failed = 0
+        self.last_trace_id = None
+        self._profiler_lock = threading.Lock()
+        self._rotate_lock = threading.Lock()
+
+    def wants_profile(self, path, headers):
+        """Whether a request to ``path`` with these (lower-cased) headers is profiled"""
+        if self.paths and path not in self.paths:
+            return False
+        if self.allow_header and headers.get(PROFILE_HEADER, "").strip().lower() in TRUTHY:
+            return True
+        # Sampled requests aren't started while another profile holds the torch profiler
+        return self.sample_rate > 0 and random.random() < self.sample_rate and not self._profiler_lock.locked()
+
+    def start(self, path):
+        return ProfileSession(uuid.uuid4().hex[:16], self.service, path, self._profiler_lock)
+
+    def save(self, session):
+        """Write the session as a Chrome trace and rotate old ones; returns the file path"""
+        events, operators, base_ns = self._torch_events(session)
+        events.extend(self._stage_events(session, base_ns))
+        duration_ms = ((session.end_ns or time.time_ns()) - session.start_ns) / 1e6
+
+        stage_ms = {}
+        for name, start_ns, end_ns, _ in session.stages:
+            stage_ms[name] = stage_ms.get(name, 0.0) + (end_ns - start_ns) / 1e6
+
+        document = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "baseTimeNanoseconds": base_ns,
+            "xray": {
+                "trace_id": session.trace_id,
+                "service": session.service,
+                "path": session.path,
+                "status": session.status,
+                "created": datetime.fromtimestamp(session.start_ns / 1e9, timezone.utc).isoformat(),
+                "duration_ms": round(duration_ms, 3),
+                "torch_profiled": bool(session._profiles),
+                "torch_skipped": session.torch_skipped,
+                "stages_ms": {name: round(ms, 3) for name, ms in stage_ms.items()},
+                "operators": operators
+            }
+        }
+
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.fromtimestamp(session.start_ns / 1e9).strftime("%Y%m%d-%H%M%S")
+        path = self.trace_dir / f"{self.service}-{stamp}-{session.trace_id}.json"
+        temp = path.with_suffix(".tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(temp, path)
+        self.saved += 1
+        self.last_trace_id = session.trace_id
+        self._rotate()
+        logger.info(f"Profile trace {session.trace_id} ({session.path}, {duration_ms:.1f}ms) -> {path}")
+        return path
+
+    def _torch_events(self, session):
+        """Chrome trace events and top operators of the session's torch profiler runs"""
+        events = []
+        operators = {}
+        base_ns = None
+        for i, prof in enumerate(session._profiles):
+            temp = self.trace_dir / f".{session.trace_id}-{i}.tmp"
+            self.trace_dir.mkdir(parents=True, exist_ok=True)
+            prof.export_chrome_trace(str(temp))
+            try:
+                with open(temp, encoding="utf-8") as f:
+                    trace = json.load(f)
+            finally:
+                temp.unlink(missing_ok=True)
+
+            # Event times are microseconds past the trace's baseTimeNanoseconds;
+            # several runs are shifted onto the base of the first
+            run_base = int(trace.get("baseTimeNanoseconds", 0))
+            if base_ns is None:
+                base_ns = run_base
+            shift_us = (run_base - base_ns) / 1000
+            for event in trace.get("traceEvents", []):
+                if shift_us and "ts" in event:
+                    event["ts"] = event["ts"] + shift_us
+                events.append(event)
+
+            for avg in prof.key_averages():
+                op = operators.setdefault(avg.key, {"name": avg.key, "count": 0, "self_cpu_us": 0.0, "cpu_us": 0.0})
+                op["count"] += avg.count
+                op["self_cpu_us"] += avg.self_cpu_time_total
+                op["cpu_us"] += avg.cpu_time_total
+
+        top = sorted(operators.values(), key=lambda op: op["self_cpu_us"], reverse=True)[:TOP_OPERATORS]
+        for op in top:
+            op["self_cpu_us"] = round(op["self_cpu_us"], 1)
+            op["cpu_us"] = round(op["cpu_us"], 1)
+        return events, top, base_ns or 0
+
+    def _stage_events(self, session, base_ns):
+        """Stage timers as a separate "request stages" process in the trace, one row per thread"""
+        pid = 0
+        events = [{"ph": "M", "name": "process_name", "pid": pid, "args": {"name": f"{self.service} request stages"}}]
+        threads = {"request": 0}
+        for _, _, _, thread in session.stages:
+            threads.setdefault(thread, len(threads))
+        for thread, tid in threads.items():
+            events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": thread}})
+
+        request_end = session.end_ns or time.time_ns()
+        events.append({
+            "ph": "X", "cat": "request", "name": f"{session.path} ({session.status})", "pid": pid, "tid": 0,
+            "ts": (session.start_ns - base_ns) / 1000, "dur": (request_end - session.start_ns) / 1000,
+            "args": {"trace_id": session.trace_id}
+        })
+        for name, start_ns, end_ns, thread in session.stages:
+            events.append({
+                "ph": "X", "cat": "stage", "name": name, "pid": pid, "tid": threads[thread],
+                "ts": (start_ns - base_ns) / 1000, "dur": (end_ns - start_ns) / 1000
+            })
+        return events
+
+    def _rotate(self):
+        with self._rotate_lock:
+            traces = sorted(self.trace_dir.glob(f"{self.service}-*.json"), key=lambda p: p.stat().st_mtime)
+            for old in traces[:-self.max_traces]:
+                old.unlink(missing_ok=True)
+
+    def stats(self):
+        return {
+            "trace_dir": str(self.trace_dir),
+            "sample_rate": self.sample_rate,
+            "header_enabled": self.allow_header,
+            "max_traces": self.max_traces,
+            "saved": self.saved,
+            "failed": self.failed,
+            "last_trace_id": self.last_trace_id
+        }
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that starts a profile session for selected requests
+
+    The session is visible to the handlers through ``current_session()``,
+    the trace id is returned in the X-Trace-Id header, and the trace is
+    written once the response has been sent.
+    """
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Routes are matched relative to where the app is mounted
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):] or "/"
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        if not self.profiler.wants_profile(path, headers):
+            await self.app(scope, receive, send)
+            return
+
+        session = self.profiler.start(path)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                session.status = message["status"]
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (TRACE_ID_HEADER.encode("latin-1"), session.trace_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = _active.set(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _active.reset(token)
+            session.end_ns = time.time_ns()
+            try:
+                await run_in_threadpool(self.profiler.save, session)
+            except Exception as e:
+                self.profiler.failed += 1
+                logger.error(f"Saving profile trace {session.trace_id} failed: {str(e)}")
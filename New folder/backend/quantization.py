@@ -0,0 +1,110 @@
+"""
+Reduced-precision CPU inference modes
+Dynamic int8 quantization for linear layers and BatchNorm folding for the detector backbone
+"""
+import logging
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ("fp32", "int8")
+
+
+def check_inference_mode(mode, device):
+    """Validate a requested mode; quantized kernels only exist on CPU"""
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode '{mode}', expected one of {INFERENCE_MODES}")
+    if mode == "int8" and str(device) != "cpu":
+        logger.warning(f"int8 inference is CPU-only, using fp32 on {device}")
+        return "fp32"
+    return mode
+
+
+def _select_quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    return torch.backends.quantized.engine
+
+
+def quantize_linear_layers(module):
+    """Swap every nn.Linear in ``module`` for a dynamic int8 equivalent, in place"""
+    try:
+        from torch.ao.quantization import quantize_dynamic
+    except ImportError:
+        # torch < 1.10
+        from torch.quantization import quantize_dynamic
+
+    _select_quantized_engine()
+    return quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def fuse_frozen_batchnorm(module):
+    """
+    Fold FrozenBatchNorm2d layers into the convolution that feeds them
+
+    The frozen statistics make this exact up to float rounding; each folded
+    norm layer is replaced with nn.Identity. Returns the number of folds.
+    """
+    from torchvision.ops.misc import FrozenBatchNorm2d
+
+    fused = 0
+    with torch.no_grad():
+        for parent in list(module.modules()):
+            children = list(parent.named_children())
+            for (_, conv), (bn_name, bn) in zip(children, children[1:]):
+                if not (isinstance(conv, nn.Conv2d) and isinstance(bn, FrozenBatchNorm2d)):
+                    continue
+                eps = getattr(bn, "eps", 1e-5)
+                scale = bn.weight * (bn.running_var + eps).rsqrt()
+                shift = bn.bias - bn.running_mean * scale
+                if conv.bias is not None:
+                    shift = shift + conv.bias * scale
+                conv.weight = nn.Parameter(conv.weight * scale.reshape(-1, 1, 1, 1), requires_grad=False)
+                conv.bias = nn.Parameter(shift, requires_grad=False)
+                setattr(parent, bn_name, nn.Identity())
+                fused += 1
+    return fused
+
+
+def quantize_blip(model):
+    """int8 mode for BLIP: dynamic quantization of the text decoder linear layers"""
+    model.text_decoder = quantize_linear_layers(model.text_decoder)
+    logger.info("BLIP text decoder quantized to dynamic int8")
+    return model
+
+
+def quantize_detector(model):
+    """
+    int8 mode for Faster R-CNN
+
+    BatchNorm is folded into the backbone convolutions (kept in fp32) and the
+    ROI box head MLP and predictor run as dynamic int8. The RPN and FPN
+    convolutions are left untouched since box regression is sensitive there.
+    """
+    fused = fuse_frozen_batchnorm(model.backbone.body)
+    model.roi_heads.box_head = quantize_linear_layers(model.roi_heads.box_head)
+    model.roi_heads.box_predictor = quantize_linear_layers(model.roi_heads.box_predictor)
+    logger.info(f"Detector quantized: {fused} BatchNorm layers folded, ROI heads in dynamic int8")
+    return model
+
+
+def model_size_mb(model):
+    """Approximate resident size of parameters, buffers and packed int8 weights"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    for value in model.state_dict().values():
+        # Packed quantized weights don't show up in parameters()
+        if isinstance(value, torch.Tensor) and value.is_quantized:
+            total += value.numel() * value.element_size()
+        elif isinstance(value, tuple):
+            total += sum(
+                t.numel() * t.element_size() for t in value
+                if isinstance(t, torch.Tensor) and t.is_quantized
+            )
+    return round(total / (1024 * 1024), 1)
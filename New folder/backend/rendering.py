@@ -0,0 +1,111 @@
+"""
+Detection annotation rendering
+Shared by the FastAPI service and the Streamlit app: the font is resolved
+once, label patches are rendered once per class and score, and boxes are
+converted to NumPy in a single call instead of per-box tensor reads
+"""
+import logging
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Tried in order; arial.ttf only exists on Windows
+FONT_CANDIDATES = [
+    "arial.ttf",
+    "Arial.ttf",
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+    "/Library/Fonts/Arial.ttf"
+]
+
+LABEL_PADDING = 5
+LABEL_TEXT_COLOR = (255, 255, 255)
+
+
+def load_font(size=30):
+    """First available TrueType font at ``size``, else Pillow's built-in font"""
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    logger.warning("No TrueType font found, using Pillow's default font")
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def to_numpy(values, dtype):
+    """Tensor, list or array to a NumPy array with one conversion"""
+    if hasattr(values, "detach"):
+        values = values.detach().cpu().numpy()
+    return np.asarray(values, dtype=dtype)
+
+
+class DetectionRenderer:
+    """
+    Draws detection boxes with per-class colours and labels
+
+    Label patches (text on the class colour) are rendered once per distinct
+    label text and pasted afterwards; class-name-only patches are rendered
+    up front.
+    """
+
+    def __init__(self, class_names, class_colors, font_size=30, box_width=3, default_color=(255, 0, 0)):
+        self.class_names = list(class_names)
+        self.class_colors = dict(class_colors)
+        self.font = load_font(font_size)
+        self.box_width = box_width
+        self.default_color = default_color
+        self._label_patch = lru_cache(maxsize=2048)(self._render_label)
+        for label in range(len(self.class_names)):
+            self._label_patch(label, None)
+
+    def class_name(self, label):
+        return self.class_names[label] if 0 <= label < len(self.class_names) else f"class_{label}"
+
+    def color(self, label):
+        return self.class_colors.get(self.class_name(label), self.default_color)
+
+    def _render_label(self, label, score_text):
+        text = self.class_name(label) if score_text is None else f"{self.class_name(label)}: {score_text}"
+        left, top, right, bottom = self.font.getbbox(text)
+        patch = Image.new(
+            "RGB",
+            (right + 2 * LABEL_PADDING, bottom + 2 * LABEL_PADDING),
+            self.color(label)
+        )
+        ImageDraw.Draw(patch).text((LABEL_PADDING, LABEL_PADDING), text, fill=LABEL_TEXT_COLOR, font=self.font)
+        return patch
+
+    def render(self, image, boxes, scores, labels, max_boxes=None, show_scores=True):
+        """
+        Draw detections onto ``image`` in place and return it
+
+        ``boxes``, ``scores`` and ``labels`` may be tensors, arrays or lists.
+        With ``max_boxes`` only the highest-scoring detections are drawn.
+        """
+        boxes = to_numpy(boxes, np.float32).reshape(-1, 4)
+        scores = to_numpy(scores, np.float32).reshape(-1)
+        labels = to_numpy(labels, np.int64).reshape(-1)
+        if max_boxes is not None:
+            order = np.argsort(-scores, kind="stable")[:max_boxes]
+            boxes, scores, labels = boxes[order], scores[order], labels[order]
+
+        draw = ImageDraw.Draw(image)
+        for (x1, y1, x2, y2), score, label in zip(boxes.tolist(), scores.tolist(), labels.tolist()):
+            draw.rectangle([(x1, y1), (x2, y2)], outline=self.color(label), width=self.box_width)
+            patch = self._label_patch(label, f"{score:.2f}" if show_scores else None)
+            image.paste(patch, (int(x1), int(y1)))
+        return image
+
+    def cache_info(self):
+        return self._label_patch.cache_info()._asdict()
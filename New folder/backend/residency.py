@@ -0,0 +1,237 @@
+"""
+Idle-model offload and memory-budgeted residency
+Models that haven't been used for a while, or that push the process over its
+memory budget, have their weights moved to a memory-mapped file: the
+anonymous memory is freed and the kernel can drop the file pages, while the
+model stays valid. The next use copies the weights back into memory.
+Weights of dynamic-int8 layers live in packed params that can't be mapped;
+they stay in memory and are reported separately.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import torch
+
+try:
+    from torch.ao.nn.quantized.modules.linear import LinearPackedParams
+except ImportError:
+    # torch < 1.10
+    from torch.nn.quantized.modules.linear import LinearPackedParams
+
+logger = logging.getLogger(__name__)
+
+
+def model_tensors(model):
+    """Named parameters and buffers of ``model``, shared tensors listed once"""
+    tensors = {}
+    seen = set()
+    for name, tensor in list(model.named_parameters()) + list(model.named_buffers()):
+        if tensor is None or id(tensor) in seen:
+            continue
+        seen.add(id(tensor))
+        tensors[name] = tensor
+    return tensors
+
+
+def packed_weight_bytes(model):
+    """Bytes held in the packed params of dynamic-int8 layers, which offloading can't move"""
+    nbytes = 0
+    for module in model.modules():
+        if isinstance(module, LinearPackedParams):
+            for tensor in module._weight_bias():
+                if tensor is not None:
+                    nbytes += tensor.numel() * tensor.element_size()
+    return nbytes
+
+
+class ResidentModel:
+    """
+    Residency state of one model
+
+    Wrap every model call in ``use()``: it reloads offloaded weights first
+    and keeps ``offload()`` from swapping them out while a call is running.
+    ``nbytes`` counts only the weights an offload frees; ``pinned_bytes`` the
+    packed int8 weights that stay in memory.
+    """
+
+    def __init__(self, name, model, offload_path, idle_timeout_s=0):
+        self.name = name
+        self.model = model
+        self.offload_path = Path(offload_path)
+        self.idle_timeout_s = float(idle_timeout_s)
+        self.state = "resident"
+        self.nbytes = sum(t.numel() * t.element_size() for t in model_tensors(model).values())
+        self.pinned_bytes = packed_weight_bytes(model)
+        if self.pinned_bytes:
+            logger.warning(
+                f"{name}: {self.pinned_bytes / 1024 / 1024:.1f} MB of int8 packed weights can't be offloaded "
+                f"and stay in memory"
+            )
+        self.last_used = time.monotonic()
+        self.offloads = 0
+        self.reloads = 0
+        self.last_offload_ms = None
+        self.last_reload_ms = None
+        self.total_reload_ms = 0.0
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def use(self):
+        with self._cond:
+            if self.state == "offloaded":
+                self._reload()
+            self._active += 1
+            self.last_used = time.monotonic()
+        try:
+            yield self.model
+        finally:
+            with self._cond:
+                self._active -= 1
+                self.last_used = time.monotonic()
+
+    def idle_s(self):
+        return 0.0 if self._active else time.monotonic() - self.last_used
+
+    def offload(self):
+        """Move the weights to the memory-mapped file; returns False if in use or already offloaded"""
+        with self._cond:
+            if self._active or self.state != "resident":
+                return False
+            start = time.perf_counter()
+            tensors = model_tensors(self.model)
+            if not self.offload_path.exists():
+                # Written once; later offloads map the same file
+                self.offload_path.parent.mkdir(parents=True, exist_ok=True)
+                # Unique temp file: several workers may write the same model at once
+                with tempfile.NamedTemporaryFile(
+                    dir=self.offload_path.parent, prefix=f"{self.offload_path.stem}-", suffix=".tmp", delete=False
+                ) as temp:
+                    torch.save({name: t.detach() for name, t in tensors.items()}, temp)
+                try:
+                    os.replace(temp.name, self.offload_path)
+                except OSError:
+                    os.unlink(temp.name)
+                    raise
+            mapped = torch.load(self.offload_path, mmap=True, weights_only=True)
+            with torch.no_grad():
+                for name, tensor in tensors.items():
+                    tensor.data = mapped[name]
+            self.state = "offloaded"
+            self.offloads += 1
+            self.last_offload_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Offloaded {self.name} ({self.nbytes / 1024 / 1024:.1f} MB) in {self.last_offload_ms:.1f}ms")
+        return True
+
+    def _reload(self):
+        start = time.perf_counter()
+        with torch.no_grad():
+            for tensor in model_tensors(self.model).values():
+                tensor.data = tensor.data.clone()
+        self.state = "resident"
+        self.reloads += 1
+        self.last_reload_ms = (time.perf_counter() - start) * 1000
+        self.total_reload_ms += self.last_reload_ms
+        logger.info(f"Reloaded {self.name} in {self.last_reload_ms:.1f}ms")
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "weights_mb": round(self.nbytes / 1024 / 1024, 1),
+            "pinned_mb": round(self.pinned_bytes / 1024 / 1024, 1),
+            "in_use": self._active,
+            "idle_s": round(self.idle_s(), 1),
+            "idle_timeout_s": self.idle_timeout_s or None,
+            "offloads": self.offloads,
+            "reloads": self.reloads,
+            "last_offload_ms": round(self.last_offload_ms, 1) if self.last_offload_ms is not None else None,
+            "last_reload_ms": round(self.last_reload_ms, 1) if self.last_reload_ms is not None else None,
+            "mean_reload_ms": round(self.total_reload_ms / self.reloads, 1) if self.reloads else None
+        }
+
+
+class ResidencyManager:
+    """
+    Process-wide idle timeouts and memory budget for registered models
+
+    A background thread offloads models idle for longer than their timeout
+    and, while resident weights exceed ``budget_bytes``, the least recently
+    used idle ones. A budget or timeout of 0 disables that rule.
+    """
+
+    def __init__(self, budget_bytes=0, check_interval_s=5.0):
+        self.budget_bytes = int(budget_bytes)
+        self.check_interval_s = check_interval_s
+        self._models = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, name, model, offload_path, idle_timeout_s=0):
+        """
+        Track ``model``; a model object registered twice (shared through the
+        model registry) keeps its first registration
+        """
+        with self._lock:
+            resident = self._models.get(id(model))
+            if resident is None:
+                resident = self._models[id(model)] = ResidentModel(name, model, offload_path, idle_timeout_s)
+                # Offload files of earlier model versions are never read again
+                for stale in Path(offload_path).parent.glob(f"{name}-*.pt"):
+                    if stale != Path(offload_path):
+                        stale.unlink(missing_ok=True)
+            if self._thread is None and (self.budget_bytes or idle_timeout_s):
+                self._thread = threading.Thread(target=self._run, name="residency", daemon=True)
+                self._thread.start()
+        return resident
+
+    def unregister(self, model):
+        with self._lock:
+            self._models.pop(id(model), None)
+
+    def use(self, model):
+        """``ResidentModel.use()`` for a registered model, a no-op context otherwise"""
+        resident = self._models.get(id(model))
+        return resident.use() if resident is not None else nullcontext(model)
+
+    def resident_bytes(self):
+        """Weights in memory, counting packed int8 weights that are never offloaded"""
+        return sum(m.pinned_bytes + (m.nbytes if m.state == "resident" else 0) for m in list(self._models.values()))
+
+    def check(self):
+        """Apply idle timeouts, then the memory budget"""
+        models = list(self._models.values())
+        for m in models:
+            if m.idle_timeout_s and m.state == "resident" and m.idle_s() >= m.idle_timeout_s:
+                m.offload()
+        if self.budget_bytes:
+            for m in sorted(models, key=lambda m: m.last_used):
+                if self.resident_bytes() <= self.budget_bytes:
+                    break
+                if m.state == "resident":
+                    m.offload()
+
+    def _run(self):
+        while True:
+            time.sleep(self.check_interval_s)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Residency check failed: {str(e)}")
+
+    def stats(self):
+        return {
+            "budget_mb": round(self.budget_bytes / 1024 / 1024, 1) if self.budget_bytes else None,
+            "resident_mb": round(self.resident_bytes() / 1024 / 1024, 1),
+            "models": {m.name: m.stats() for m in list(self._models.values())}
+        }
+
+
+# Shared by every service in this process; the budget covers all of them
+residency_manager = ResidencyManager(
+    budget_bytes=int(float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0")) * 1024 * 1024)
+)
@@ -0,0 +1,98 @@
+"""
+Single-flight coalescing of identical in-flight work
+Concurrent callers with the same key share one computation instead of repeating it
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SharedDeadline:
+    """
+    Deadline of work shared by several callers: the latest of theirs, or
+    none once any caller has none. Call it for the current value.
+    """
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+
+    def extend(self, deadline):
+        if self.deadline is not None:
+            self.deadline = None if deadline is None else max(self.deadline, deadline)
+
+    def __call__(self):
+        return self.deadline
+
+
+class _Call:
+    def __init__(self, deadline):
+        self.task = None
+        self.waiters = 0
+        self.deadline = SharedDeadline(deadline)
+
+
+class SingleFlight:
+    """
+    Share one in-flight task between concurrent callers with the same key
+
+    The first caller for a key starts ``fn()``; callers arriving while it is
+    still running await the same task and receive the same result or
+    exception. A cancelled caller only detaches itself - the shared task is
+    cancelled once no callers are left waiting on it. Completed keys are
+    forgotten immediately, so results are never reused after the fact.
+
+    ``fn`` is called with a SharedDeadline holding the latest ``deadline``
+    of the callers that joined, so work dropped at its deadline isn't
+    dropped while a caller with more time is still waiting for it.
+    """
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._calls = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, deadline=None):
+        """Run ``fn(shared_deadline)`` for ``key`` or join the run already in progress"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(deadline)
+            call.task = asyncio.get_running_loop().create_task(fn(call.deadline))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda t, key=key: self._forget(key, t))
+            self.started += 1
+        else:
+            call.deadline.extend(deadline)
+            self.coalesced += 1
+            logger.info(f"{self.name}: joined in-flight request {key[:12]}")
+
+        call.waiters += 1
+        try:
+            # Shield so one caller's cancellation doesn't cancel the others' result
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Forget the key now, not in the done callback: a caller
+                # arriving before that runs must start a fresh task instead
+                # of joining one that is being cancelled
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+
+    def _forget(self, key, task):
+        call = self._calls.get(key)
+        if call is not None and call.task is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when every waiter already left
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """In-flight keys and how many callers were coalesced"""
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,107 @@
+"""
+Summarize profiler traces saved by the model services
+Aggregates the top torch operators and the request stage timings across the
+Chrome traces written for profiled requests (X-Profile header or sampling)
+
+Usage:
+    python summarize_traces.py profiles/
+    python summarize_traces.py profiles/ --service bones --top 30 --sort total
+    python summarize_traces.py profiles/bones-20250101-120000-0123456789abcdef.json
+"""
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+
+
+def load_traces(paths, service=None):
+    """Metadata ("xray" section) of every trace file in ``paths``; directories are scanned"""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.json")) if path.is_dir() else [path])
+
+    traces = []
+    for file in files:
+        try:
+            with open(file, encoding="utf-8") as f:
+                meta = json.load(f).get("xray")
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Skipping {file}: {e}")
+            continue
+        if meta is None or (service and meta.get("service") != service):
+            continue
+        meta["file"] = str(file)
+        traces.append(meta)
+    return traces
+
+
+def summarize_operators(traces, sort_key):
+    """Operator totals across traces, most expensive first"""
+    totals = {}
+    for trace in traces:
+        for op in trace.get("operators", []):
+            total = totals.setdefault(op["name"], {"name": op["name"], "count": 0, "self_cpu_us": 0.0, "cpu_us": 0.0, "traces": 0})
+            total["count"] += op["count"]
+            total["self_cpu_us"] += op["self_cpu_us"]
+            total["cpu_us"] += op["cpu_us"]
+            total["traces"] += 1
+    return sorted(totals.values(), key=lambda op: op[sort_key], reverse=True)
+
+
+def summarize_stages(traces):
+    """Per-stage mean and max milliseconds over the traces that ran that stage"""
+    samples = {}
+    for trace in traces:
+        for name, ms in trace.get("stages_ms", {}).items():
+            samples.setdefault(name, []).append(ms)
+    return {
+        name: {"traces": len(values), "mean_ms": statistics.mean(values), "max_ms": max(values)}
+        for name, values in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize saved profiler traces")
+    parser.add_argument("paths", nargs="+", help="Trace files or directories of traces")
+    parser.add_argument("--service", choices=["bones", "chest"], help="Only traces of this service")
+    parser.add_argument("--top", type=int, default=20, help="Operators to list")
+    parser.add_argument("--sort", choices=["self", "total"], default="self",
+                        help="Rank operators by self CPU time or total time including children")
+    parser.add_argument("--slowest", type=int, default=5, help="Slowest requests to list")
+    args = parser.parse_args()
+
+    traces = load_traces(args.paths, args.service)
+    if not traces:
+        print("❌ No traces found")
+        return 1
+
+    profiled = [t for t in traces if t.get("torch_profiled")]
+    durations = [t["duration_ms"] for t in traces]
+    print(f"📂 {len(traces)} trace(s), {len(profiled)} with torch profiles")
+    print(f"⏱️  Request time: mean={statistics.mean(durations):.1f}ms max={max(durations):.1f}ms\n")
+
+    print("🧩 Stages")
+    for name, stage in sorted(summarize_stages(traces).items(), key=lambda kv: kv[1]["mean_ms"], reverse=True):
+        print(f"   {name:<20} mean={stage['mean_ms']:9.2f}ms max={stage['max_ms']:9.2f}ms ({stage['traces']} trace(s))")
+
+    sort_key = "self_cpu_us" if args.sort == "self" else "cpu_us"
+    operators = summarize_operators(profiled, sort_key)
+    if operators:
+        grand_total = sum(op["self_cpu_us"] for op in operators) or 1.0
+        print(f"\n🔥 Top {min(args.top, len(operators))} operators by {args.sort} CPU time")
+        print(f"   {'operator':<44} {'calls':>8} {'self ms':>10} {'total ms':>10} {'self %':>7}")
+        for op in operators[:args.top]:
+            print(
+                f"   {op['name'][:44]:<44} {op['count']:>8} {op['self_cpu_us'] / 1000:>10.2f} "
+                f"{op['cpu_us'] / 1000:>10.2f} {100 * op['self_cpu_us'] / grand_total:>6.1f}%"
+            )
+
+    print("\n🐢 Slowest requests")
+    for trace in sorted(traces, key=lambda t: t["duration_ms"], reverse=True)[:args.slowest]:
+        print(f"   {trace['duration_ms']:9.1f}ms {trace['service']} {trace['path']} {trace['trace_id']} ({trace['created']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+"""
+Tests for the backend's building blocks and services
+
+Only the chest service tests need model files (xray_models/chest); they are
+skipped without them. The bones tests use a randomly initialised detector.
+
+Run from the backend folder:
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+# The backend modules are flat files next to this folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
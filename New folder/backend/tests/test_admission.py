@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from admission import (
+    AdmissionController, DeadlineExceeded, Overloaded, _Admitted, _admitted, admit_more, check_deadline
+)
+
+
+def controller(max_queue=4, slo_ms=0, wait_ms=0.0):
+    return AdmissionController("test", max_queue, slo_ms, 0, lambda: wait_ms)
+
+
+def test_weighted_admission_counts_every_slot():
+    admission = controller(max_queue=4)
+    assert admission.try_admit(3) == (3, None)
+    taken, rejection = admission.try_admit(2)
+    assert taken == 0 and rejection["reason"] == "queue_full"
+    assert admission.in_flight == 3
+    admission.release(3)
+    assert admission.in_flight == 0
+
+
+def test_weight_is_capped_to_the_whole_queue():
+    admission = controller(max_queue=4)
+    taken, _ = admission.try_admit(1)
+    assert admission.try_admit(10, held=taken) == (3, None)
+    assert admission.in_flight == 4
+    assert admission.admitted == 1
+
+
+def test_slo_rejection_sets_retry_after():
+    taken, rejection = controller(slo_ms=100, wait_ms=2500).try_admit()
+    assert taken == 0
+    assert rejection["reason"] == "slo"
+    assert rejection["retry_after_s"] == 3
+
+
+def admitted_context(admission, deadline=None):
+    admission.try_admit()
+    admitted = _Admitted(admission, deadline)
+    _admitted.set(admitted)
+    return admitted
+
+
+def test_admit_more_raises_the_request_weight():
+    admission = controller(max_queue=8)
+
+    async def main():
+        admitted = admitted_context(admission)
+        admit_more(4)
+        return admitted.weight
+
+    assert asyncio.run(main()) == 5
+    assert admission.in_flight == 5
+
+
+def test_admit_more_rejects_when_the_queue_is_busy():
+    admission = controller(max_queue=4)
+    admission.try_admit(2)
+
+    async def main():
+        admitted = admitted_context(admission)
+        with pytest.raises(Overloaded) as e:
+            admit_more(3)
+        return admitted.weight, e.value.rejection
+
+    weight, rejection = asyncio.run(main())
+    assert weight == 1
+    assert rejection["reason"] == "queue_full"
+    assert admission.in_flight == 3
+
+
+def test_check_deadline_uses_the_given_callable():
+    check_deadline(lambda: None)
+    with pytest.raises(DeadlineExceeded):
+        check_deadline(lambda: 0.0)
@@ -0,0 +1,55 @@
+import io
+import json
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from PIL import Image
+
+import annotated_images
+from annotated_images import AnnotatedImageStore, encode_jpeg, multipart_mixed
+
+
+def parse_multipart(body, content_type):
+    """[(content type, payload bytes)] of a multipart body"""
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    return [(part.get_content_type(), part.get_payload(decode=True)) for part in message.iter_parts()]
+
+
+def test_encode_jpeg_downscales_to_max_side():
+    image = Image.new("RGB", (400, 200), (10, 20, 30))
+    data, size = encode_jpeg(image, quality=80, max_side=100)
+    assert size == (100, 50)
+    assert Image.open(io.BytesIO(data)).size == (100, 50)
+    assert image.size == (400, 200)
+    assert encode_jpeg(image)[1] == (400, 200)
+
+
+def test_multipart_body_has_the_json_then_the_jpeg():
+    jpeg, _ = encode_jpeg(Image.new("RGB", (8, 8)))
+    body, content_type = multipart_mixed({"detections": 1}, jpeg)
+    assert content_type.startswith("multipart/mixed; boundary=")
+    parts = parse_multipart(body, content_type)
+    assert [kind for kind, _ in parts] == ["application/json", "image/jpeg"]
+    assert json.loads(parts[0][1]) == {"detections": 1}
+    assert parts[1][1] == jpeg
+
+
+def test_store_drops_oldest_past_the_byte_budget():
+    store = AnnotatedImageStore(max_bytes=10)
+    first = store.put(b"x" * 6)
+    second = store.put(b"y" * 6)
+    assert store.get(first) is None
+    assert store.get(second) == b"y" * 6
+    assert store.stats()["bytes"] == 6
+
+
+def test_store_expires_images(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(annotated_images.time, "monotonic", lambda: now[0])
+    store = AnnotatedImageStore(max_bytes=100, ttl_s=60)
+    image_id = store.put(b"jpeg")
+    now[0] += 30
+    assert store.get(image_id) == b"jpeg"
+    now[0] += 31
+    assert store.get(image_id) is None
+    assert store.stats()["images"] == 0
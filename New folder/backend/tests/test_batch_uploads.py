@@ -0,0 +1,82 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import pytest
+from PIL import Image
+
+from batch_uploads import expand_uploads, is_zip, stream_ndjson
+
+MB = 1024 * 1024
+
+
+def make_zip(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_plain_files_and_zip_entries_are_expanded():
+    archive = make_zip([
+        ("scans/a.png", b"a"),
+        ("scans/notes.txt", b"skip"),
+        ("__MACOSX/scans/._a.png", b"skip"),
+        (".hidden.png", b"skip"),
+        ("b.JPG", b"b")
+    ])
+    images = expand_uploads([("x.png", "image/png", b"x"), ("scans.zip", "application/zip", archive)], 10)
+    assert images == [("x.png", b"x"), ("scans.zip/scans/a.png", b"a"), ("scans.zip/b.JPG", b"b")]
+
+
+def test_image_count_is_checked_before_reading():
+    archive = make_zip([(f"{i}.png", b"x") for i in range(5)])
+    with pytest.raises(ValueError, match="At most 3 images"):
+        expand_uploads([("a.zip", "application/zip", archive)], 3)
+
+
+def test_oversized_entry_is_rejected_without_inflating_it():
+    bomb = make_zip([("bomb.png", bytes(20 * MB))])
+    assert len(bomb) < MB
+    with pytest.raises(ValueError, match="larger than 1 MB"):
+        expand_uploads([("bomb.zip", "application/zip", bomb)], 10, max_image_bytes=MB)
+
+
+def test_total_uncompressed_size_is_capped():
+    archive = make_zip([(f"{i}.png", bytes(MB // 2)) for i in range(5)])
+    with pytest.raises(ValueError, match="larger than 2 MB uncompressed"):
+        expand_uploads([("a.zip", "application/zip", archive)], 10, max_image_bytes=MB, max_total_bytes=2 * MB)
+
+
+def test_stream_ndjson_reports_failures_per_image():
+    async def process(name, data):
+        if data == b"bad":
+            raise ValueError("cannot decode")
+        return {"success": True, "size": len(data)}
+
+    async def main():
+        return [json.loads(line) async for line in stream_ndjson([("a", b"ok"), ("b", b"bad")], process)]
+
+    lines = sorted(asyncio.run(main()), key=lambda line: line["index"])
+    assert lines[0] == {"index": 0, "filename": "a", "success": True, "size": 2}
+    assert lines[1] == {"index": 1, "filename": "b", "success": False, "error": "cannot decode"}
+
+
+def test_decoder_errors_get_a_fixed_message():
+    async def process(name, data):
+        return {"success": True, "size": Image.open(io.BytesIO(data)).size}
+
+    async def main():
+        return [json.loads(line) async for line in stream_ndjson([("junk.png", b"not an image")], process)]
+
+    (line,) = asyncio.run(main())
+    assert line == {"index": 0, "filename": "junk.png", "success": False, "error": "File is not a readable image"}
+
+
+def test_zip_detection():
+    assert is_zip("scans.ZIP", None, b"")
+    assert is_zip("upload", "application/x-zip-compressed", b"")
+    assert is_zip("upload", "application/octet-stream", b"PK\x03\x04rest")
+    assert not is_zip("a.png", "image/png", b"\x89PNG")
@@ -0,0 +1,168 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import DeadlineExceeded
+from batching import MicroBatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def recording_handler(batches):
+    def handler(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+    return handler
+
+
+def test_full_batch_runs_without_waiting_for_the_window():
+    batches = []
+
+    async def main():
+        batcher = MicroBatcher(recording_handler(batches), max_batch_size=3, max_wait_ms=10_000)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+        elapsed = time.perf_counter() - start
+        await batcher.stop()
+        return results, elapsed
+
+    results, elapsed = run(main())
+    assert results == [0, 10, 20]
+    assert batches == [[0, 1, 2]]
+    assert elapsed < 5
+
+
+def test_batch_is_capped_at_max_batch_size():
+    batches = []
+
+    async def main():
+        batcher = MicroBatcher(recording_handler(batches), max_batch_size=2, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.stop()
+        return results
+
+    assert run(main()) == [0, 10, 20, 30, 40]
+    assert all(len(batch) <= 2 for batch in batches)
+    assert sorted(item for batch in batches for item in batch) == [0, 1, 2, 3, 4]
+
+
+def test_partial_batch_flushes_after_max_wait():
+    batches = []
+
+    async def main():
+        batcher = MicroBatcher(recording_handler(batches), max_batch_size=8, max_wait_ms=20)
+        start = time.perf_counter()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        elapsed = time.perf_counter() - start
+        await batcher.stop()
+        return results, elapsed
+
+    results, elapsed = run(main())
+    assert results == [10, 20]
+    assert batches == [[1, 2]]
+    assert 0.015 <= elapsed < 2
+
+
+def test_exception_result_fails_only_its_caller():
+    def handler(items):
+        return [ValueError(f"bad {item}") if item == 1 else item for item in items]
+
+    async def main():
+        batcher = MicroBatcher(handler, max_batch_size=2, max_wait_ms=1000)
+        results = await asyncio.gather(batcher.submit(0), batcher.submit(1), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    ok, failed = run(main())
+    assert ok == 0
+    assert isinstance(failed, ValueError) and str(failed) == "bad 1"
+
+
+def test_handler_error_fails_the_whole_batch():
+    def handler(items):
+        raise RuntimeError("model failed")
+
+    async def main():
+        batcher = MicroBatcher(handler, max_batch_size=2, max_wait_ms=1000)
+        results = await asyncio.gather(batcher.submit(0), batcher.submit(1), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(r, RuntimeError) for r in run(main()))
+
+
+def test_expired_items_are_dropped_before_the_handler():
+    batches = []
+
+    async def main():
+        batcher = MicroBatcher(recording_handler(batches), max_batch_size=2, max_wait_ms=1000)
+        now = time.perf_counter()
+        results = await asyncio.gather(
+            batcher.submit(1, deadline=now - 1),
+            batcher.submit(2, deadline=now + 60),
+            return_exceptions=True
+        )
+        await batcher.stop()
+        return batcher, results
+
+    batcher, (expired, ok) = run(main())
+    assert isinstance(expired, DeadlineExceeded)
+    assert ok == 20
+    assert batches == [[2]]
+    assert batcher.expired == 1
+
+
+def test_callable_deadline_is_read_when_the_batch_forms():
+    batches = []
+
+    async def main():
+        batcher = MicroBatcher(recording_handler(batches), max_batch_size=2, max_wait_ms=50)
+        deadline = [time.perf_counter() + 0.01]
+        pending = asyncio.ensure_future(batcher.submit(1, deadline=lambda: deadline[0]))
+        # Extended while queued, past the original deadline
+        deadline[0] += 60
+        result = await pending
+        await batcher.stop()
+        return result
+
+    assert run(main()) == 10
+    assert batches == [[1]]
+
+
+def test_stop_fails_queued_requests():
+    batches = []
+
+    async def main():
+        batcher = MicroBatcher(recording_handler(batches), max_batch_size=8, max_wait_ms=10_000)
+        pending = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        assert batcher.queue_depth() == 3
+        await batcher.stop()
+        return await asyncio.gather(*pending, return_exceptions=True), batcher
+
+    results, batcher = run(main())
+    assert batches == []
+    assert batcher.queue_depth() == 0
+    for result in results:
+        assert isinstance(result, RuntimeError)
+        assert "shutting down" in str(result)
+
+
+def test_estimated_wait_uses_recent_per_item_time():
+    async def main():
+        def handler(items):
+            time.sleep(0.01)
+            return items
+        batcher = MicroBatcher(handler, max_batch_size=1, max_wait_ms=0)
+        assert batcher.estimated_wait_ms() == 0.0
+        await batcher.submit(1)
+        await batcher.stop()
+        return batcher
+
+    batcher = run(main())
+    assert batcher.per_item_ms >= 10
+    batcher._pending.extend([None] * 4)
+    assert batcher.estimated_wait_ms() == pytest.approx(4 * batcher.per_item_ms)
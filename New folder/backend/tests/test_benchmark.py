@@ -0,0 +1,55 @@
+import io
+
+import pytest
+from PIL import Image
+
+from benchmark import STAGES, compare, percentile, run_load, summarize, synthetic_study
+
+
+def test_synthetic_studies_are_reproducible_and_distinct():
+    first = synthetic_study(64, 48, seed=1)
+    assert first == synthetic_study(64, 48, seed=1)
+    assert first != synthetic_study(64, 48, seed=2)
+    assert Image.open(io.BytesIO(first)).size == (64, 48)
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 95) == 7
+    assert percentile([1, 2], 95) == 2
+    assert percentile([], 50) is None
+
+
+def test_summarize_counts_errors_and_stages():
+    summary = summarize([30.0, 10.0, 20.0], elapsed_s=2.0, errors=1, stage_samples={STAGES[0]: [4.0, 2.0]})
+    assert summary["requests"] == 4 and summary["errors"] == 1
+    assert summary["mean_ms"] == 20.0
+    assert summary["p50_ms"] == 20.0 and summary["p99_ms"] == 30.0
+    assert summary["throughput_rps"] == 1.5
+    assert summary["stages"] == {STAGES[0]: {"mean_ms": 3.0, "p50_ms": 2.0, "p95_ms": 4.0}}
+
+
+def test_run_load_reports_failures_per_call():
+    def call(payload):
+        if payload == "bad":
+            raise ValueError(payload)
+        return payload.upper()
+
+    outcomes, elapsed_s = run_load(call, ["a", "bad", "b"], concurrency=2)
+    assert [result for _, result, _ in outcomes] == ["A", None, "B"]
+    assert isinstance(outcomes[1][2], ValueError)
+    assert elapsed_s >= 0
+
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    baseline = {"results": {"bones@1": {"p50_ms": 100.0, "p95_ms": 200.0, "p99_ms": 300.0, "throughput_rps": 10.0}}}
+    current = {"results": {
+        "bones@1": {"p50_ms": 105.0, "p95_ms": 260.0, "p99_ms": 300.0, "throughput_rps": 7.0},
+        "bones@4": {"p50_ms": 1.0}
+    }}
+    regressions = compare(current, baseline, threshold=0.1)
+    assert [(key, metric) for key, metric, *_ in regressions] == [("bones@1", "p95_ms"), ("bones@1", "throughput_rps")]
+    assert regressions[0][4] == pytest.approx(0.3)
@@ -0,0 +1,83 @@
+import pytest
+import torch
+from torchvision.ops.misc import FrozenBatchNorm2d
+
+from bones_detector import build_model, exported_path, load_checkpoint, load_detector, load_exported_detector
+
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("weights") / "detector.pt"
+    torch.save(build_model().state_dict(), path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def image():
+    torch.manual_seed(1)
+    return torch.rand(3, 256, 320)
+
+
+def assert_same_detections(actual, expected, atol):
+    assert actual.keys() == expected.keys()
+    assert len(actual["boxes"]) == len(expected["boxes"])
+    for key in ("boxes", "scores"):
+        torch.testing.assert_close(actual[key], expected[key], atol=atol, rtol=0)
+    assert torch.equal(actual["labels"], expected["labels"])
+
+
+def test_cold_start_downloads_nothing_and_matches_a_regular_load(checkpoint, image, monkeypatch):
+    def no_downloads(*args, **kwargs):
+        raise AssertionError("pretrained weights were requested")
+
+    monkeypatch.setattr(torch.hub, "load_state_dict_from_url", no_downloads)
+    model, timings = load_detector(checkpoint)
+    assert set(timings) == {"checkpoint_load_ms", "build_and_assign_ms", "to_device_ms", "total_ms"}
+    assert not model.training
+    assert not any(p.is_meta for p in model.parameters())
+    assert all(m.eps == 0.0 for m in model.modules() if isinstance(m, FrozenBatchNorm2d))
+
+    reference = build_model()
+    reference.load_state_dict(torch.load(checkpoint, map_location="cpu"))
+    reference.eval()
+    with torch.no_grad():
+        assert_same_detections(model([image])[0], reference([image])[0], atol=0)
+
+
+def test_legacy_checkpoints_still_load(checkpoint, tmp_path):
+    legacy = tmp_path / "legacy.pt"
+    state_dict = torch.load(checkpoint, map_location="cpu")
+    torch.save(state_dict, legacy, _use_new_zipfile_serialization=False)
+    loaded = load_checkpoint(legacy)
+    assert loaded.keys() == state_dict.keys()
+    assert all(torch.equal(loaded[k], state_dict[k]) for k in state_dict)
+
+
+def test_torchscript_export_matches_eager_and_is_written_atomically(checkpoint, image):
+    eager, _ = load_detector(checkpoint)
+    scripted, timings = load_exported_detector(checkpoint)
+    assert "torchscript_export_ms" in timings
+    artifact = exported_path(checkpoint)
+    assert artifact.exists()
+    assert not list(checkpoint.parent.glob("*.tmp"))
+
+    with torch.no_grad():
+        assert_same_detections(scripted([image])[0], eager([image])[0], atol=1e-4)
+
+    # The second start loads the artifact instead of exporting again
+    _, timings = load_exported_detector(checkpoint)
+    assert "torchscript_load_ms" in timings and "torchscript_export_ms" not in timings
+
+
+def test_truncated_artifact_is_re_exported(checkpoint):
+    artifact = exported_path(checkpoint)
+    if not artifact.exists():
+        load_exported_detector(checkpoint)
+    data = artifact.read_bytes()
+    artifact.write_bytes(data[: len(data) // 2])
+
+    _, timings = load_exported_detector(checkpoint)
+    assert "torchscript_export_ms" in timings
+    _, timings = load_exported_detector(checkpoint)
+    assert "torchscript_load_ms" in timings
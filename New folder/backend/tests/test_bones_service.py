@@ -0,0 +1,179 @@
+"""
+Service-level tests for bones_model_api, run against a randomly initialised
+detector saved to a temporary checkpoint (no trained weights needed)
+"""
+import asyncio
+import base64
+import io
+import json
+import time
+
+import httpx
+import pytest
+import torch
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import bones_detector
+import bones_model_api
+from bones_detector import build_model
+from test_annotated_images import parse_multipart
+
+
+def png(shade, size=(96, 80)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (shade, 255 - shade, shade // 2)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def small_input_model(num_classes=bones_detector.NUM_CLASSES):
+    """The detector with a small internal resize, so CPU forward passes stay quick"""
+    model = build_model(num_classes)
+    model.transform.min_size = (256,)
+    model.transform.max_size = 320
+    return model
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    weights_dir = tmp_path_factory.mktemp("bones")
+    torch.manual_seed(0)
+    torch.save(build_model().state_dict(), weights_dir / "resnet.pt")
+
+    patch = pytest.MonkeyPatch()
+    patch.setattr(bones_detector, "build_model", small_input_model)
+    patch.setattr(bones_model_api, "MODEL_PATH", weights_dir / "resnet.pt")
+    patch.setattr(bones_model_api, "OFFLOAD_DIR", weights_dir / "offload")
+    patch.setattr(bones_model_api, "WARMUP_SIZES", [(128, 128)])
+    with TestClient(bones_model_api.app) as client:
+        yield client
+    patch.undo()
+
+
+def wait_until_ready(client, timeout_s=60):
+    deadline = time.monotonic() + timeout_s
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.1)
+
+
+def test_ready_reports_warmup_timings(client):
+    assert client.get("/live").json() == {"status": "alive"}
+    response = wait_until_ready(client)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ready"] and body["model_loaded"]
+    assert body["warmup"]["status"] == "ready"
+    assert [(run["size"], run["batch_size"]) for run in body["warmup"]["runs"]] == [([128, 128], 1)]
+    assert body["warmup"]["runs"][0]["ms"] > 0
+    assert client.get("/health").json()["ready"]
+
+
+def post_concurrently(client, uploads):
+    """POST every upload to /predict at once, on the app's own event loop"""
+    async def main():
+        transport = httpx.ASGITransport(app=bones_model_api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            responses = await asyncio.gather(*(
+                http.post("/predict?response_mode=findings", files={"file": ("x.png", data, "image/png")})
+                for data in uploads
+            ))
+        return [r.json() for r in responses]
+
+    return client.portal.call(main)
+
+
+def test_concurrent_uploads_share_one_forward_pass(client):
+    uploads = [png(shade) for shade in (10, 120, 240)]
+    batcher = bones_model_api.detection_batcher
+    batch_sizes = []
+    handler = batcher.handler
+
+    def recording_handler(items):
+        batch_sizes.append(len(items))
+        return handler(items)
+
+    batcher.handler = recording_handler
+    batcher.max_wait = 0.5
+    try:
+        results = post_concurrently(client, uploads)
+    finally:
+        batcher.handler = handler
+        batcher.max_wait = bones_model_api.BATCH_MAX_WAIT_MS / 1000
+
+    assert batch_sizes == [3]
+    assert all(r["success"] and not r["cached"] for r in results)
+
+    # Each image gets the findings it would get on its own
+    bones_model_api.prediction_cache._entries.clear()
+    for data, batched in zip(uploads, results):
+        alone = client.post("/predict?response_mode=findings", files={"file": ("x.png", data, "image/png")}).json()
+        assert alone["detections"] == batched["detections"]
+        for a, b in zip(alone["findings"], batched["findings"]):
+            assert a["type"] == b["type"]
+            assert a["confidence"] == pytest.approx(b["confidence"], abs=0.2)
+            assert a["box"] == pytest.approx(b["box"], abs=0.5)
+
+
+def predict(client, image, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return client.post(f"/predict?{query}", files={"file": ("x.png", image, "image/png")})
+
+
+def test_response_modes(client):
+    image = png(60, size=(160, 120))
+
+    inline = predict(client, image).json()
+    assert inline["image_base64"].startswith("data:image/jpeg;base64,")
+    annotated = Image.open(io.BytesIO(base64.b64decode(inline["image_base64"].split(",", 1)[1])))
+    assert list(annotated.size) == inline["annotated_size"] == [160, 120]
+    assert inline["original_size"] == [160, 120]
+
+    findings = predict(client, image, response_mode="findings").json()
+    assert not {"image_base64", "image_url", "annotated_size"} & set(findings)
+    assert findings["findings"] == inline["findings"]
+
+    with_thumbnail = predict(client, image, response_mode="findings", thumbnail="true").json()
+    thumb = Image.open(io.BytesIO(base64.b64decode(with_thumbnail["thumbnail_base64"].split(",", 1)[1])))
+    assert max(thumb.size) <= bones_model_api.THUMBNAIL_SIDE
+
+    reference = predict(client, image, response_mode="reference").json()
+    assert "image_base64" not in reference
+    fetched = client.get(reference["image_url"])
+    assert fetched.status_code == 200 and fetched.headers["content-type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(fetched.content)).size == (160, 120)
+    assert client.get("/images/unknown").status_code == 404
+
+    response = predict(client, image, response_mode="multipart")
+    parts = parse_multipart(response.content, response.headers["content-type"])
+    assert [kind for kind, _ in parts] == ["application/json", "image/jpeg"]
+    payload = json.loads(parts[0][1])
+    assert payload["findings"] == inline["findings"] and "image_base64" not in payload
+    assert Image.open(io.BytesIO(parts[1][1])).size == (160, 120)
+
+    assert predict(client, image, response_mode="bogus").status_code == 400
+
+
+def test_metrics_report_requests_and_stages(client):
+    assert predict(client, png(90), response_mode="findings").status_code == 200
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'bones_requests_total{path="/predict",status="200"}' in text
+    assert 'bones_stage_duration_seconds_count{stage="forward"}' in text
+    assert 'bones_stage_duration_seconds_count{stage="preprocess"}' in text
+    assert "bones_model_resident 1" in text
+
+
+def test_prefork_workers_disable_reference_mode(client, monkeypatch):
+    monkeypatch.setattr(bones_model_api, "PREFORK_WORKERS", 2)
+    image = png(120)
+    assert predict(client, image, response_mode="reference").status_code == 400
+    response = client.post(
+        "/predict/batch?response_mode=reference", files=[("files", ("x.png", image, "image/png"))]
+    )
+    assert response.status_code == 400
+    assert predict(client, image, response_mode="findings").status_code == 200
+    assert client.get("/health").json()["prefork_workers"] == 2
@@ -0,0 +1,53 @@
+import pytest
+
+from bulk_analyze import JsonlWriter, ParquetWriter
+
+
+def write_rows(writer, rows):
+    writer.open()
+    writer.write(rows)
+    writer.close()
+
+
+ROWS = [
+    {"path": "a.png", "caption": "clear"},
+    {"path": "b.png", "error": "inference failed: out of memory"},
+    {"path": "c.png", "error": "decode failed: truncated"},
+    {"path": "c.png", "caption": "retried fine"}
+]
+
+
+def test_jsonl_resume_skips_only_successful_paths(tmp_path):
+    path = tmp_path / "out.jsonl"
+    write_rows(JsonlWriter(path), ROWS)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"path": "d.png", "capt')
+    assert JsonlWriter(path).done_paths() == {"a.png", "c.png"}
+
+
+def test_jsonl_resume_after_a_partial_last_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    write_rows(JsonlWriter(path), ROWS[:1])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"path": "d.png", "capt')
+    writer = JsonlWriter(path)
+    assert writer.done_paths() == {"a.png"}
+    write_rows(writer, [{"path": "d.png", "caption": "resumed"}])
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines == ['{"path": "a.png", "caption": "clear"}', '{"path": "d.png", "caption": "resumed"}']
+    assert JsonlWriter(path).done_paths() == {"a.png", "d.png"}
+
+
+def test_jsonl_resume_from_a_file_with_only_a_partial_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"path": "a.png"', encoding="utf-8")
+    write_rows(JsonlWriter(path), ROWS[:1])
+    assert JsonlWriter(path).done_paths() == {"a.png"}
+    assert path.read_text(encoding="utf-8").count("\n") == 1
+
+
+def test_parquet_resume_skips_only_successful_paths(tmp_path):
+    pytest.importorskip("pyarrow")
+    write_rows(ParquetWriter(tmp_path / "parts", "chest"), ROWS)
+    assert ParquetWriter(tmp_path / "parts", "chest").done_paths() == {"a.png", "c.png"}
@@ -0,0 +1,120 @@
+"""
+Service-level tests for chest_model_api
+
+These need the BLIP weights in xray_models/chest and are skipped without them.
+"""
+import io
+import json
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import chest_model_api
+from chest_model_api import sse_event
+from decoding import DECODING_PROFILES
+from embedding_cache import encode_images, generate_from_embeds
+
+
+def png(shade, size=(128, 128)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (shade, shade, shade)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def parse_sse(text):
+    """[(event, data)] from a Server-Sent Events body"""
+    events = []
+    for message in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    if not (chest_model_api.MODEL_DIR.exists() and chest_model_api.PROCESSOR_DIR.exists()):
+        pytest.skip("BLIP weights not found in xray_models/chest")
+    patch = pytest.MonkeyPatch()
+    patch.setattr(chest_model_api, "WARMUP_SIZES", [])
+    patch.setattr(chest_model_api, "OFFLOAD_DIR", tmp_path_factory.mktemp("offload"))
+    with TestClient(chest_model_api.app) as client:
+        yield client
+    patch.undo()
+
+
+def test_sse_event_format():
+    assert sse_event("token", {"text": "clear"}) == 'event: token\ndata: {"text": "clear"}\n\n'
+    assert parse_sse(sse_event("token", {"text": "a"}) + sse_event("done", {"caption": "a"})) == [
+        ("token", {"text": "a"}), ("done", {"caption": "a"})
+    ]
+
+
+def test_stream_sends_tokens_then_done_with_time_to_first_token(client):
+    image = png(90)
+    response = client.post("/predict/stream", files={"file": ("x.png", image, "image/png")})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[-1] == "done"
+    assert set(names[:-1]) == {"token"} and len(names) > 1
+    done = events[-1][1]
+    assert done["caption"] == "".join(data["text"] for _, data in events[:-1]).strip()
+    assert not done["cached"]
+    assert 0 < done["time_to_first_token_ms"] <= done["total_ms"]
+
+    # A greedy caption is cached and replayed as a single token
+    events = parse_sse(client.post("/predict/stream", files={"file": ("x.png", image, "image/png")}).text)
+    assert [name for name, _ in events] == ["token", "done"]
+    assert events[1][1]["cached"] and events[1][1]["caption"] == done["caption"]
+
+
+def test_stream_rejects_unknown_decoding(client):
+    response = client.post("/predict/stream?decoding=beam", files={"file": ("x.png", png(10), "image/png")})
+    assert response.status_code == 400
+
+
+def test_captions_from_cached_embeddings_match_full_generation(client):
+    model, processor = chest_model_api.model, chest_model_api.processor
+    image = Image.open(io.BytesIO(png(150))).convert("RGB")
+    pixel_values = processor(images=[image], return_tensors="pt")["pixel_values"]
+    with torch.no_grad():
+        expected = model.generate(pixel_values=pixel_values, **DECODING_PROFILES["fast"])
+        actual = generate_from_embeds(model, encode_images(model, pixel_values), **DECODING_PROFILES["fast"])
+    assert torch.equal(actual, expected)
+
+
+def test_regenerate_reuses_the_cached_embeddings(client, monkeypatch):
+    image = png(200)
+    first = client.post("/predict?profile=fast", files={"file": ("x.png", image, "image/png")}).json()
+
+    def no_decoding(image_bytes):
+        raise AssertionError("the upload was decoded again")
+
+    monkeypatch.setattr(chest_model_api, "decode_image", no_decoding)
+    hits = chest_model_api.embedding_cache.stats()["hits"]
+    response = client.post(f"/predict/regenerate?image_id={first['image_id']}&profile=balanced")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["image_id"] == first["image_id"]
+    assert body["decoding_profile"] == "balanced" and not body["cached"]
+    assert chest_model_api.embedding_cache.stats()["hits"] > hits
+
+    # Same upload, another profile: served from the embeddings without decoding
+    response = client.post("/predict?profile=thorough", files={"file": ("x.png", image, "image/png")})
+    assert response.status_code == 200
+
+
+def test_regenerate_unknown_image_is_404(client):
+    response = client.post("/predict/regenerate?image_id=" + "0" * 64)
+    assert response.status_code == 404
+
+
+def test_regenerate_is_unavailable_with_prefork_workers(client, monkeypatch):
+    first = client.post("/predict?profile=fast", files={"file": ("x.png", png(220), "image/png")}).json()
+    monkeypatch.setattr(chest_model_api, "PREFORK_WORKERS", 2)
+    response = client.post(f"/predict/regenerate?image_id={first['image_id']}")
+    assert response.status_code == 501
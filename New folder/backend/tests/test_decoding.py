@@ -0,0 +1,52 @@
+import pytest
+
+from decoding import DecodingPolicy
+
+
+def policy(**estimates):
+    p = DecodingPolicy(default_profile="thorough", step_down_queue_depth=1000, batch_size=4)
+    p.estimates_ms.update(estimates)
+    return p
+
+
+def test_expected_latency_counts_whole_batches_ahead():
+    p = policy(fast=100.0)
+    assert p.expected_ms("fast", 0) == 100.0
+    # Any queued request means a batch runs before ours
+    assert p.expected_ms("fast", 1) == 200.0
+    assert p.expected_ms("fast", 4) == 200.0
+    assert p.expected_ms("fast", 5) == 300.0
+    assert p.expected_ms("fast", 8) == 300.0
+
+
+def test_budget_picks_most_thorough_profile_that_fits():
+    p = policy(fast=100.0, balanced=300.0, thorough=500.0)
+    assert p.select(latency_budget_ms=550) == ("thorough", "budget")
+    assert p.select(latency_budget_ms=350) == ("balanced", "budget")
+    # Four requests queued: one batch ahead doubles the expected latency
+    assert p.select(latency_budget_ms=550, queue_depth=4) == ("fast", "budget")
+    assert p.select(latency_budget_ms=650, queue_depth=4) == ("balanced", "budget")
+
+
+def test_budget_falls_back_to_cheapest_profile():
+    p = policy(fast=100.0, balanced=300.0, thorough=500.0)
+    assert p.select(latency_budget_ms=10) == ("fast", "budget")
+
+
+def test_record_tracks_batch_wall_time():
+    p = DecodingPolicy(batch_size=4, smoothing=0.5)
+    p.estimates_ms["fast"] = 100.0
+    p.record("fast", 300.0)
+    assert p.estimates_ms["fast"] == pytest.approx(200.0)
+
+
+def test_explicit_profile_wins_and_queue_steps_down():
+    p = DecodingPolicy(default_profile="thorough", step_down_queue_depth=8, batch_size=4)
+    assert p.select(requested="balanced") == ("balanced", "requested")
+    assert p.select() == ("thorough", "default")
+    assert p.select(queue_depth=8) == ("balanced", "queue_step_down")
+    assert p.select(queue_depth=16) == ("fast", "queue_step_down")
+    # A requested profile is stepped down too, and says so
+    assert p.select(requested="thorough", queue_depth=8) == ("balanced", "queue_step_down")
+    with pytest.raises(ValueError):
+        p.select(requested="nope")
@@ -0,0 +1,48 @@
+import torch
+
+from embedding_cache import EmbeddingCache
+
+
+def embeds(value, rows=4):
+    return torch.full((1, rows, 8), float(value))
+
+
+ROW_BYTES = 1 * 4 * 8 * 4
+
+
+def test_stores_a_copy_and_counts_hits():
+    cache = EmbeddingCache(max_bytes=10 * ROW_BYTES)
+    original = embeds(1)
+    cache.put("a", original)
+    original.fill_(9)
+    assert torch.equal(cache.get("a"), embeds(1))
+    assert cache.get("b") is None
+    assert "a" in cache and "b" not in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_evicts_least_recently_used_past_the_byte_budget():
+    cache = EmbeddingCache(max_bytes=2 * ROW_BYTES)
+    cache.put("a", embeds(1))
+    cache.put("b", embeds(2))
+    cache.get("a")
+    cache.put("c", embeds(3))
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.stats()["bytes"] == 2 * ROW_BYTES
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_entry_is_not_stored():
+    cache = EmbeddingCache(max_bytes=ROW_BYTES)
+    cache.put("big", embeds(1, rows=8))
+    assert "big" not in cache
+    assert cache.stats()["bytes"] == 0
+
+
+def test_replacing_an_entry_keeps_the_byte_count():
+    cache = EmbeddingCache(max_bytes=4 * ROW_BYTES)
+    cache.put("a", embeds(1))
+    cache.put("a", embeds(2))
+    assert cache.stats()["bytes"] == ROW_BYTES
+    assert torch.equal(cache.get("a"), embeds(2))
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import torch
+
+from inference_executor import InferenceExecutor
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def restore_torch_threads():
+    threads = torch.get_num_threads()
+    yield
+    torch.set_num_threads(threads)
+
+
+def test_calls_run_on_worker_threads_with_their_torch_thread_count(restore_torch_threads):
+    executor = InferenceExecutor(max_workers=1, torch_threads=1, name="test-inference")
+
+    def work(x, scale=1):
+        return threading.current_thread().name, torch.get_num_threads(), x * scale
+
+    try:
+        name, threads, value = run(executor.run(work, 2, scale=5))
+    finally:
+        executor.shutdown()
+    assert name.startswith("test-inference")
+    assert threads == 1
+    assert value == 10
+
+
+def test_at_most_max_workers_calls_run_at_once(restore_torch_threads):
+    executor = InferenceExecutor(max_workers=2, torch_threads=1)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    async def main():
+        await asyncio.gather(*(executor.run(work) for _ in range(6)))
+
+    try:
+        run(main())
+    finally:
+        executor.shutdown()
+    assert max(peak) == 2
+    assert executor.stats() == {"max_workers": 2, "torch_threads_per_worker": 1, "active": 0}
+
+
+def test_event_loop_stays_responsive_during_a_blocking_call(restore_torch_threads):
+    executor = InferenceExecutor(max_workers=1, torch_threads=1)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        await executor.run(time.sleep, 0.2)
+        task.cancel()
+
+    try:
+        run(main())
+    finally:
+        executor.shutdown()
+    assert len(ticks) >= 5
+
+
+def test_shutdown_drops_calls_not_yet_started(restore_torch_threads):
+    executor = InferenceExecutor(max_workers=1, torch_threads=1)
+    started = []
+
+    def work(i):
+        started.append(i)
+        time.sleep(0.05)
+
+    async def main():
+        calls = [asyncio.ensure_future(executor.run(work, i)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        executor.shutdown()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = run(main())
+    assert started == [0]
+    assert results[0] is None
+    assert all(isinstance(r, asyncio.CancelledError) for r in results[1:])
@@ -0,0 +1,86 @@
+import asyncio
+
+from metrics import MetricsMiddleware, MetricsRegistry
+
+
+def test_counter_renders_labelled_series():
+    registry = MetricsRegistry("svc")
+    counter = registry.counter("hits_total", "Hits", ["path"])
+    counter.inc(path="/a")
+    counter.inc(2, path="/a")
+    counter.inc(path='/"b"')
+    text = registry.render()
+    assert "# TYPE svc_hits_total counter" in text
+    assert 'svc_hits_total{path="/a"} 3' in text
+    assert 'svc_hits_total{path="/\\"b\\""} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry("svc")
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert 'svc_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'svc_latency_seconds_bucket{le="1"} 3' in lines
+    assert 'svc_latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "svc_latency_seconds_sum 6.05" in lines
+    assert "svc_latency_seconds_count 4" in lines
+
+
+def test_stage_timer_feeds_histogram_and_listeners():
+    registry = MetricsRegistry("svc")
+    seen = []
+    registry.add_stage_listener(lambda name, seconds: seen.append((name, seconds)))
+    with registry.stage("preprocess"):
+        pass
+    registry.observe_stage("inference", 0.2)
+    assert [name for name, _ in seen] == ["preprocess", "inference"]
+    assert seen[1][1] == 0.2
+    text = registry.render()
+    assert 'svc_stage_duration_seconds_count{stage="preprocess"} 1' in text
+    assert 'svc_stage_duration_seconds_bucket{stage="inference",le="0.25"} 1' in text
+
+
+def test_callback_metrics_are_read_at_scrape_time():
+    registry = MetricsRegistry("svc")
+    state = {"depth": 1}
+    registry.gauge("queue_depth", "Queued requests", lambda: state["depth"])
+    registry.counter_callback("evictions_total", "Evictions", lambda: {("memory",): 4}, ["tier"])
+    registry.gauge("broken", "Not started yet", lambda: 1 / 0)
+    registry.gauge("missing", "Not available", lambda: None)
+    state["depth"] = 5
+    text = registry.render()
+    assert "svc_queue_depth 5" in text
+    assert "# TYPE svc_evictions_total counter" in text
+    assert 'svc_evictions_total{tier="memory"} 4' in text
+    assert "svc_broken" not in text and "svc_missing" not in text
+
+
+def test_middleware_counts_requests_and_errors():
+    registry = MetricsRegistry("svc")
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/fail":
+            raise RuntimeError("boom")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = MetricsMiddleware(app, registry)
+
+    async def call(path):
+        async def send(message):
+            pass
+        try:
+            await middleware({"type": "http", "path": path}, None, send)
+        except RuntimeError:
+            pass
+
+    asyncio.run(call("/ok"))
+    asyncio.run(call("/fail"))
+    text = registry.render()
+    assert 'svc_requests_total{path="unmatched",status="200"} 1' in text
+    assert 'svc_requests_total{path="unmatched",status="500"} 1' in text
+    assert 'svc_request_errors_total{path="unmatched"} 1' in text
+    assert 'svc_request_duration_seconds_count{path="unmatched"} 2' in text
+    assert "svc_requests_in_flight 0" in text
@@ -0,0 +1,73 @@
+import threading
+
+from model_registry import ModelRegistry
+
+
+def counting_loader(calls):
+    def load():
+        calls.append(1)
+        return object()
+    return load
+
+
+def test_users_of_one_checkpoint_share_a_single_load(tmp_path):
+    registry = ModelRegistry()
+    calls = []
+    path = tmp_path / "model.pth"
+    first = registry.get_or_load("chest", path, counting_loader(calls), device="cpu")
+    second = registry.get_or_load("bones", tmp_path / "." / "model.pth", counting_loader(calls), device="cpu")
+    assert first is second and len(calls) == 1
+    [entry] = registry.stats()
+    assert entry["users"] == ["bones", "chest"] and entry["shared_loads_avoided"] == 1
+
+
+def test_different_options_load_separately(tmp_path):
+    registry = ModelRegistry()
+    calls = []
+    path = tmp_path / "model.pth"
+    fp32 = registry.get_or_load("a", path, counting_loader(calls), mode="fp32")
+    int8 = registry.get_or_load("a", path, counting_loader(calls), mode="int8")
+    assert fp32 is not int8 and len(calls) == 2
+
+
+def test_model_is_dropped_when_its_last_user_releases(tmp_path):
+    registry = ModelRegistry()
+    calls = []
+    path = tmp_path / "model.pth"
+    registry.get_or_load("chest", path, counting_loader(calls))
+    registry.get_or_load("bones", path, counting_loader(calls))
+
+    registry.release("chest")
+    assert registry.stats()[0]["users"] == ["bones"]
+    registry.release("bones")
+    assert registry.stats() == []
+
+    registry.get_or_load("bones", path, counting_loader(calls))
+    assert len(calls) == 2
+
+
+def test_concurrent_first_users_wait_for_one_load(tmp_path):
+    registry = ModelRegistry()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda user=user: results.append(registry.get_or_load(user, tmp_path / "m.pth", slow_load)))
+        for user in ("a", "b", "c")
+    ]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1 and len(results) == 3
+    assert all(result is results[0] for result in results)
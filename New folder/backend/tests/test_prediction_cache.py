@@ -0,0 +1,87 @@
+import sqlite3
+
+from prediction_cache import PredictionCache, make_cache_key
+
+
+def test_get_returns_a_copy_and_counts_hits():
+    cache = PredictionCache(max_entries=4)
+    assert cache.get("a") is None
+    cache.put("a", {"boxes": [1, 2]})
+    first = cache.get("a")
+    first["boxes"].append(3)
+    assert cache.get("a") == {"boxes": [1, 2]}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_tier_respects_byte_budget():
+    cache = PredictionCache(max_entries=100, max_bytes=20)
+    cache.put("a", "x" * 9)
+    cache.put("b", "y" * 9)
+    assert cache.get("a") is None
+    assert cache.get("b") == "y" * 9
+    # Larger than the whole budget: not kept in memory at all
+    cache.put("big", "z" * 50)
+    assert cache.get("big") is None
+    assert cache.stats()["bytes"] <= 20
+
+
+def test_disk_tier_survives_restart_and_promotes_hits(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    PredictionCache(max_entries=4, disk_path=path).put("a", {"caption": "clear"})
+
+    cache = PredictionCache(max_entries=4, disk_path=path)
+    assert cache.get("a") == {"caption": "clear"}
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("a") == {"caption": "clear"}
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_is_shared_in_wal_mode(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    writer = PredictionCache(max_entries=0, disk_path=path)
+    reader = PredictionCache(max_entries=0, disk_path=path)
+    assert sqlite3.connect(str(path)).execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    writer.put("a", {"caption": "clear"})
+    assert reader.get("a") == {"caption": "clear"}
+
+
+def test_locked_disk_read_is_a_miss(tmp_path):
+    class LockedDb:
+        def execute(self, *args):
+            raise sqlite3.OperationalError("database is locked")
+
+    cache = PredictionCache(max_entries=4, disk_path=tmp_path / "cache.sqlite")
+    cache._db = LockedDb()
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_keeps_newest_rows(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = PredictionCache(max_entries=0, disk_path=path, max_disk_entries=3)
+    for i in range(5):
+        cache.put(f"k{i}", i)
+    rows = {key for (key,) in sqlite3.connect(str(path)).execute("SELECT key FROM predictions")}
+    assert len(rows) == 3
+    assert "k4" in rows
+    assert cache.get("k4") == 4
+
+
+def test_cache_key_depends_on_model_and_params():
+    base = make_cache_key("img", "v1", {"threshold": 0.5})
+    assert base == make_cache_key("img", "v1", {"threshold": 0.5})
+    assert base != make_cache_key("img", "v2", {"threshold": 0.5})
+    assert base != make_cache_key("img", "v1", {"threshold": 0.6})
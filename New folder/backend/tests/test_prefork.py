@@ -0,0 +1,21 @@
+import prefork
+
+
+def test_threads_are_split_across_workers_and_inference_threads(monkeypatch):
+    monkeypatch.setattr(prefork.os, "cpu_count", lambda: 16)
+    monkeypatch.setenv("CHEST_INFERENCE_WORKERS", "1")
+    monkeypatch.setenv("BONES_INFERENCE_WORKERS", "3")
+    monkeypatch.delenv("CHEST_TORCH_THREADS", raising=False)
+    monkeypatch.setenv("BONES_TORCH_THREADS", "5")
+    prefork.split_threads(["CHEST", "BONES"], workers=2)
+    assert prefork.os.environ["CHEST_TORCH_THREADS"] == "2"
+    # An explicit setting is kept
+    assert prefork.os.environ["BONES_TORCH_THREADS"] == "5"
+
+
+def test_threads_never_drop_below_one(monkeypatch):
+    monkeypatch.setattr(prefork.os, "cpu_count", lambda: 2)
+    monkeypatch.delenv("BONES_INFERENCE_WORKERS", raising=False)
+    monkeypatch.delenv("BONES_TORCH_THREADS", raising=False)
+    prefork.split_threads(["BONES"], workers=8)
+    assert prefork.os.environ["BONES_TORCH_THREADS"] == "1"
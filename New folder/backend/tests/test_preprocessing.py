@@ -0,0 +1,47 @@
+import io
+
+import pytest
+from PIL import Image
+
+from preprocessing import load_bounded_image, scale_boxes
+
+
+def png(width, height):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buf, "PNG")
+    return buf.getvalue()
+
+
+def jpeg(width, height):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def test_small_image_is_decoded_at_full_size():
+    image, scale = load_bounded_image(png(400, 300), 1000)
+    assert image.size == (400, 300)
+    assert scale == (1.0, 1.0)
+
+
+@pytest.mark.parametrize("encode", [png, jpeg])
+def test_large_image_is_bounded_and_scale_points_back(encode):
+    image, scale = load_bounded_image(encode(3000, 1500), 1000)
+    assert max(image.size) <= 1000
+    assert image.mode == "RGB"
+    assert scale[0] == pytest.approx(3000 / image.width)
+    assert scale[1] == pytest.approx(1500 / image.height)
+
+
+def test_scale_boxes_maps_back_to_original_pixels():
+    assert scale_boxes([[10, 20, 30, 40]], (2.0, 0.5)) == [[20.0, 10.0, 60.0, 20.0]]
+    assert scale_boxes([], (2.0, 2.0)) == []
+
+
+def test_bounded_decode_scale_round_trips_boxes():
+    buf = io.BytesIO()
+    Image.new("RGB", (3000, 1500), "white").save(buf, "PNG")
+    image, scale = load_bounded_image(buf.getvalue(), 1000)
+    assert max(image.size) <= 1000
+    box = [[0, 0, image.width, image.height]]
+    assert scale_boxes(box, scale) == [pytest.approx([0, 0, 3000, 1500])]
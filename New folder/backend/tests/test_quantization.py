@@ -0,0 +1,74 @@
+import copy
+
+import pytest
+import torch
+import torch.nn as nn
+from torchvision.ops.misc import FrozenBatchNorm2d
+
+from bones_detector import build_model
+from quantization import (
+    check_inference_mode, fuse_frozen_batchnorm, model_size_mb, quantize_detector, quantize_linear_layers
+)
+
+
+def random_frozen_bn(channels):
+    bn = FrozenBatchNorm2d(channels)
+    bn.weight.uniform_(0.5, 1.5)
+    bn.bias.normal_()
+    bn.running_mean.normal_()
+    bn.running_var.uniform_(0.5, 2.0)
+    return bn
+
+
+def test_check_inference_mode():
+    assert check_inference_mode("int8", "cpu") == "int8"
+    assert check_inference_mode("int8", "cuda") == "fp32"
+    with pytest.raises(ValueError):
+        check_inference_mode("fp16", "cpu")
+
+
+def test_batchnorm_folding_is_exact():
+    torch.manual_seed(0)
+    block = nn.Sequential(
+        nn.Conv2d(3, 8, 3, bias=False), random_frozen_bn(8), nn.ReLU(),
+        nn.Conv2d(8, 4, 1), random_frozen_bn(4)
+    )
+    x = torch.randn(2, 3, 16, 16)
+    expected = block(x)
+    assert fuse_frozen_batchnorm(block) == 2
+    assert not any(isinstance(m, FrozenBatchNorm2d) for m in block.modules())
+    torch.testing.assert_close(block(x), expected, atol=1e-5, rtol=1e-5)
+
+
+def test_int8_linear_layers_stay_close_to_fp32_and_shrink():
+    torch.manual_seed(0)
+    mlp = nn.Sequential(nn.Linear(256, 512), nn.ReLU(), nn.Linear(512, 64)).eval()
+    x = torch.randn(16, 256)
+    expected = mlp(x)
+    fp32_mb = model_size_mb(mlp)
+    quantized = quantize_linear_layers(mlp)
+    actual = quantized(x)
+    assert (actual - expected).abs().max() / expected.abs().max() < 0.05
+    assert model_size_mb(quantized) < fp32_mb / 2
+
+
+def test_int8_detector_heads_stay_close_to_fp32():
+    torch.manual_seed(0)
+    fp32 = build_model().eval()
+    int8 = quantize_detector(copy.deepcopy(fp32))
+
+    # Folded backbone: same features up to float rounding
+    image = torch.rand(1, 3, 128, 160)
+    with torch.no_grad():
+        expected = fp32.backbone(image)
+        actual = int8.backbone(image)
+    for name in expected:
+        torch.testing.assert_close(actual[name], expected[name], atol=1e-3, rtol=1e-3)
+
+    # int8 ROI heads: class scores and box deltas within quantization error
+    pooled = torch.randn(32, 256, 7, 7)
+    with torch.no_grad():
+        expected = fp32.roi_heads.box_predictor(fp32.roi_heads.box_head(pooled))
+        actual = int8.roi_heads.box_predictor(int8.roi_heads.box_head(pooled))
+    for a, e in zip(actual, expected):
+        assert (a - e).abs().max() / e.abs().max() < 0.05
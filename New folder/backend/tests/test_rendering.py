@@ -0,0 +1,56 @@
+import numpy as np
+import torch
+from PIL import Image
+
+from rendering import DetectionRenderer, to_numpy
+
+CLASS_NAMES = ["background", "fracture", "implant"]
+CLASS_COLORS = {"fracture": (255, 0, 0), "implant": (0, 0, 255)}
+
+
+def blank(size=(200, 160)):
+    return Image.new("RGB", size, (0, 0, 0))
+
+
+def test_to_numpy_accepts_tensors_lists_and_arrays():
+    for values in (torch.tensor([1.5, 2.0]), [1.5, 2.0], np.array([1.5, 2.0])):
+        array = to_numpy(values, np.float32)
+        assert array.dtype == np.float32 and array.tolist() == [1.5, 2.0]
+
+
+def test_boxes_are_drawn_in_their_class_colour():
+    renderer = DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=12)
+    image = renderer.render(
+        blank(), torch.tensor([[20.0, 20.0, 180.0, 140.0]]), torch.tensor([0.9]), torch.tensor([2])
+    )
+    pixels = np.asarray(image)
+    # Bottom edge of the box, clear of the label patch
+    assert tuple(pixels[140, 100]) == (0, 0, 255)
+    assert tuple(pixels[80, 100]) == (0, 0, 0)
+
+
+def test_unknown_labels_get_the_default_colour():
+    renderer = DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=12)
+    assert renderer.class_name(7) == "class_7"
+    assert renderer.color(7) == (255, 0, 0)
+    renderer.render(blank(), [[10, 10, 50, 50]], [0.5], [7])
+
+
+def test_max_boxes_keeps_the_highest_scores():
+    renderer = DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=12)
+    boxes = [[10, 10, 60, 60], [100, 80, 190, 150]]
+    image = renderer.render(blank(), boxes, [0.3, 0.8], [1, 1], max_boxes=1, show_scores=False)
+    pixels = np.asarray(image)
+    assert tuple(pixels[150, 150]) == (255, 0, 0)
+    assert tuple(pixels[60, 40]) == (0, 0, 0)
+
+
+def test_label_patches_are_rendered_once_per_text():
+    renderer = DetectionRenderer(CLASS_NAMES, CLASS_COLORS, font_size=12)
+    # Class-name-only patches are prepared up front
+    assert renderer.cache_info()["currsize"] == len(CLASS_NAMES)
+    for _ in range(3):
+        renderer.render(blank(), [[10, 10, 60, 60], [80, 80, 150, 150]], [0.91, 0.91], [1, 1])
+    info = renderer.cache_info()
+    assert info["currsize"] == len(CLASS_NAMES) + 1
+    assert info["misses"] == len(CLASS_NAMES) + 1
@@ -0,0 +1,94 @@
+import torch
+import torch.nn as nn
+
+from quantization import quantize_linear_layers
+from residency import ResidencyManager, ResidentModel
+
+
+def small_model():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Linear(16, 32), nn.BatchNorm1d(32), nn.ReLU(), nn.Linear(32, 4)).eval()
+
+
+def test_offload_and_reload_keep_the_outputs(tmp_path):
+    model = small_model()
+    x = torch.randn(3, 16)
+    expected = model(x)
+    resident = ResidentModel("small", model, tmp_path / "small-1.pt")
+
+    assert resident.offload()
+    assert resident.state == "offloaded"
+    assert not resident.offload()
+    assert (tmp_path / "small-1.pt").exists()
+    assert not list(tmp_path.glob("*.tmp"))
+
+    with resident.use() as m:
+        assert resident.state == "resident"
+        assert torch.equal(m(x), expected)
+    assert resident.stats()["offloads"] == 1 and resident.stats()["reloads"] == 1
+
+    # Later offloads map the file already written
+    assert resident.offload()
+    with resident.use() as m:
+        assert torch.equal(m(x), expected)
+
+
+def test_model_in_use_is_not_offloaded(tmp_path):
+    resident = ResidentModel("small", small_model(), tmp_path / "small-1.pt")
+    with resident.use():
+        assert not resident.offload()
+    assert resident.offload()
+
+
+def test_int8_packed_weights_are_reported_as_pinned(tmp_path):
+    model = small_model()
+    fp32_bytes = ResidentModel("fp32", model, tmp_path / "fp32-1.pt").nbytes
+    quantize_linear_layers(model)
+    resident = ResidentModel("int8", model, tmp_path / "int8-1.pt")
+
+    # Only the BatchNorm tensors remain mappable; the int8 Linear weights stay in memory
+    assert resident.nbytes < fp32_bytes
+    assert resident.pinned_bytes >= (16 * 32 + 32 * 4)
+    x = torch.randn(3, 16)
+    expected = model(x)
+    assert resident.offload()
+    with resident.use() as m:
+        assert torch.equal(m(x), expected)
+
+
+def test_budget_offloads_the_least_recently_used_model(tmp_path):
+    manager = ResidencyManager(budget_bytes=1)
+    first = manager.register("first", small_model(), tmp_path / "first-1.pt")
+    second = manager.register("second", small_model(), tmp_path / "second-1.pt")
+    with second.use():
+        pass
+    manager.budget_bytes = second.nbytes
+    manager.check()
+    assert first.state == "offloaded"
+    assert second.state == "resident"
+    assert manager.resident_bytes() == second.nbytes
+
+
+def test_register_removes_stale_offload_files(tmp_path):
+    stale = tmp_path / "small-old.pt"
+    stale.write_bytes(b"")
+    ResidencyManager().register("small", small_model(), tmp_path / "small-new.pt")
+    assert not stale.exists()
+
+
+def test_idle_models_are_offloaded_and_unregistered_models_pass_through(tmp_path):
+    manager = ResidencyManager()
+    model = small_model()
+    resident = manager.register("small", model, tmp_path / "small-1.pt", idle_timeout_s=0.01)
+    assert manager.register("small", model, tmp_path / "small-2.pt") is resident
+
+    resident.last_used -= 1
+    manager.check()
+    assert resident.state == "offloaded"
+    assert manager.resident_bytes() == 0
+    with manager.use(model) as m:
+        assert m is model and resident.state == "resident"
+
+    other = small_model()
+    with manager.use(other) as m:
+        assert m is other
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from singleflight import SharedDeadline, SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_run():
+    calls = []
+
+    async def work(deadline):
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return flight, results
+
+    flight, results = run(main())
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+
+def test_different_keys_run_separately():
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(
+            flight.do("a", lambda deadline: asyncio.sleep(0, result="a")),
+            flight.do("b", lambda deadline: asyncio.sleep(0, result="b"))
+        ), flight
+
+    results, flight = run(main())
+    assert results == ["a", "b"]
+    assert flight.started == 2
+
+
+def test_error_reaches_every_waiter():
+    async def fail(deadline):
+        await asyncio.sleep(0.01)
+        raise ValueError("decode failed")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = run(main())
+    assert all(isinstance(r, ValueError) and str(r) == "decode failed" for r in results)
+
+
+def test_one_cancelled_waiter_does_not_cancel_the_others():
+    async def work(deadline):
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first
+
+    result, first = run(main())
+    assert result == "done"
+    assert first.cancelled()
+
+
+def test_last_waiter_cancelling_cancels_the_task_and_frees_the_key():
+    started = []
+
+    async def work(deadline):
+        started.append(1)
+        await asyncio.sleep(10)
+
+    async def main():
+        flight = SingleFlight()
+        caller = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        task = flight._calls["key"].task
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # The key is gone before the cancelled task has finished
+        assert "key" not in flight._calls
+        await asyncio.sleep(0)
+        return task
+
+    task = run(main())
+    assert task.cancelled()
+    assert len(started) == 1
+
+
+def test_caller_arriving_while_the_task_is_cancelled_starts_fresh():
+    runs = []
+
+    async def work(deadline):
+        runs.append(1)
+        await asyncio.sleep(0.01 if len(runs) > 1 else 10)
+        return len(runs)
+
+    async def main():
+        flight = SingleFlight()
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        # The cancelled task's done callback hasn't necessarily run yet
+        return await flight.do("key", work)
+
+    assert run(main()) == 2
+
+
+def test_shared_deadline_is_the_latest_of_the_callers():
+    deadline = SharedDeadline(10.0)
+    deadline.extend(5.0)
+    assert deadline() == 10.0
+    deadline.extend(20.0)
+    assert deadline() == 20.0
+    # A caller without a deadline keeps the work alive
+    deadline.extend(None)
+    deadline.extend(30.0)
+    assert deadline() is None
+
+
+def test_follower_with_a_later_deadline_extends_the_shared_run():
+    seen = []
+
+    async def work(deadline):
+        await asyncio.sleep(0.01)
+        seen.append(deadline())
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(flight.do("key", work, deadline=1.0), flight.do("key", work, deadline=2.0))
+
+    assert run(main()) == ["done", "done"]
+    assert seen == [2.0]
@@ -0,0 +1,68 @@
+import pytest
+import torch
+
+from tiling import fit_scale, merge_tile_detections, tile_grid
+
+
+def test_small_image_is_one_tile():
+    assert tile_grid(500, 300, 800, 160) == [(0, 0, 500, 300)]
+
+
+def test_grid_overlaps_and_ends_flush_with_the_edges():
+    tiles = tile_grid(2000, 900, 800, 160)
+    xs = sorted({t[0] for t in tiles})
+    ys = sorted({t[1] for t in tiles})
+    assert xs == [0, 640, 1200]
+    assert ys == [0, 100]
+    assert all(x2 - x1 == 800 and y2 - y1 == 800 for x1, y1, x2, y2 in tiles)
+    assert max(t[2] for t in tiles) == 2000
+    assert max(t[3] for t in tiles) == 900
+
+
+def test_fit_scale_shrinks_until_the_grid_fits():
+    assert fit_scale(1000, 1000, 800, 160, 16) == 1.0
+    scale = fit_scale(6000, 6000, 800, 160, 4)
+    assert scale < 1.0
+    assert len(tile_grid(int(6000 * scale) + 1, int(6000 * scale) + 1, 800, 160)) <= 4
+
+
+@pytest.mark.parametrize("max_tiles", [0, -3])
+def test_fit_scale_terminates_for_non_positive_max_tiles(max_tiles):
+    scale = fit_scale(4000, 3000, 800, 160, max_tiles)
+    assert len(tile_grid(int(4000 * scale) + 1, int(3000 * scale) + 1, 800, 160)) == 1
+
+
+def detection(boxes, scores, labels):
+    return {
+        "boxes": torch.tensor(boxes, dtype=torch.float32).reshape(-1, 4),
+        "scores": torch.tensor(scores, dtype=torch.float32),
+        "labels": torch.tensor(labels, dtype=torch.int64)
+    }
+
+
+def test_merge_shifts_boxes_and_suppresses_duplicates_across_tiles():
+    tiles = [(0, 0, 800, 800), (640, 0, 1440, 800)]
+    outputs = [
+        # Same fracture seen near the shared edge of both tiles
+        detection([[650, 100, 750, 200], [10, 10, 50, 50]], [0.9, 0.3], [1, 1]),
+        detection([[12, 102, 108, 198]], [0.8], [1])
+    ]
+    merged = merge_tile_detections(outputs, tiles, score_threshold=0.5, iou_threshold=0.5)
+    assert merged["boxes"].tolist() == [[650.0, 100.0, 750.0, 200.0]]
+    assert merged["scores"].tolist() == pytest.approx([0.9])
+
+
+def test_merge_keeps_overlapping_boxes_of_different_classes():
+    tiles = [(0, 0, 800, 800), (640, 0, 1440, 800)]
+    outputs = [
+        detection([[650, 100, 750, 200]], [0.9], [1]),
+        detection([[10, 100, 110, 200]], [0.8], [2])
+    ]
+    merged = merge_tile_detections(outputs, tiles, score_threshold=0.5, iou_threshold=0.5)
+    assert sorted(merged["labels"].tolist()) == [1, 2]
+
+
+def test_merge_with_no_detections_is_empty():
+    tiles = [(0, 0, 800, 800)]
+    merged = merge_tile_detections([detection([], [], [])], tiles, 0.5, 0.5)
+    assert merged["boxes"].shape == (0, 4)
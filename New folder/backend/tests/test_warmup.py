@@ -0,0 +1,54 @@
+import asyncio
+
+from warmup import WarmupState, parse_ints, parse_sizes, run_warmup, synthetic_xray
+
+
+class InlineExecutor:
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+def test_parse_sizes_and_ints():
+    assert parse_sizes("512x512, 1024X768,") == [(512, 512), (1024, 768)]
+    assert parse_sizes("") == []
+    assert parse_ints("1, 4") == [1, 4]
+
+
+def test_synthetic_xray_has_the_requested_size():
+    image = synthetic_xray(64, 32)
+    assert image.size == (64, 32)
+    assert image.mode == "RGB"
+
+
+def test_warmup_runs_every_size_and_batch_size_and_records_timings():
+    calls = []
+    state = WarmupState()
+    asyncio.run(run_warmup(
+        state, InlineExecutor(), lambda items: calls.append(len(items)),
+        lambda w, h: (w, h), [(32, 32), (64, 48)], [1, 2]
+    ))
+    assert calls == [1, 2, 1, 2]
+    assert state.ready
+    report = state.to_dict()
+    assert [(run["size"], run["batch_size"]) for run in report["runs"]] == [
+        ([32, 32], 1), ([32, 32], 2), ([64, 48], 1), ([64, 48], 2)
+    ]
+    assert all(run["ms"] >= 0 for run in report["runs"])
+    assert report["error"] is None
+
+
+def test_failed_warmup_is_not_ready():
+    def handler(items):
+        raise RuntimeError("out of memory")
+
+    state = WarmupState()
+    asyncio.run(run_warmup(state, InlineExecutor(), handler, lambda w, h: None, [(32, 32)], [1]))
+    assert not state.ready
+    assert state.to_dict()["status"] == "failed"
+    assert state.error == "out of memory"
+
+
+def test_no_sizes_means_ready_straight_away():
+    state = WarmupState()
+    asyncio.run(run_warmup(state, InlineExecutor(), None, None, [], [1]))
+    assert state.ready
@@ -0,0 +1,59 @@
+"""
+Tiled sliding-window detection for very large radiographs
+The image is cut into overlapping tiles that each go through the detector at
+close to native resolution, and the per-tile boxes are merged with
+class-aware NMS
+"""
+import math
+
+import torch
+from torchvision.ops import batched_nms
+
+
+def _positions(length, tile_size, stride):
+    """Tile start offsets along one axis; the last tile is flush with the edge"""
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """Overlapping (x1, y1, x2, y2) tiles covering a width x height image"""
+    stride = max(1, tile_size - overlap)
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _positions(height, tile_size, stride)
+        for x in _positions(width, tile_size, stride)
+    ]
+
+
+def fit_scale(width, height, tile_size, overlap, max_tiles):
+    """Largest downscale factor (<= 1) at which the grid has at most ``max_tiles`` (at least 1) tiles"""
+    # A single tile is always reachable; fewer would never end the loop
+    max_tiles = max(1, int(max_tiles))
+    scale = 1.0
+    while len(tile_grid(math.ceil(width * scale), math.ceil(height * scale), tile_size, overlap)) > max_tiles:
+        scale *= 0.9
+    return scale
+
+
+def merge_tile_detections(outputs, tiles, score_threshold, iou_threshold):
+    """
+    Shift per-tile detections into image coordinates and merge them
+
+    Boxes below ``score_threshold`` are dropped first; overlapping boxes of
+    the same class from neighbouring tiles are then suppressed with NMS.
+    Returns a dict of ``boxes``, ``scores`` and ``labels`` tensors.
+    """
+    boxes, scores, labels = [], [], []
+    for output, (x1, y1, _, _) in zip(outputs, tiles):
+        keep = output["scores"] > score_threshold
+        boxes.append(output["boxes"][keep] + torch.tensor([x1, y1, x1, y1], dtype=torch.float32))
+        scores.append(output["scores"][keep])
+        labels.append(output["labels"][keep])
+
+    boxes, scores, labels = torch.cat(boxes), torch.cat(scores), torch.cat(labels)
+    keep = batched_nms(boxes, scores, labels, iou_threshold)
+    return {"boxes": boxes[keep], "scores": scores[keep], "labels": labels[keep]}
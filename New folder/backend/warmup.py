@@ -0,0 +1,90 @@
+"""
+Model warm-up after loading
+Runs synthetic inferences so the first real request doesn't pay for lazy
+allocations and kernel selection, and tracks readiness for /ready
+"""
+import logging
+import time
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sizes(value):
+    """Parse "512x512,1024x768" into [(512, 512), (1024, 768)]"""
+    sizes = []
+    for part in value.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        width, height = part.split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def parse_ints(value):
+    """Parse "1,4" into [1, 4]"""
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def synthetic_xray(width, height):
+    """Grey radial gradient roughly resembling an exposed film"""
+    gradient = Image.radial_gradient("L").resize((width, height))
+    return Image.eval(gradient, lambda v: 255 - v).convert("RGB")
+
+
+class WarmupState:
+    """Progress and timings of the warm-up run, reported by /ready"""
+
+    def __init__(self):
+        self.status = "pending"
+        self.runs = []
+        self.total_ms = 0.0
+        self.error = None
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "total_ms": round(self.total_ms, 1),
+            "runs": self.runs,
+            "error": self.error
+        }
+
+
+async def run_warmup(state, executor, handler, make_input, sizes, batch_sizes):
+    """
+    Run ``handler`` on synthetic batches for every size / batch-size pair
+
+    ``make_input(width, height)`` builds one synthetic item for the handler;
+    each run is executed on ``executor`` like real traffic. With no sizes the
+    service is marked ready straight away.
+    """
+    state.status = "running"
+    start = time.perf_counter()
+    try:
+        for width, height in sizes:
+            for batch_size in batch_sizes:
+                items = [make_input(width, height) for _ in range(batch_size)]
+                run_start = time.perf_counter()
+                await executor.run(handler, items)
+                run_ms = (time.perf_counter() - run_start) * 1000
+                state.runs.append({
+                    "size": [width, height],
+                    "batch_size": batch_size,
+                    "ms": round(run_ms, 1)
+                })
+                logger.info(f"Warm-up {width}x{height} batch={batch_size}: {run_ms:.1f}ms")
+    except Exception as e:
+        state.status = "failed"
+        state.error = str(e)
+        logger.error(f"Warm-up failed: {str(e)}")
+        return
+
+    state.total_ms = (time.perf_counter() - start) * 1000
+    state.status = "ready"
+    logger.info(f"Warm-up finished in {state.total_ms:.1f}ms")